@@ -0,0 +1,154 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from google.api_core import exceptions as google_exceptions
+from .settings import (
+    AIMD_INITIAL_WINDOW, AIMD_MIN_WINDOW, AIMD_MAX_WINDOW, AIMD_ADDITIVE_INCREASE, AIMD_DECREASE_FACTOR,
+    AIMD_LATENCY_TARGET_SECONDS, AIMD_DEFAULT_BACKOFF_SECONDS,
+)
+
+THROUGHPUT_WINDOW_SECONDS = 60
+
+def is_overload_error(error):
+    """429 / RESOURCE_EXHAUSTED hoặc lỗi hết hạn (DEADLINE_EXCEEDED / 504)"""
+    return isinstance(error, (google_exceptions.TooManyRequests, google_exceptions.GatewayTimeout))
+
+def get_retry_after_seconds(error):
+    """Lấy gợi ý retry-after từ exception (thuộc tính retry_after, RetryInfo của gRPC hoặc header HTTP)"""
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is not None:
+        return float(retry_after)
+    for detail in getattr(error, "details", None) or []:
+        retry_delay = getattr(detail, "retry_delay", None)
+        if retry_delay is not None:
+            return retry_delay.seconds + retry_delay.nanos / 1e9
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers and headers.get("Retry-After"):
+        try:
+            return float(headers.get("Retry-After"))
+        except ValueError:
+            return None
+    return None
+
+class AIMDController:
+    """
+    Điều khiển số request dịch đồng thời theo AIMD:
+    tăng cộng dồn khi request thành công và độ trễ tốt,
+    giảm theo cấp số nhân khi gặp 429/RESOURCE_EXHAUSTED hoặc lỗi deadline.
+    """
+
+    def __init__(
+        self,
+        initial_window=AIMD_INITIAL_WINDOW,
+        min_window=AIMD_MIN_WINDOW,
+        max_window=AIMD_MAX_WINDOW,
+        additive_increase=AIMD_ADDITIVE_INCREASE,
+        decrease_factor=AIMD_DECREASE_FACTOR,
+        latency_target=AIMD_LATENCY_TARGET_SECONDS,
+    ):
+        self.min_window = min_window
+        self.max_window = max_window
+        self.window = max(min_window, min(initial_window, max_window))
+        self.additive_increase = additive_increase
+        self.decrease_factor = decrease_factor
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.ewma_latency = None
+        self.last_decrease = 0.0
+        self.counters = {"requests": 0, "errors": 0, "overloads": 0, "decreases": 0}
+        self._completed = deque()
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """Chờ đến khi số request đang chạy nhỏ hơn window và không còn trong thời gian backoff"""
+        with self._condition:
+            while True:
+                wait = self.blocked_until - time.monotonic()
+                if wait <= 0 and self.in_flight < int(self.window):
+                    self.in_flight += 1
+                    return
+                self._condition.wait(timeout=wait if wait > 0 else None)
+
+    def release(self, latency, characters=0, error=None):
+        now = time.monotonic()
+        with self._condition:
+            self.in_flight -= 1
+            self.counters["requests"] += 1
+            if error is None:
+                self.ewma_latency = latency if self.ewma_latency is None else 0.8 * self.ewma_latency + 0.2 * latency
+                self._completed.append((now, characters))
+                if latency <= self.latency_target:
+                    # +additive_increase sau mỗi "vòng" gồm window request thành công
+                    self.window = min(self.max_window, self.window + self.additive_increase / self.window)
+            else:
+                self.counters["errors"] += 1
+                if is_overload_error(error):
+                    self.counters["overloads"] += 1
+                    # Chỉ giảm một lần cho mỗi đợt quá tải: request bắt đầu trước lần giảm gần nhất thuộc cùng đợt
+                    if now - latency >= self.last_decrease:
+                        self.window = max(self.min_window, self.window * self.decrease_factor)
+                        self.last_decrease = now
+                        self.counters["decreases"] += 1
+                    retry_after = get_retry_after_seconds(error)
+                    backoff = retry_after if retry_after is not None else AIMD_DEFAULT_BACKOFF_SECONDS
+                    self.blocked_until = max(self.blocked_until, now + backoff)
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self, characters=0):
+        """Bao quanh một lời gọi dịch: giữ chỗ trong window và ghi nhận kết quả"""
+        self.acquire()
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            self.release(time.monotonic() - started, characters, error=e)
+            raise
+        self.release(time.monotonic() - started, characters)
+
+    def snapshot(self):
+        """Trạng thái hiện tại để theo dõi: window, số request đang chạy, throughput quan sát được"""
+        now = time.monotonic()
+        with self._condition:
+            while self._completed and now - self._completed[0][0] > THROUGHPUT_WINDOW_SECONDS:
+                self._completed.popleft()
+            completed = list(self._completed)
+            stats = dict(self.counters)
+            stats.update({
+                "window": round(self.window, 2),
+                "in_flight": self.in_flight,
+                "ewma_latency_seconds": round(self.ewma_latency or 0.0, 3),
+                "backoff_remaining_seconds": round(max(0.0, self.blocked_until - now), 3),
+            })
+        if completed:
+            span = max(now - completed[0][0], 1.0)
+            stats["requests_per_second"] = round(len(completed) / span, 2)
+            stats["characters_per_second"] = round(sum(c for _, c in completed) / span, 1)
+        else:
+            stats["requests_per_second"] = 0.0
+            stats["characters_per_second"] = 0.0
+        return stats
+
+_controller = None
+_controller_lock = threading.Lock()
+
+def get_controller():
+    """Trả về AIMDController dùng chung cho process"""
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AIMDController()
+    return _controller
+
+def _reset_after_fork():
+    global _controller, _controller_lock
+    _controller = None
+    _controller_lock = threading.Lock()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,50 @@
+import os
+import threading
+from google.cloud import translate_v3 as translate
+from google.cloud.translate_v3.services.translation_service.transports import TranslationServiceGrpcTransport
+from .settings import GRPC_KEEPALIVE_TIME_MS, GRPC_KEEPALIVE_TIMEOUT_MS, GRPC_MAX_MESSAGE_LENGTH
+
+_client = None
+_client_pid = None
+_lock = threading.Lock()
+
+def get_channel_options():
+    """Các option truyền vào gRPC channel của TranslationServiceClient"""
+    return [
+        ("grpc.keepalive_time_ms", GRPC_KEEPALIVE_TIME_MS),
+        ("grpc.keepalive_timeout_ms", GRPC_KEEPALIVE_TIMEOUT_MS),
+        ("grpc.keepalive_permit_without_calls", 1),
+        ("grpc.max_send_message_length", GRPC_MAX_MESSAGE_LENGTH),
+        ("grpc.max_receive_message_length", GRPC_MAX_MESSAGE_LENGTH),
+    ]
+
+def _create_client():
+    channel = TranslationServiceGrpcTransport.create_channel(options=get_channel_options())
+    transport = TranslationServiceGrpcTransport(channel=channel)
+    print(f"🔌 Đã tạo TranslationServiceClient cho process {os.getpid()}")
+    return translate.TranslationServiceClient(transport=transport)
+
+def get_translation_client():
+    """
+    Trả về TranslationServiceClient dùng chung cho cả process.
+    Client được tạo lại khi phát hiện đang chạy trong process con sau fork
+    (ví dụ worker của gunicorn), vì gRPC channel không dùng chung được qua fork.
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _lock:
+            if _client is None or _client_pid != pid:
+                _client = _create_client()
+                _client_pid = pid
+    return _client
+
+def _reset_after_fork():
+    # Không đóng channel của process cha, chỉ bỏ tham chiếu để process con tự tạo mới
+    global _client, _client_pid, _lock
+    _client = None
+    _client_pid = None
+    _lock = threading.Lock()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
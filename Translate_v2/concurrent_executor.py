@@ -0,0 +1,96 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .settings import TRANSLATE_MAX_WORKERS, TRANSLATE_CHARS_PER_MINUTE
+
+class TokenBucket:
+    """
+    Token bucket tính theo số ký tự. Dung lượng bằng quota một phút,
+    nạp lại đều theo thời gian để không vượt quota (tránh lỗi 429).
+    """
+
+    def __init__(self, capacity, refill_per_second):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_second)
+        self.updated_at = now
+
+    def try_acquire(self, amount):
+        """Lấy `amount` token nếu đủ ngay lúc này, không chờ"""
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return True
+            return False
+
+    def acquire(self, amount):
+        """Chờ đến khi đủ `amount` token (yêu cầu lớn hơn dung lượng được tính bằng dung lượng)"""
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.refill_per_second
+            time.sleep(wait)
+
+class ConcurrentExecutor:
+    """Giữ tối đa `max_workers` request dịch cùng lúc, mỗi request trừ token theo số ký tự"""
+
+    def __init__(self, max_workers=TRANSLATE_MAX_WORKERS, chars_per_minute=TRANSLATE_CHARS_PER_MINUTE):
+        self.max_workers = max_workers
+        self.bucket = TokenBucket(chars_per_minute, chars_per_minute / 60.0)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="translate")
+
+    def _run(self, func, item, cost):
+        self.bucket.acquire(cost)
+        return func(item)
+
+    def map_ordered(self, func, items, costs):
+        """
+        Chạy `func(item)` song song cho mọi item, trả về list (kết quả, lỗi)
+        theo đúng thứ tự đầu vào để áp dụng lại vào cây XML theo thứ tự tài liệu.
+        """
+        futures = [self._pool.submit(self._run, func, item, cost) for item, cost in zip(items, costs)]
+        results = []
+        for future in futures:
+            try:
+                results.append((future.result(), None))
+            except Exception as e:
+                results.append((None, e))
+        return results
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    """Trả về ConcurrentExecutor dùng chung cho process (tạo lại sau fork)"""
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _executor_lock:
+            if _executor is None or _executor_pid != pid:
+                _executor = ConcurrentExecutor()
+                _executor_pid = pid
+    return _executor
+
+def _reset_after_fork():
+    # Thread pool của process cha không tồn tại trong process con
+    global _executor, _executor_pid, _executor_lock
+    _executor = None
+    _executor_pid = None
+    _executor_lock = threading.Lock()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
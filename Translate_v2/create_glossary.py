@@ -1,6 +1,8 @@
 from google.cloud import translate_v3 as translate
 import os
 from dotenv import load_dotenv
+from .client_provider import get_translation_client
+from .translation_memory import get_translation_memory
 
 load_dotenv()
 project_id = os.getenv("PROJECT_ID")
@@ -28,7 +30,7 @@ def create_glossary(
     short phrases (usually fewer than five words).
     https://cloud.google.com/translate/docs/advanced/glossary#format-glossary
     """
-    client = translate.TranslationServiceClient()
+    client = get_translation_client()
 
     # Supported language codes: https://cloud.google.com/translate/docs/languages
     source_lang_code = source_lang_code
@@ -56,6 +58,11 @@ def create_glossary(
     print(f"Created: {result.name}")
     print(f"Input Uri: {result.input_config.gcs_source.input_uri}")
 
+    # Glossary đã thay đổi nên các bản dịch cũ trong translation memory không còn hợp lệ
+    memory = get_translation_memory()
+    if memory is not None:
+        memory.invalidate_glossary(glossary_id)
+
     return result
 
 def create_all_glossaries():
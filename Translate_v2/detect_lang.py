@@ -1,11 +1,16 @@
+import hashlib
 import os
-import docx
-import openpyxl
+import re
+import threading
+import zipfile
+from collections import OrderedDict
 import PyPDF2
-import pptx
+from lxml import etree
 from fastapi import HTTPException
-from google.cloud import translate
 from dotenv import load_dotenv
+from .translation_backend import get_backend
+from .language_detector import detect_script_language, LOCAL_DETECTION_ENABLED, LOCAL_DETECTION_MIN_CONFIDENCE
+from .settings import DETECTION_CACHE_SIZE
 
 load_dotenv()
 # Định nghĩa các ngôn ngữ hỗ trợ
@@ -17,7 +22,8 @@ ENGLISH_SYMBOL = 'en'
 # Lấy giá trị biến môi trường
 google_credentials_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
 PROJECT_ID = os.getenv("PROJECT_ID")
-os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = google_credentials_path
+if google_credentials_path is not None:
+    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = google_credentials_path
 
 # Định nghĩa các ngôn ngữ hỗ trợ
 LANGUAGES = {
@@ -34,6 +40,18 @@ language_pair = {
     "en-zh-CN": 5,
     "ja-zh-CN": 6
 }
+# Giới hạn khi lấy mẫu văn bản để phát hiện ngôn ngữ
+SAMPLE_WORD_BUDGET = 100
+SAMPLE_MAX_CHARS = 5000
+# Dừng lấy mẫu sau khi đã parse ngần này byte XML / phần tử (sheet toàn số, tài liệu chỉ có hình...)
+SAMPLE_MAX_BYTES = 16 * 1024 * 1024
+SAMPLE_MAX_ELEMENTS = 500000
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_A = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+_S = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_SLIDE_RE = re.compile(r"^ppt/slides/slide(\d+)\.xml$")
+
 def extract_content(file_path: str) -> str:
     """Trích xuất nội dung từ file (PDF, DOCX, XLSX) để phát hiện ngôn ngữ"""
     if not os.path.exists(file_path):
@@ -52,18 +70,13 @@ def extract_content(file_path: str) -> str:
     else:
         raise HTTPException(status_code=400, detail="Unsupported file type")
 def extract_from_pptx(file_path: str) -> str:
-    """Trích xuất văn bản từ file PPTX"""
-    content = ""
-    prs = pptx.Presentation(file_path)
-    for slide in prs.slides:
-        for shape in slide.shapes:
-            if hasattr(shape, "text"):
-                content += shape.text + " "
-                if len(content.split()) >= 100:
-                    break
-        if len(content.split()) >= 100:
-            break
-    return get_first_100_words(content)
+    """Trích xuất văn bản từ file PPTX (đọc lần lượt slide1.xml, slide2.xml...)"""
+    with zipfile.ZipFile(file_path) as archive:
+        slides = sorted(
+            (name for name in archive.namelist() if _SLIDE_RE.match(name)),
+            key=lambda name: int(_SLIDE_RE.match(name).group(1)),
+        )
+    return sample_ooxml_text(file_path, slides, _A + "p", _A + "t")
 def get_first_100_words(text: str) -> str:
     """Lấy 100 từ đầu tiên của văn bản"""
     words = text.split()[:100]
@@ -82,40 +95,121 @@ def extract_from_pdf(file_path: str) -> str:
 
 def extract_from_docx(file_path: str) -> str:
     """Trích xuất văn bản từ file DOCX"""
-    content = ""
-    doc = docx.Document(file_path)
-    for para in doc.paragraphs:
-        content += para.text + " "
-        if len(content.split()) >= 100:
-            break
-    return get_first_100_words(content)
+    return sample_ooxml_text(file_path, ["word/document.xml"], _W + "p", _W + "t")
 
 def extract_from_xlsx(file_path: str) -> str:
-    """Trích xuất văn bản từ file XLSX"""
-    content = ""
-    workbook = openpyxl.load_workbook(file_path)
-    sheet = workbook[workbook.sheetnames[0]]
-
-    for row in sheet.iter_rows(values_only=True):
-        for cell in row:
-            if cell:
-                content += str(cell) + " "
-                if len(content.split()) >= 100:
-                    break
-        if len(content.split()) >= 100:
-            break
+    """Trích xuất văn bản từ file XLSX (shared strings, sau đó inline string của sheet đầu tiên)"""
+    return sample_ooxml_text(
+        file_path,
+        ["xl/sharedStrings.xml", "xl/worksheets/sheet1.xml"],
+        (_S + "si", _S + "is"),
+        _S + "t",
+        skip_parent_tag=_S + "rPh",
+    )
 
-    return get_first_100_words(content)
+class _CountingReader:
+    """File-like đếm số byte XML đã đọc (để dừng lấy mẫu theo ngân sách byte)"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.bytes_read += len(data)
+        return data
+
+def sample_ooxml_text(file_path, part_names, block_tag, text_tag, skip_parent_tag=None,
+                      word_budget=SAMPLE_WORD_BUDGET, char_budget=SAMPLE_MAX_CHARS,
+                      byte_budget=SAMPLE_MAX_BYTES, element_budget=SAMPLE_MAX_ELEMENTS):
+    """
+    Đọc thẳng các part XML trong file OOXML (zip) bằng iterparse, không dựng object model.
+    Mọi phần tử đọc xong (block, và cả phần tử ngoài block như <row>, <c>) được xóa khỏi cây,
+    nên bộ nhớ không phụ thuộc kích thước file. Dừng khi đủ số từ / ký tự, hoặc khi đã parse
+    quá byte_budget byte hay element_budget phần tử (tính chung cho các part).
+    """
+    block_tags = {block_tag} if isinstance(block_tag, str) else set(block_tag)
+    blocks = []
+    word_count = char_count = 0
+    bytes_read = elements = 0
+    with zipfile.ZipFile(file_path) as archive:
+        names = set(archive.namelist())
+        for part_name in part_names:
+            if part_name not in names:
+                continue
+            with archive.open(part_name) as stream:
+                reader = _CountingReader(stream)
+                block_depth = 0
+                for event, elem in etree.iterparse(reader, events=("start", "end")):
+                    if event == "start":
+                        if elem.tag in block_tags:
+                            block_depth += 1
+                        continue
+                    elements += 1
+                    if elem.tag in block_tags:
+                        block_depth -= 1
+                        text = "".join(
+                            t.text or "" for t in elem.iter(text_tag)
+                            if skip_parent_tag is None or t.getparent().tag != skip_parent_tag
+                        )
+                        if text.strip():
+                            blocks.append(text)
+                            word_count += len(text.split())
+                            char_count += len(text)
+                    elif block_depth:
+                        # Phần tử con của block đang mở: giữ lại đến khi block kết thúc
+                        continue
+                    elem.clear()
+                    while elem.getprevious() is not None:
+                        del elem.getparent()[0]
+                    if word_count >= word_budget or char_count >= char_budget:
+                        return get_first_100_words(" ".join(blocks))
+                    if bytes_read + reader.bytes_read >= byte_budget or elements >= element_budget:
+                        print(f"⚠️ Dừng lấy mẫu ngôn ngữ sau {elements} phần tử XML ({part_name})")
+                        return get_first_100_words(" ".join(blocks))
+                bytes_read += reader.bytes_read
+    return get_first_100_words(" ".join(blocks))
 
 def detect_language(text: str):
-    """Phát hiện ngôn ngữ của file"""
+    """Phát hiện ngôn ngữ của file (đoán cục bộ theo chữ viết, chỉ gọi API khi không đủ tin cậy)"""
+    if LOCAL_DETECTION_ENABLED:
+        language, confidence = detect_script_language(text)
+        if language is not None and confidence >= LOCAL_DETECTION_MIN_CONFIDENCE:
+            print(f"🔎 Ngôn ngữ nguồn: {language} (phát hiện cục bộ, độ tin cậy {confidence:.2f})")
+            return language
     try:
-        client = translate.TranslationServiceClient()
-        parent = f"projects/{PROJECT_ID}/locations/us-central1"
-        request = translate.DetectLanguageRequest(content=text, parent=parent)
-
-        response = client.detect_language(request=request)
-        detected_language = response.languages[0].language_code
+        detected_language = get_backend().detect_language(text)
         return detected_language
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error detecting language: {str(e)}")
+
+_detection_cache = OrderedDict()
+_detection_cache_lock = threading.Lock()
+
+def file_sha256(file_path: str) -> str:
+    """SHA-256 của nội dung file (đọc theo khối, không nạp cả file vào bộ nhớ)"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def remember_file_language(content_hash: str, language: str):
+    """Ghi nhớ ngôn ngữ của một nội dung file (ví dụ giá trị đã lưu trong database)"""
+    with _detection_cache_lock:
+        _detection_cache[content_hash] = language
+        _detection_cache.move_to_end(content_hash)
+        while len(_detection_cache) > DETECTION_CACHE_SIZE:
+            _detection_cache.popitem(last=False)
+
+def detect_file_language(file_path: str, content_hash: str = None) -> str:
+    """Phát hiện ngôn ngữ của file, mỗi nội dung (SHA-256) chỉ phát hiện một lần trong process"""
+    content_hash = content_hash or file_sha256(file_path)
+    with _detection_cache_lock:
+        language = _detection_cache.get(content_hash)
+        if language is not None:
+            _detection_cache.move_to_end(content_hash)
+    if language is None:
+        language = detect_language(extract_content(file_path))
+        remember_file_language(content_hash, language)
+    return language
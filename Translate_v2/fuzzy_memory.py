@@ -0,0 +1,302 @@
+import hashlib
+import html
+import re
+import random
+import threading
+import time
+from collections import Counter
+from .settings import (
+    FUZZY_MATCH_ENABLED, FUZZY_MATCH_THRESHOLD, FUZZY_MAX_SEGMENTS, FUZZY_MAX_TOTAL_SEGMENTS, FUZZY_MAX_CANDIDATES,
+    FUZZY_MAX_BUCKET_SIZE,
+)
+
+SHINGLE_SIZE = 3
+MINHASH_BANDS = 6
+MINHASH_ROWS = 3
+# Họ hàm băm (a*h + b) mod p với p nguyên tố Mersenne 2^61 - 1: các hàm độc lập theo cặp
+_MINHASH_PRIME = (1 << 61) - 1
+_rng = random.Random(0)
+_MINHASH_PARAMS = [
+    (_rng.randrange(1, _MINHASH_PRIME), _rng.randrange(_MINHASH_PRIME)) for _ in range(MINHASH_BANDS * MINHASH_ROWS)
+]
+del _rng
+
+# Token "mã/số": chuỗi chữ-số liền nhau có ít nhất một chữ số (AY00139, 2024/05/01, 12.5mm, M6-20).
+# Token luôn lấy trọn (không bắt đầu/kết thúc giữa chữ-số) nên "10" không khớp bên trong "100" hay "A10B".
+CODE_TOKEN_RE = re.compile(r"(?<![0-9A-Za-z])[0-9A-Za-z](?:[0-9A-Za-z\-_./:]*[0-9A-Za-z])?(?![0-9A-Za-z])")
+_CODE_PLACEHOLDER = "\ue000"
+_HTML_TAG_RE = re.compile(r"(<[^>]+>)")
+
+def visible_text(text, mime_type="text/plain"):
+    """Phần text hiển thị (segment HTML: bỏ thẻ như <span id="r0">, unescape)"""
+    if mime_type == "text/html":
+        return html.unescape(_HTML_TAG_RE.sub("", text))
+    return text
+
+def _sub_outside_tags(pattern, replace, text, mime_type):
+    """pattern.sub chỉ trên phần text (không đụng vào thẻ và thuộc tính HTML)"""
+    if mime_type != "text/html":
+        return pattern.sub(replace, text)
+    pieces = _HTML_TAG_RE.split(text)
+    # Vị trí chẵn là text, vị trí lẻ là thẻ
+    return "".join(piece if i % 2 else pattern.sub(replace, piece) for i, piece in enumerate(pieces))
+
+def shingles(text):
+    """Tập n-gram ký tự (mặc định 3-gram) của segment"""
+    if len(text) <= SHINGLE_SIZE:
+        return {text}
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+def _shingle_hash(shingle):
+    # blake2b thay cho hash() (hash chuỗi đổi theo PYTHONHASHSEED): cùng segment luôn rơi vào cùng bucket ở mọi process
+    return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+
+def minhash_signature(shingle_set):
+    hashes = [_shingle_hash(s) for s in shingle_set]
+    return [min((a * h + b) % _MINHASH_PRIME for h in hashes) for a, b in _MINHASH_PARAMS]
+
+def band_keys(signature):
+    return [
+        hash((band, tuple(signature[band * MINHASH_ROWS:(band + 1) * MINHASH_ROWS])))
+        for band in range(MINHASH_BANDS)
+    ]
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+def split_code_tokens(text, mime_type="text/plain"):
+    """
+    Tách segment thành template (token mã/số thay bằng placeholder) và danh sách token mã/số.
+    Segment HTML: chỉ xét phần text, thẻ (kể cả id="r0") giữ nguyên trong template.
+    """
+    codes = []
+
+    def replace(match):
+        token = match.group(0)
+        if not any(ch.isdigit() for ch in token):
+            return token
+        codes.append(token)
+        return _CODE_PLACEHOLDER
+
+    return _sub_outside_tags(CODE_TOKEN_RE, replace, text, mime_type), codes
+
+def substitute_codes(source_text, stored_source, stored_translation, mime_type="text/plain"):
+    """
+    Nếu source_text chỉ khác stored_source ở các token mã/số, thay các token đó
+    vào bản dịch đã lưu (so khớp trọn token, chỉ trong phần text). Trả về None khi không thể thay an toàn.
+    """
+    template, codes = split_code_tokens(source_text, mime_type)
+    stored_template, stored_codes = split_code_tokens(stored_source, mime_type)
+    if template != stored_template or len(codes) != len(stored_codes):
+        return None
+
+    replacements = {old: new for old, new in zip(stored_codes, codes) if old != new}
+    if not replacements:
+        return stored_translation
+    translation_tokens = Counter(split_code_tokens(stored_translation, mime_type)[1])
+    for old in replacements:
+        # Token cũ phải xuất hiện đúng một lần trong nguồn và bản dịch để thay không nhầm chỗ
+        if translation_tokens[old] != 1 or stored_codes.count(old) != 1:
+            return None
+    # Thay mọi token trong một lượt (đổi chỗ 10 <-> 20 vẫn đúng)
+    return _sub_outside_tags(
+        CODE_TOKEN_RE, lambda match: replacements.get(match.group(0), match.group(0)), stored_translation, mime_type,
+    )
+
+class SegmentBudget:
+    """Số segment còn được thêm vào các fuzzy index dùng chung một giới hạn (mọi phạm vi trong process)"""
+
+    def __init__(self, limit=FUZZY_MAX_TOTAL_SEGMENTS):
+        self.limit = limit
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self.used >= self.limit:
+                return False
+            self.used += 1
+            return True
+
+    def release(self, count):
+        with self._lock:
+            self.used = max(0, self.used - count)
+
+_segment_budget = SegmentBudget()
+
+class FuzzyIndex:
+    """
+    Chỉ mục MinHash LSH trên 3-gram ký tự của các segment nguồn đã lưu,
+    dùng cho một phạm vi (ngôn ngữ nguồn, đích, glossary, phiên bản glossary, mime type).
+    Segment HTML được so độ tương đồng trên phần text hiển thị.
+    Số segment bị chặn theo phạm vi (max_segments) và theo tổng của mọi index dùng chung budget.
+    """
+
+    def __init__(self, threshold=FUZZY_MATCH_THRESHOLD, max_segments=FUZZY_MAX_SEGMENTS, mime_type="text/plain",
+                 budget=None):
+        self.threshold = threshold
+        self.max_segments = max_segments
+        self.mime_type = mime_type
+        self.budget = budget or _segment_budget
+        # Được set khi đã nạp xong dữ liệu có sẵn (index nạp nền vẫn tra cứu được trong lúc chờ)
+        self.ready = threading.Event()
+        self.sources = []
+        self.translations = []
+        self.template_hashes = []
+        self._positions = {}
+        self._buckets = [dict() for _ in range(MINHASH_BANDS)]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.sources)
+
+    def _shingles(self, text):
+        return shingles(visible_text(text, self.mime_type))
+
+    def add(self, source_text, translated_text, overwrite=True):
+        """overwrite=False: không ghi đè bản dịch đã có (dùng khi nạp nền từ SQLite)"""
+        if not source_text or not translated_text:
+            return
+        with self._lock:
+            position = self._positions.get(source_text)
+            if position is not None:
+                if overwrite:
+                    self.translations[position] = translated_text
+                return
+            if len(self.sources) >= self.max_segments or not self.budget.acquire():
+                return
+            position = len(self.sources)
+            self.sources.append(source_text)
+            self.translations.append(translated_text)
+            self.template_hashes.append(hash(split_code_tokens(source_text, self.mime_type)[0]))
+            self._positions[source_text] = position
+        keys = band_keys(minhash_signature(self._shingles(source_text)))
+        with self._lock:
+            for bucket, key in zip(self._buckets, keys):
+                existing = bucket.get(key)
+                if existing is None:
+                    bucket[key] = position
+                elif isinstance(existing, list):
+                    if len(existing) < FUZZY_MAX_BUCKET_SIZE:
+                        existing.append(position)
+                else:
+                    bucket[key] = [existing, position]
+
+    def close(self):
+        """Bỏ index (ví dụ khi glossary đổi phiên bản), trả lại phần budget đã dùng"""
+        with self._lock:
+            self.budget.release(len(self.sources))
+            self.sources, self.translations, self.template_hashes = [], [], []
+            self._positions = {}
+            self._buckets = [dict() for _ in range(MINHASH_BANDS)]
+
+    def candidates(self, shingle_set):
+        """Các vị trí trùng bucket, xếp theo số band trùng (nhiều band trùng ~ độ tương đồng cao)"""
+        keys = band_keys(minhash_signature(shingle_set))
+        counts = Counter()
+        with self._lock:
+            for bucket, key in zip(self._buckets, keys):
+                existing = bucket.get(key)
+                if existing is None:
+                    continue
+                if isinstance(existing, list):
+                    counts.update(existing)
+                else:
+                    counts[existing] += 1
+        return [position for position, _ in counts.most_common()]
+
+    def lookup(self, source_text):
+        """
+        Tìm segment gần giống nhất (Jaccard >= threshold) chỉ khác ở token mã/số
+        và trả về bản dịch đã thay token; None nếu không có.
+        """
+        template, codes = split_code_tokens(source_text, self.mime_type)
+        if not codes:
+            return None
+        template_hash = hash(template)
+        query_shingles = self._shingles(source_text)
+        best = None
+        checked = 0
+        for position in self.candidates(query_shingles):
+            # Lọc nhanh: phần không phải mã/số phải giống hệt
+            if self.template_hashes[position] != template_hash:
+                continue
+            checked += 1
+            if checked > FUZZY_MAX_CANDIDATES:
+                break
+            stored_source = self.sources[position]
+            similarity = jaccard(query_shingles, self._shingles(stored_source))
+            if similarity < self.threshold or (best is not None and similarity <= best[0]):
+                continue
+            translation = substitute_codes(source_text, stored_source, self.translations[position], self.mime_type)
+            if translation is not None:
+                best = (similarity, translation)
+        return best[1] if best else None
+
+if __name__ == "__main__":
+    # Benchmark: python -m Translate_v2.fuzzy_memory --segments 100000 --queries 2000
+    import argparse
+    import statistics
+
+    parser = argparse.ArgumentParser(description="Benchmark fuzzy translation memory lookup")
+    parser.add_argument("--segments", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    subjects = ["外径寸法", "内径公差", "表面粗さ", "引張強度", "材料規格", "図面番号", "検査成績書", "梱包仕様"]
+    templates = [
+        "{s} 部品番号 {code} 改訂日 {date}",
+        "{s}は {num} mm 以下とする (図番 {code})",
+        "仕样書- {code} {s} 第{num}版",
+        "{s} ロット {code} 数量 {num} 個",
+    ]
+
+    def make_segment():
+        template = rng.choice(templates)
+        values = {
+            "s": rng.choice(subjects) + rng.choice(subjects),
+            "code": f"AY{rng.randrange(100000):05d}",
+            "date": f"2024/{rng.randrange(1, 13):02d}/{rng.randrange(1, 29):02d}",
+            "num": str(rng.randrange(1, 1000)),
+        }
+        source = template.format(**values)
+        translation = f"[vi] {values['s']} {values['code']} {values['date']} {values['num']} " + template[:4]
+        return source, translation
+
+    import resource
+
+    index = FuzzyIndex(max_segments=args.segments, budget=SegmentBudget(args.segments))
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    stored = []
+    for i in range(args.segments):
+        source, translation = make_segment()
+        index.add(source, translation)
+        if i < args.queries:
+            stored.append(source)
+    build_seconds = time.perf_counter() - started
+    memory_bytes = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) * 1024
+    print(f"Build: {len(index)} segment trong {build_seconds:.1f}s, {memory_bytes / len(index):.0f} byte/segment")
+
+    def revise(source):
+        # Đổi một mã phụ tùng / ngày, giữ nguyên phần còn lại
+        old = split_code_tokens(source)[1][0]
+        return source.replace(old, old[:-1] + str((int(old[-1]) + 1) % 10), 1)
+
+    latencies = []
+    hits = 0
+    for source in stored:
+        query = revise(source)
+        started = time.perf_counter()
+        result = index.lookup(query)
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += result is not None
+    latencies.sort()
+    print(
+        f"Lookup: {len(latencies)} query, hit {hits / len(latencies):.1%}, "
+        f"p50 {statistics.median(latencies):.3f} ms, p99 {latencies[int(len(latencies) * 0.99) - 1]:.3f} ms, "
+        f"max {latencies[-1]:.3f} ms"
+    )
@@ -0,0 +1,155 @@
+import unicodedata
+from .settings import LOCAL_DETECTION_ENABLED, LOCAL_DETECTION_MIN_CONFIDENCE
+
+# Số chữ cái cần có để tin hoàn toàn vào thống kê
+_FULL_CONFIDENCE_LETTERS = 30
+
+# Chữ cái chỉ có trong tiếng Việt (không tính các chữ có dấu dùng chung với tiếng Pháp/Bồ...)
+_VIETNAMESE_LETTERS = set(
+    "ăđơưạảấầẩẫậắằẳẵặẹẻẽếềểễệỉịọỏốồổỗộớờởỡợụủứừửữựỳỵỷỹ"
+    "ĂĐƠƯẠẢẤẦẨẪẬẮẰẲẴẶẸẺẼẾỀỂỄỆỈỊỌỎỐỒỔỖỘỚỜỞỠỢỤỦỨỪỬỮỰỲỴỶỸ"
+)
+# Chữ Hán giản thể thông dụng không dùng trong tiếng Nhật
+_SIMPLIFIED_ONLY = set("们这个为说国时会来对发现开关门问间样经过还进动们没给让从车东长书点应该产业务实")
+# Ký hiệu lặp/viết tắt chỉ có trong tiếng Nhật
+_JAPANESE_MARKS = set("々〆ヶ〇")
+
+def _script_counts(text):
+    counts = {"kana": 0, "han": 0, "latin": 0, "vietnamese": 0, "simplified": 0, "hangul": 0}
+    for ch in text:
+        code = ord(ch)
+        if 0x3040 <= code <= 0x30FF or 0x31F0 <= code <= 0x31FF or 0xFF66 <= code <= 0xFF9F or ch in _JAPANESE_MARKS:
+            counts["kana"] += 1
+        elif 0x4E00 <= code <= 0x9FFF or 0x3400 <= code <= 0x4DBF or 0xF900 <= code <= 0xFAFF:
+            counts["han"] += 1
+            if ch in _SIMPLIFIED_ONLY:
+                counts["simplified"] += 1
+        elif 0xAC00 <= code <= 0xD7AF:
+            counts["hangul"] += 1
+        elif ch.isalpha() and (code < 0x0250 or 0x1E00 <= code <= 0x1EFF):
+            counts["latin"] += 1
+            if ch in _VIETNAMESE_LETTERS:
+                counts["vietnamese"] += 1
+    return counts
+
+def detect_script_language(text):
+    """
+    Đoán ngôn ngữ theo chữ viết (kana / Hán / Latin) và tần suất chữ có dấu tiếng Việt.
+    Trả về (mã ngôn ngữ, độ tin cậy 0..1); mã None nếu không đoán được.
+    """
+    # NFC để chữ có dấu dạng tổ hợp (NFD) được đếm như chữ dựng sẵn
+    counts = _script_counts(unicodedata.normalize("NFC", text or ""))
+    cjk = counts["kana"] + counts["han"]
+    letters = cjk + counts["latin"] + counts["hangul"]
+    if not letters:
+        return None, 0.0
+    # Văn bản quá ngắn thì thống kê ít đáng tin
+    length_factor = min(1.0, letters / _FULL_CONFIDENCE_LETTERS) ** 0.5
+
+    if cjk >= counts["latin"]:
+        dominance = cjk / letters
+        kana_share = counts["kana"] / cjk
+        if kana_share >= 0.1:
+            confidence = 0.85 + min(kana_share, 0.4) * 0.375
+        elif counts["kana"]:
+            confidence = 0.6 + kana_share * 2
+        else:
+            # Chỉ có chữ Hán: tiếng Trung nếu có chữ giản thể, nếu không thì mơ hồ (tiêu đề tiếng Nhật toàn kanji)
+            simplified_share = counts["simplified"] / counts["han"]
+            if simplified_share >= 0.03:
+                return "zh-CN", min(1.0, 0.8 + simplified_share) * dominance * length_factor
+            return "zh-CN", 0.5 * dominance * length_factor
+        return "ja", confidence * dominance * length_factor
+
+    dominance = counts["latin"] / letters
+    vietnamese_share = counts["vietnamese"] / counts["latin"]
+    if vietnamese_share >= 0.04:
+        return "vi", min(1.0, 0.75 + vietnamese_share * 2) * dominance * length_factor
+    if vietnamese_share == 0:
+        return "en", 0.95 * dominance * length_factor
+    # Vài chữ có dấu lẻ tẻ (tên riêng, trích dẫn): không chắc chắn
+    return "en", 0.5 * dominance * length_factor
+
+if __name__ == "__main__":
+    # Benchmark: python -m Translate_v2.language_detector [--samples labeled.tsv] [--api]
+    # File mẫu: mỗi dòng "<mã ngôn ngữ>\t<văn bản>"
+    import argparse
+    import statistics
+    import time
+    from collections import Counter
+
+    parser = argparse.ArgumentParser(description="Benchmark local script-based language detection")
+    parser.add_argument("--samples", help="TSV có nhãn: language<TAB>text")
+    parser.add_argument("--api", action="store_true", help="đo thêm backend dịch hiện tại (TRANSLATION_BACKEND)")
+    args = parser.parse_args()
+
+    if args.samples:
+        with open(args.samples, encoding="utf-8") as f:
+            samples = [tuple(line.rstrip("\n").split("\t", 1)) for line in f if "\t" in line]
+    else:
+        samples = [
+            ("ja", "本製品の外径寸法は図面に従い、検査成績書を添付してください。"),
+            ("ja", "ロット番号 AY00139 の出荷前検査を実施しました。"),
+            ("ja", "引張強度試験 結果報告書 2024年5月"),
+            ("ja", "品質管理部 部長 山田 太郎"),
+            ("ja", "梱包仕様書に記載された数量を確認すること。"),
+            ("ja", "炭素繊維複合材料の表面処理工程について"),
+            ("ja", "使用する材料は JIS K 7113 に準拠すること"),
+            ("vi", "Kích thước đường kính ngoài phải tuân theo bản vẽ kỹ thuật."),
+            ("vi", "Vui lòng đính kèm phiếu kết quả kiểm tra trước khi giao hàng."),
+            ("vi", "Báo cáo kết quả thử nghiệm độ bền kéo tháng 5 năm 2024"),
+            ("vi", "Số lượng đóng gói theo quy cách"),
+            ("vi", "Phòng quản lý chất lượng"),
+            ("vi", "Nguyên vật liệu sử dụng phải tuân thủ tiêu chuẩn JIS K 7113"),
+            ("en", "The outer diameter shall comply with the drawing."),
+            ("en", "Please attach the inspection report before shipment."),
+            ("en", "Tensile strength test report, May 2024"),
+            ("en", "Quality Control Department"),
+            ("en", "Packing specification: quantity per carton as listed."),
+            ("en", "Carbon fiber composite surface treatment process"),
+            ("zh-CN", "本产品的外径尺寸应符合图纸要求，请在发货前附上检验报告。"),
+            ("zh-CN", "我们这个月的产量还没有达到计划目标。"),
+            ("zh-CN", "质量管理部门负责对进货进行检验。"),
+            ("zh-CN", "碳纤维复合材料的表面处理工艺"),
+        ]
+
+    def measure(detect):
+        latencies, correct, confusions = [], 0, Counter()
+        for label, text in samples:
+            started = time.perf_counter()
+            predicted = detect(text)
+            latencies.append((time.perf_counter() - started) * 1000)
+            correct += predicted == label
+            if predicted != label:
+                confusions[(label, predicted)] += 1
+        latencies.sort()
+        return correct / len(samples), statistics.median(latencies), latencies[-1], confusions
+
+    confident = [0]
+
+    def detect_local_only(text):
+        language, confidence = detect_script_language(text)
+        confident[0] += confidence >= LOCAL_DETECTION_MIN_CONFIDENCE
+        return language
+
+    accuracy, p50, worst, confusions = measure(detect_local_only)
+    print(
+        f"Local: {len(samples)} mẫu, accuracy {accuracy:.1%}, p50 {p50:.3f} ms, max {worst:.3f} ms, "
+        f"tin cậy >= {LOCAL_DETECTION_MIN_CONFIDENCE}: {confident[0] / len(samples):.1%} (còn lại gọi API)"
+    )
+    for (label, predicted), count in confusions.most_common():
+        print(f"  {label} -> {predicted}: {count}")
+
+    confident_correct = sum(
+        detect_script_language(text)[0] == label
+        for label, text in samples
+        if detect_script_language(text)[1] >= LOCAL_DETECTION_MIN_CONFIDENCE
+    )
+    if confident[0]:
+        print(f"Precision khi không gọi API: {confident_correct / confident[0]:.1%}")
+
+    if args.api:
+        from .translation_backend import get_backend
+        backend = get_backend()
+        accuracy, p50, worst, confusions = measure(backend.detect_language)
+        print(f"API ({backend.name}): accuracy {accuracy:.1%}, p50 {p50:.3f} ms, max {worst:.3f} ms")
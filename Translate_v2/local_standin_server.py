@@ -0,0 +1,91 @@
+import argparse
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from google.api_core import exceptions as google_exceptions
+from .translation_backend import LocalTranslationBackend
+
+def make_handler(backend):
+    class StandInHandler(BaseHTTPRequestHandler):
+        def _send(self, status, payload, retry_after=None):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            if retry_after is not None:
+                self.send_header("Retry-After", f"{retry_after:.3f}")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            try:
+                length = int(self.headers.get("Content-Length", "0"))
+                payload = json.loads(self.rfile.read(length).decode("utf-8") or "{}")
+                if not isinstance(payload, dict):
+                    raise ValueError("JSON body must be an object")
+            except (ValueError, UnicodeDecodeError) as e:
+                self._send(400, {"detail": f"Invalid JSON body: {e}"})
+                return
+            try:
+                if self.path == "/detect":
+                    self._send(200, {"language_code": backend.detect_language(payload["content"])})
+                elif self.path == "/translate":
+                    translations = backend.translate_batch(
+                        payload["contents"],
+                        payload.get("glossary_id"),
+                        payload.get("source_language_code"),
+                        payload["target_language_code"],
+                        payload.get("mime_type", "text/plain"),
+                    )
+                    self._send(200, {"translations": translations})
+                elif self.path == "/glossary":
+                    self._send(200, {"glossary": backend.lookup_glossary(payload["glossary_id"])})
+                else:
+                    self._send(404, {"detail": "Not found"})
+            except KeyError as e:
+                self._send(400, {"detail": f"Missing field: {e.args[0]}"})
+            except (TypeError, AttributeError, ValueError) as e:
+                self._send(400, {"detail": f"Invalid field: {e}"})
+            except google_exceptions.GoogleAPICallError as e:
+                self._send(e.code or 500, {"detail": e.message}, getattr(e, "retry_after", None))
+            except Exception as e:
+                self._send(500, {"detail": f"Internal error: {e}"})
+
+        def do_GET(self):
+            if self.path == "/stats":
+                self._send(200, backend.stats)
+            else:
+                self._send(404, {"detail": "Not found"})
+
+        def log_message(self, format, *args):
+            pass
+
+    return StandInHandler
+
+def run_server(host="127.0.0.1", port=8765, backend=None):
+    """Chạy server stand-in (HTTP/JSON) cho TRANSLATION_BACKEND=http"""
+    backend = backend or LocalTranslationBackend()
+    server = ThreadingHTTPServer((host, port), make_handler(backend))
+    print(f"🚀 Stand-in translation server tại http://{host}:{port}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    # python -m Translate_v2.local_standin_server --latency-ms 120 --error-rate 0.01 --chars-per-second 100000
+    parser = argparse.ArgumentParser(description="Local stand-in for the Cloud Translation API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--latency-per-char-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--chars-per-second", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run_server(args.host, args.port, LocalTranslationBackend(
+        latency_ms=args.latency_ms,
+        latency_per_char_ms=args.latency_per_char_ms,
+        error_rate=args.error_rate,
+        chars_per_second=args.chars_per_second,
+        seed=args.seed,
+    ))
@@ -0,0 +1,269 @@
+import copy
+import io
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from lxml import etree
+from .detect_lang import detect_file_language, LANGUAGES, language_pair
+from .segment_collector import SegmentCollector
+from .workspace import derived_path
+from .xml_stream import STREAM_PART_MIN_BYTES
+from .xml_process import serialize_part, write_package
+from .settings import PART_WORKERS
+
+_part_pool = None
+_part_pool_pid = None
+_part_pool_workers = None
+_part_pool_lock = threading.Lock()
+
+class UnsupportedLanguageError(ValueError):
+    """Ngôn ngữ nguồn hoặc cặp ngôn ngữ không được hỗ trợ (view trả về lỗi 400)"""
+
+def get_glossary_id(source_lang, target_lang):
+    """Glossary dùng cho cặp ngôn ngữ (thứ tự trong cặp không quan trọng)"""
+    pair_code = f"{source_lang}-{target_lang}" if f"{source_lang}-{target_lang}" in language_pair else f"{target_lang}-{source_lang}"
+    if pair_code not in language_pair:
+        raise UnsupportedLanguageError(f"Unsupported language pair: {pair_code}")
+    return f"toray_translation_glossary_{language_pair[pair_code]}"
+
+def _resolve_glossaries(source_lang, target_langs, outputs):
+    """
+    Glossary cho từng ngôn ngữ đích, xác định trước khi dịch.
+    Cặp không hỗ trợ được ghi lỗi vào outputs[ngôn ngữ đích] thay vì dừng mọi ngôn ngữ còn lại.
+    """
+    glossaries = {}
+    for target_lang in target_langs:
+        try:
+            glossaries[target_lang] = get_glossary_id(source_lang, target_lang)
+        except UnsupportedLanguageError as e:
+            print(f"❌ {target_lang}: {e}")
+            outputs[target_lang] = e
+    return glossaries
+
+def _get_part_pool(workers):
+    """Process pool dùng chung cho process hiện tại (tạo lại trong process con hoặc khi đổi số worker)"""
+    global _part_pool, _part_pool_pid, _part_pool_workers
+    pid = os.getpid()
+    with _part_pool_lock:
+        if _part_pool is None or _part_pool_pid != pid or _part_pool_workers != workers:
+            if _part_pool is not None and _part_pool_pid == pid:
+                _part_pool.shutdown(wait=False)
+            # Không fork process đang có nhiều thread (thread pool nén, executor dịch, loader TM):
+            # lock đang bị giữ ở thread khác sẽ bị sao chép vào worker và không bao giờ được nhả
+            _part_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("forkserver"))
+            _part_pool_pid = pid
+            _part_pool_workers = workers
+    return _part_pool
+
+def _prepare_part(file_path, name, load_part, collect_segments):
+    """
+    Chạy trong worker: parse + chuẩn hóa một part, gom các chuỗi cần dịch.
+    Trả về (tên part, XML đã chuẩn hóa, dict khóa -> chuỗi, dict chuỗi không cần dịch)
+    hoặc (tên part, None, None, None) nếu bỏ qua.
+    """
+    with zipfile.ZipFile(file_path) as package:
+        tree = load_part(package, name)
+    if tree is None:
+        return name, None, None, None
+    collector = SegmentCollector()
+    collect_segments([(name, tree)], collector, None)
+    return name, serialize_part(tree), collector.unique_texts, collector.skipped
+
+def _apply_part(name, data, translations, target_lang, collect_segments):
+    """Chạy trong worker: ghi bản dịch vào part đã chuẩn hóa và serialize lại"""
+    tree = etree.parse(io.BytesIO(data), etree.XMLParser(remove_blank_text=True))
+    collector = SegmentCollector()
+    collect_segments([(name, tree)], collector, target_lang)
+    collector.apply(translations, report=False)
+    return serialize_part(tree)
+
+def _stream_parts(file_path, names, stream_part, glossary_id, source_lang, target_lang):
+    """Dịch các part lớn theo chế độ streaming vào file tạm, trả về dict tên part -> đường dẫn file tạm"""
+    outputs = {}
+    with zipfile.ZipFile(file_path) as package:
+        for index, name in enumerate(names):
+            print(f"🌊 Streaming part: {name} ({package.getinfo(name).file_size / 1e6:.0f} MB)")
+            output_path = derived_path(file_path, f"_{target_lang}_stream{index}.xml")
+            with package.open(name) as source, open(output_path, "wb") as output:
+                stream_part(source, output, name, glossary_id, source_lang, target_lang)
+            outputs[name] = output_path
+    return outputs
+
+def _write_output(file_path, output_path, replaced_parts):
+    """write_package rồi xóa các file tạm của part streaming"""
+    try:
+        write_package(file_path, output_path, replaced_parts)
+    finally:
+        for value in replaced_parts.values():
+            if isinstance(value, str) and os.path.exists(value):
+                os.remove(value)
+    print(f"✅ Đã lưu file dịch: {output_path}")
+
+def _translate_parts_in_pool(file_path, names, source_lang, target_langs, load_part, collect_segments, workers,
+                             streamed=(), stream_part=None):
+    """Chế độ process pool: part được xử lý song song, mỗi chuỗi duy nhất vẫn chỉ dịch một lần ở process chính"""
+    pool = _get_part_pool(workers)
+    extension = file_path.rsplit(".", 1)[-1].lower()
+    outputs = {}
+
+    # Bước 1: parse, chuẩn hóa và gom segment trong các worker
+    prepared = []
+    source_collector = SegmentCollector()
+    for name, data, part_texts, part_skipped in pool.map(
+        _prepare_part,
+        [file_path] * len(names), names, [load_part] * len(names), [collect_segments] * len(names),
+    ):
+        if data is None:
+            continue
+        prepared.append((name, data, part_texts))
+        for key, text in part_texts.items():
+            source_collector.unique_texts.setdefault(key, text)
+        for key, text in part_skipped.items():
+            source_collector.skipped.setdefault(key, text)
+    print(f"⚙️ Part workers: {len(prepared)} part, {workers} process, {len(source_collector.unique_texts)} chuỗi duy nhất")
+    source_collector.report_skipped()
+
+    for target_lang, glossary_id in _resolve_glossaries(source_lang, target_langs, outputs).items():
+        try:
+            # Bước 2: dịch ở process chính (client dùng chung, có giới hạn tốc độ)
+            translations = source_collector.translate_unique(glossary_id, source_lang, target_lang)
+
+            # Bước 3: ghi bản dịch và serialize trong các worker
+            part_translations = [
+                {key: translations[key] for key in part_texts if key in translations}
+                for name, data, part_texts in prepared
+            ]
+            serialized = pool.map(
+                _apply_part,
+                [name for name, _, _ in prepared], [data for _, data, _ in prepared], part_translations,
+                [target_lang] * len(prepared), [collect_segments] * len(prepared),
+            )
+
+            # Bước 4: zip -> zip, chỉ các part đã dịch được nén lại
+            replaced_parts = dict(zip([name for name, _, _ in prepared], serialized))
+            replaced_parts.update(_stream_parts(file_path, streamed, stream_part, glossary_id, source_lang, target_lang))
+            output_path = derived_path(file_path, f"_{target_lang}.{extension}")
+            _write_output(file_path, output_path, replaced_parts)
+            outputs[target_lang] = output_path
+        except Exception as e:
+            print(f"❌ Lỗi khi dịch sang {target_lang}: {e}")
+            outputs[target_lang] = e
+
+    return outputs
+
+def translate_package(file_path, target_langs, source_lang, select_parts, load_part, collect_segments,
+                      part_workers=None, stream_part=None, stream_filter=None):
+    """
+    Dịch một gói OOXML sang nhiều ngôn ngữ đích với một lần đọc, parse và chuẩn hóa.
+    - select_parts(package) -> [tên part]: các part cần dịch
+    - load_part(package, tên part) -> tree hoặc None: parse + chuẩn hóa một part từ zip
+    - collect_segments(parsed_parts, collector, target_lang): đăng ký segment (và chỉnh sửa riêng theo ngôn ngữ đích)
+    - stream_part(source, output, tên part, glossary_id, source_lang, target_lang): dịch một part theo chế độ
+      streaming; part lớn hơn STREAM_PART_MIN_BYTES được xử lý như vậy (mỗi ngôn ngữ đích đọc lại part một lần).
+    - stream_filter(tên part, kích thước giải nén) -> bool: thay cho ngưỡng STREAM_PART_MIN_BYTES khi chọn part streaming
+    part_workers > 1 (mặc định TRANSLATE_PART_WORKERS): các part được xử lý song song trên process pool.
+    Part đã dịch được nén lại, mọi entry khác chép nguyên dữ liệu nén sang file đích (không giải nén ra đĩa).
+    Trả về dict ngôn ngữ đích -> đường dẫn file đã dịch, hoặc Exception nếu riêng ngôn ngữ đó lỗi
+    (cặp ngôn ngữ không hỗ trợ, lỗi API dịch...); các ngôn ngữ khác vẫn được dịch bình thường.
+    """
+    extension = file_path.rsplit(".", 1)[-1].lower()
+    outputs = {}
+    part_workers = part_workers or PART_WORKERS
+
+    source_lang = source_lang or detect_file_language(file_path)
+    if source_lang not in LANGUAGES:
+        raise UnsupportedLanguageError(f"Unsupported source language: {source_lang}")
+    print(f"Detected language: {LANGUAGES[source_lang]}")
+    target_langs = [lang for lang in target_langs if lang != source_lang]
+
+    with zipfile.ZipFile(file_path) as package:
+        names = select_parts(package)
+        stream_filter = stream_filter or (lambda name, file_size: file_size >= STREAM_PART_MIN_BYTES)
+        streamed = [
+            name for name in names
+            if stream_part is not None and stream_filter(name, package.getinfo(name).file_size)
+        ]
+    names = [name for name in names if name not in streamed]
+    if part_workers > 1 and len(names) > 1:
+        return _translate_parts_in_pool(
+            file_path, names, source_lang, target_langs, load_part, collect_segments, part_workers,
+            streamed, stream_part,
+        )
+
+    # Bước 1: parse, chuẩn hóa và gom segment một lần cho mọi ngôn ngữ đích
+    parsed_parts = []
+    with zipfile.ZipFile(file_path) as package:
+        for name in names:
+            tree = load_part(package, name)
+            if tree is not None:
+                parsed_parts.append((name, tree))
+    source_collector = SegmentCollector()
+    collect_segments(parsed_parts, source_collector, None)
+
+    glossaries = _resolve_glossaries(source_lang, target_langs, outputs)
+    for index, (target_lang, glossary_id) in enumerate(glossaries.items()):
+        try:
+            # Bước 2: dịch tập chuỗi duy nhất sang ngôn ngữ đích
+            translations = source_collector.translate_unique(glossary_id, source_lang, target_lang)
+
+            # Bước 3: ghi bản dịch vào bản sao của cây XML (ngôn ngữ cuối dùng luôn bản gốc)
+            is_last = index == len(glossaries) - 1
+            target_parts = parsed_parts if is_last else [(name, copy.deepcopy(tree)) for name, tree in parsed_parts]
+            collector = SegmentCollector()
+            collect_segments(target_parts, collector, target_lang)
+            collector.apply(translations)
+
+            # Bước 4: zip -> zip, chỉ các part đã dịch được nén lại
+            replaced_parts = {name: serialize_part(tree) for name, tree in target_parts}
+            replaced_parts.update(_stream_parts(file_path, streamed, stream_part, glossary_id, source_lang, target_lang))
+            output_path = derived_path(file_path, f"_{target_lang}.{extension}")
+            _write_output(file_path, output_path, replaced_parts)
+            outputs[target_lang] = output_path
+        except Exception as e:
+            print(f"❌ Lỗi khi dịch sang {target_lang}: {e}")
+            outputs[target_lang] = e
+
+    return outputs
+
+if __name__ == "__main__":
+    # Benchmark: python -m Translate_v2.multi_target deck.pptx report.docx --workers 1 2 4
+    import argparse
+    import contextlib
+    import time
+    from . import multi_target, translate_docx, translate_pptx, translate_xlsx, translation_memory
+    from .translation_backend import LocalTranslationBackend, set_backend
+    from .workspace import job_workspace
+
+    parser = argparse.ArgumentParser(description="Benchmark part processing on a process pool")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--targets", nargs="+", default=["vi"])
+    parser.add_argument("--source", default="ja")
+    parser.add_argument("--repeat", type=int, default=2)
+    args = parser.parse_args()
+
+    # Chỉ đo phần xử lý XML: API dịch giả lập không độ trễ, không dùng translation memory
+    set_backend(LocalTranslationBackend())
+    translation_memory.TM_ENABLED = False
+    formats = {"docx": translate_docx, "pptx": translate_pptx, "xlsx": translate_xlsx}
+
+    print(f"CPU: {os.cpu_count()}")
+    for path in args.files:
+        fmt = formats[path.rsplit(".", 1)[-1].lower()]
+        print(f"\n{path}: {os.path.getsize(path) / 1e6:.1f} MB")
+        baseline = None
+        for workers in args.workers:
+            timings = []
+            for _ in range(args.repeat):
+                with job_workspace(), contextlib.redirect_stdout(io.StringIO()):
+                    started = time.perf_counter()
+                    multi_target.translate_package(
+                        path, args.targets, args.source, fmt.select_parts, fmt.load_part, fmt.collect_segments,
+                        part_workers=workers,
+                    )
+                    timings.append(time.perf_counter() - started)
+            elapsed = min(timings)
+            baseline = baseline or elapsed
+            print(f"  {workers} worker: {elapsed:.2f}s (x{baseline / elapsed:.2f})")
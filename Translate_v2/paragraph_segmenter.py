@@ -0,0 +1,88 @@
+import html
+import re
+from .settings import PARAGRAPH_SEGMENTS_ENABLED
+
+PARAGRAPH_TAGS = (
+    "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}p",
+    "{http://schemas.openxmlformats.org/drawingml/2006/main}p",
+)
+_W_T = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}t"
+_XML_SPACE = "{http://www.w3.org/XML/1998/namespace}space"
+_RUN_TAG_RE = re.compile(r"""<span\s+id=["']?r(\d+)["']?\s*>|</span\s*>""", re.IGNORECASE)
+
+def build_paragraph_html(texts):
+    """Mỗi run là một thẻ <span id="rN">, API dịch cả câu và giữ thẻ quanh phần dịch tương ứng"""
+    return "".join(f'<span id="r{i}">{html.escape(text, quote=False)}</span>' for i, text in enumerate(texts))
+
+def split_paragraph_html(translated_html, count):
+    """
+    Tách bản dịch HTML về từng run (đã unescape), trả về (text theo run, thứ tự run trong bản dịch).
+    Run bị mất thẻ nhận chuỗi rỗng; text nằm ngoài thẻ được gắn vào run đứng trước (hoặc run đầu tiên).
+    """
+    pieces = [""] * count
+    order = []
+    current = 0
+    position = 0
+    for match in _RUN_TAG_RE.finditer(translated_html):
+        pieces[current] += translated_html[position:match.start()]
+        position = match.end()
+        if match.group(1) is not None and int(match.group(1)) < count:
+            current = int(match.group(1))
+            if current not in order:
+                order.append(current)
+    pieces[current] += translated_html[position:]
+    return [html.unescape(piece) for piece in pieces], order
+
+def _reorder_runs(runs, order):
+    """Đổi chỗ các run (cùng cha) theo thứ tự của bản dịch, định dạng đi theo đúng phần text của nó"""
+    parent = runs[0].getparent()
+    if parent is None or any(run.getparent() is not parent for run in runs) or len(set(runs)) != len(runs):
+        return
+    ordered = [runs[i] for i in order] + [run for i, run in enumerate(runs) if i not in order]
+    markers = []
+    for run in runs:
+        marker = run.makeelement("slot")
+        run.addprevious(marker)
+        markers.append(marker)
+    for marker, run in zip(markers, ordered):
+        marker.addnext(run)
+        parent.remove(marker)
+
+def _add_paragraph(collector, elems, on_translated):
+    def apply_translation(translated_html):
+        pieces, order = split_paragraph_html(translated_html, len(elems))
+        for elem, text in zip(elems, pieces):
+            elem.text = text
+            if elem.tag == _W_T and text != text.strip():
+                elem.set(_XML_SPACE, "preserve")
+            if on_translated is not None:
+                on_translated(elem)
+        if order != sorted(order):
+            _reorder_runs([elem.getparent() for elem in elems], order)
+
+    collector.add(build_paragraph_html([elem.text for elem in elems]), apply_translation, "text/html")
+
+def add_text_elems(collector, elems, on_translated=None):
+    """
+    Đăng ký các phần tử text (<w:t>, <a:t>...) có nội dung vào collector.
+    Các phần tử thuộc cùng một đoạn được gửi thành một segment HTML để câu không bị cắt theo run,
+    bản dịch được tách lại về đúng các run. Đoạn chỉ có một run vẫn là segment text thường.
+    """
+    if not PARAGRAPH_SEGMENTS_ENABLED:
+        for elem in elems:
+            collector.add_text_elem(elem, on_translated)
+        return
+
+    paragraphs = {}
+    for elem in elems:
+        paragraph = next(elem.iterancestors(*PARAGRAPH_TAGS), None)
+        if paragraph is None:
+            collector.add_text_elem(elem, on_translated)
+        else:
+            paragraphs.setdefault(paragraph, []).append(elem)
+
+    for paragraph_elems in paragraphs.values():
+        if len(paragraph_elems) == 1:
+            collector.add_text_elem(paragraph_elems[0], on_translated)
+        else:
+            _add_paragraph(collector, paragraph_elems, on_translated)
@@ -0,0 +1,99 @@
+import html
+from . import segment_filter
+from .translate_text import translate_batch_with_glossary
+from .translation_memory import normalize_segment
+
+class SegmentCollector:
+    """
+    Gom các text node dịch được trên toàn bộ các part của một tài liệu.
+    Mỗi chuỗi duy nhất (sau chuẩn hóa) chỉ được gửi dịch một lần,
+    kết quả được ghi lại vào tất cả các node chứa chuỗi đó.
+    Chuỗi không cần dịch (mã hàng, số, đơn vị, URL...) được giữ nguyên, không gửi API (xem segment_filter).
+    """
+
+    def __init__(self):
+        self.nodes = []
+        self.unique_texts = {}
+        self.skipped = {}
+
+    def add(self, text, apply_translation, mime_type="text/plain"):
+        """
+        Đăng ký một segment. `apply_translation(translated_text)` được gọi
+        với bản dịch (đã unescape) sau khi dịch xong.
+        mime_type="text/html": text là HTML, apply_translation nhận nguyên bản dịch HTML (chưa unescape).
+        """
+        key = normalize_segment(text)
+        if not key:
+            return
+        key = (mime_type, key)
+        if segment_filter.SEGMENT_FILTER_ENABLED and segment_filter.is_untranslatable(key[1], mime_type):
+            self.skipped.setdefault(key, text)
+            return
+        self.unique_texts.setdefault(key, text)
+        self.nodes.append((key, text, apply_translation))
+
+    def add_text_elem(self, elem, on_translated=None):
+        """Đăng ký phần tử có text (<w:t>, <a:t>, <t>), mặc định ghi đè elem.text"""
+        def apply_translation(translated_text):
+            elem.text = translated_text
+            if on_translated is not None:
+                on_translated(elem)
+
+        self.add(elem.text.strip(), apply_translation)
+
+    def translate_unique(self, glossary_id, source_lang, target_lang):
+        """Dịch các chuỗi duy nhất, trả về dict (mime type, khóa chuẩn hóa) -> bản dịch (chưa ghi vào node)"""
+        translations = {}
+        for mime_type in ("text/plain", "text/html"):
+            keys = [key for key in self.unique_texts if key[0] == mime_type]
+            if not keys:
+                continue
+            texts = [self.unique_texts[key] for key in keys]
+            translated_texts = translate_batch_with_glossary(texts, glossary_id, source_lang, target_lang, mime_type)
+            translations.update(zip(keys, translated_texts))
+        return translations
+
+    def apply(self, translations, report=True):
+        """
+        Ghi bản dịch vào mọi node, trả về thống kê (report=False: không in thống kê).
+        `translations` có thể lấy từ một collector khác gom trên cùng nội dung (bản sao của cây XML).
+        """
+        for key, original_text, apply_translation in self.nodes:
+            translated_text = translations.get(key)
+            if translated_text:
+                apply_translation(html.unescape(translated_text) if key[0] == "text/plain" else translated_text)
+            else:
+                print(f"⚠️ Lỗi khi dịch đoạn text: {original_text}")
+
+        stats = {
+            "segments": len(self.nodes),
+            "unique_segments": len(self.unique_texts),
+            "dedup_ratio": 1 - len(self.unique_texts) / len(self.nodes) if self.nodes else 0.0,
+            **self.skip_stats(),
+        }
+        if report:
+            print(
+                f"🔁 Dedup: {stats['segments']} segment -> {stats['unique_segments']} chuỗi duy nhất "
+                f"(giảm {stats['dedup_ratio']:.1%})"
+            )
+            self.report_skipped()
+        return stats
+
+    def skip_stats(self):
+        """Số chuỗi duy nhất / số ký tự không phải gửi API nhờ bộ lọc segment không cần dịch"""
+        return {
+            "skipped_segments": len(self.skipped),
+            "skipped_chars": sum(len(segment_filter.segment_text(text, key[0])) for key, text in self.skipped.items()),
+        }
+
+    def report_skipped(self):
+        stats = self.skip_stats()
+        if stats["skipped_segments"]:
+            print(
+                f"⏭️ Bỏ qua {stats['skipped_segments']} chuỗi không cần dịch (mã, số, đơn vị, URL...), "
+                f"tiết kiệm {stats['skipped_chars']} ký tự gửi API"
+            )
+
+    def translate(self, glossary_id, source_lang, target_lang):
+        """Dịch các chuỗi duy nhất rồi ghi kết quả vào mọi node, trả về thống kê"""
+        return self.apply(self.translate_unique(glossary_id, source_lang, target_lang))
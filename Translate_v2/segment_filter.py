@@ -0,0 +1,68 @@
+import html
+import re
+import unicodedata
+from .settings import SEGMENT_FILTER_ENABLED
+
+_UNITS = (
+    "mm|cm|m|km|μm|µm|um|nm|inch|in|ft|mm2|mm3|cm2|cm3|m2|m3|mm²|mm³|cm²|cm³|m²|m³|"
+    "g|kg|mg|t|ton|lb|N|kN|kgf|N·m|Nm|N/mm2|N/mm²|Pa|kPa|MPa|GPa|bar|psi|"
+    "°C|°F|K|%|ppm|V|kV|mV|A|mA|W|kW|MW|Wh|kWh|Hz|kHz|MHz|GHz|Ω|kΩ|MΩ|dB|"
+    "s|ms|sec|min|h|hr|rpm|L|mL|ml|l|cc|pcs|PCS|dtex|tex|lux|lx|°"
+)
+_NUMBER = r"[±+\-~]?\s*[φΦØ⌀]?\s*\d+(?:[.,]\d+)*"
+_MEASURE = rf"{_NUMBER}\s*(?:(?:{_UNITS})(?![A-Za-z]))?"
+_MEASURE_RE = re.compile(rf"{_MEASURE}(?:\s*(?:[x×X*~\-–/:+]|±)\s*{_MEASURE})*\s*")
+# Mã hàng / bản vẽ / quy cách: chữ in hoa, số và ký tự nối, có ít nhất một chữ số (AY00139, SUS304, M6x1.0-B)
+_CODE_RE = re.compile(r"(?=[^\s]*\d)(?![^\s]*[a-z]{2})[A-Z0-9][A-Za-z0-9\-_./#:()]*")
+_URL_RE = re.compile(r"(?:https?://|ftp://|www\.)\S+", re.IGNORECASE)
+_EMAIL_RE = re.compile(r"[\w.+\-]+@[\w\-]+(?:\.[\w\-]+)+")
+_DATETIME_RE = re.compile(r"\d{4}-\d{1,2}-\d{1,2}[T ]\d{1,2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+\-]\d{2}:?\d{2})?")
+_HTML_TAG_RE = re.compile(r"<[^>]+>")
+_LETTERS_RE = re.compile(r"[^\W\d_]+")
+# Chữ Hán, kana, hangul: segment có các ký tự này luôn được dịch
+_CJK_RE = re.compile(r"[\u3040-\u30ff\u31f0-\u31ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af\uff66-\uff9f]")
+# Chữ cái được phép trong số đo: đơn vị, ký hiệu đường kính, dấu nhân
+_MEASURE_LETTERS = {word for unit in _UNITS.split("|") for word in _LETTERS_RE.findall(unit)} | {"φ", "Φ", "Ø", "x", "X"}
+_PATTERNS = (_CODE_RE, _URL_RE, _EMAIL_RE, _DATETIME_RE)
+
+def _has_letter(text):
+    return any(unicodedata.category(ch).startswith("L") for ch in text)
+
+def segment_text(text, mime_type="text/plain"):
+    """Phần text hiển thị của segment (segment HTML: bỏ thẻ, unescape)"""
+    if mime_type == "text/html":
+        return html.unescape(_HTML_TAG_RE.sub("", text))
+    return text
+
+def is_untranslatable(text, mime_type="text/plain"):
+    """
+    True nếu segment không chứa gì cần dịch (bản dịch sẽ giống hệt bản gốc):
+    không có chữ cái (số, ngày dạng số, dấu câu, ký hiệu) hoặc khớp toàn bộ với mẫu mã hàng,
+    số kèm đơn vị, URL, email, ngày giờ ISO. text nên được chuẩn hóa NFKC trước (chữ số, ký tự toàn góc).
+    Segment có chữ Hán/kana (約10mm, 外径 12 mm) hoặc có chữ cái không phải đơn vị trong số đo luôn được dịch.
+    mime_type="text/html": chỉ xét phần text giữa các thẻ.
+    """
+    text = segment_text(text, mime_type).strip()
+    if not text or not _has_letter(text):
+        return True
+    if _CJK_RE.search(text):
+        return False
+    if len(text) == 1:
+        # Nhãn một chữ cái Latin (A, B, x...)
+        return text.isascii()
+    if any(pattern.fullmatch(text) for pattern in _PATTERNS):
+        return True
+    return bool(_MEASURE_RE.fullmatch(text)) and all(
+        word in _MEASURE_LETTERS for word in _LETTERS_RE.findall(text)
+    )
+
+if __name__ == "__main__":
+    # Kiểm tra nhanh: python -m Translate_v2.segment_filter
+    samples = [
+        "AY00139", "SUS304", "M6x1.0", "12.5 mm", "φ12±0.05", "100 x 200 mm", "20~30℃", "1,200 kg", "50%",
+        "2024/01/05", "2024-01-05T10:30", "https://www.toray.co.jp/", "info@toray.com", "・", "(1)", "A",
+        "製品番号", "約10mm", "Step1", "外径 12 mm", "Kích thước", "OK", "Note", "Ver. 2", "2024年1月5日",
+    ]
+    for sample in samples:
+        normalized = unicodedata.normalize("NFKC", sample)
+        print(f"{'⏭️  bỏ qua' if is_untranslatable(normalized) else '🌐 dịch  '}  {sample}")
@@ -0,0 +1,134 @@
+import html
+import re
+from .settings import PACKING_ENABLED, PACK_MAX_SEGMENT_CHARS, PACK_MAX_CHARS, PACK_MAX_SEGMENTS
+
+# Marker là thẻ HTML rỗng (void element): API dịch giữ nguyên thẻ và không dịch thuộc tính
+_MARKER_TEMPLATE = '<br data-seg="{}">'
+_MARKER_RE = re.compile(r'<br\s+data-seg="(\d+)"\s*/?>')
+
+def _split_whitespace(text):
+    core = text.strip()
+    if not core:
+        return text, "", ""
+    start = text.index(core)
+    return text[:start], core, text[start + len(core):]
+
+def plan_packs(texts, max_segment_chars=PACK_MAX_SEGMENT_CHARS, max_chars=PACK_MAX_CHARS, max_segments=PACK_MAX_SEGMENTS):
+    """
+    Chia các vị trí segment thành (packs, singles):
+    - packs: list các list vị trí segment ngắn được gộp chung một content,
+    - singles: vị trí segment dài, rỗng hoặc nhiều dòng, gửi riêng như bình thường.
+    Pack chỉ có một segment được trả lại cho singles.
+    """
+    packs = []
+    singles = []
+    current = []
+    current_chars = 0
+    for i, text in enumerate(texts):
+        core = text.strip()
+        if not core or len(core) > max_segment_chars or "\n" in core or _MARKER_RE.search(core):
+            singles.append(i)
+            continue
+        size = len(core) + len(_MARKER_TEMPLATE) + 4
+        if current and (current_chars + size > max_chars or len(current) >= max_segments):
+            packs.append(current)
+            current, current_chars = [], 0
+        current.append(i)
+        current_chars += size
+    if current:
+        packs.append(current)
+
+    for pack in [pack for pack in packs if len(pack) == 1]:
+        packs.remove(pack)
+        singles.append(pack[0])
+    singles.sort()
+    return packs, singles
+
+def build_packed_text(texts, mime_type="text/plain"):
+    """Nối các segment thành một content HTML, mỗi segment đứng sau marker đánh số của nó"""
+    parts = []
+    for number, text in enumerate(texts):
+        core = text.strip()
+        if mime_type != "text/html":
+            core = html.escape(core, quote=False)
+        parts.append(_MARKER_TEMPLATE.format(number) + core)
+    return "".join(parts)
+
+def unpack_translation(translated_text, texts, mime_type="text/plain"):
+    """
+    Tách bản dịch của content đã gộp thành bản dịch từng segment.
+    Trả về None nếu marker bị mất, lặp hoặc đổi thứ tự (khi đó cần dịch lại từng segment).
+    """
+    if not translated_text:
+        return None
+    pieces = _MARKER_RE.split(translated_text)
+    # pieces = [phần trước marker đầu, số, bản dịch, số, bản dịch, ...]
+    if pieces[0].strip() or len(pieces) != 2 * len(texts) + 1:
+        return None
+    numbers = pieces[1::2]
+    if numbers != [str(number) for number in range(len(texts))]:
+        return None
+
+    results = []
+    for text, piece in zip(texts, pieces[2::2]):
+        piece = piece.strip()
+        if not piece:
+            return None
+        if mime_type != "text/html":
+            piece = html.unescape(piece)
+        leading, _, trailing = _split_whitespace(text)
+        results.append(leading + piece + trailing)
+    return results
+
+if __name__ == "__main__":
+    # Benchmark theo định dạng: python -m Translate_v2.segment_packer file.docx file.pptx file.xlsx
+    import argparse
+    import time
+    import zipfile
+    from lxml import etree
+    from .translation_backend import LocalTranslationBackend, set_backend
+    from . import translate_text
+
+    parser = argparse.ArgumentParser(description="Benchmark short-segment packing per document format")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--latency-ms", type=float, default=150, help="độ trễ giả lập mỗi request")
+    parser.add_argument("--latency-per-segment-ms", type=float, default=2, help="chi phí giả lập mỗi segment")
+    args = parser.parse_args()
+
+    text_tags = {
+        "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}t",
+        "{http://schemas.openxmlformats.org/drawingml/2006/main}t",
+        "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}t",
+    }
+
+    def collect_segments(path):
+        segments = []
+        with zipfile.ZipFile(path) as archive:
+            for name in archive.namelist():
+                if not name.endswith(".xml"):
+                    continue
+                root = etree.fromstring(archive.read(name))
+                segments.extend(elem.text for elem in root.iter(*text_tags) if elem.text and elem.text.strip())
+        # Giống SegmentCollector: mỗi chuỗi chỉ dịch một lần
+        return list(dict.fromkeys(segments))
+
+    class SegmentCostBackend(LocalTranslationBackend):
+        def translate_batch(self, contents, glossary_id, source_lang_code, target_lang_code, mime_type="text/plain"):
+            time.sleep(args.latency_per_segment_ms * len(contents) / 1000.0)
+            return super().translate_batch(contents, glossary_id, source_lang_code, target_lang_code, mime_type)
+
+    for path in args.files:
+        segments = collect_segments(path)
+        print(f"\n{path}: {len(segments)} segment, {sum(len(s) for s in segments)} ký tự")
+        for enabled in (False, True):
+            backend = SegmentCostBackend(latency_ms=args.latency_ms)
+            set_backend(backend)
+            translate_text.segment_packer.PACKING_ENABLED = enabled
+            started = time.perf_counter()
+            translate_text._translate_uncached(segments, "bench", "ja", "vi", "text/plain")
+            elapsed = time.perf_counter() - started
+            print(
+                f"  packing={'on ' if enabled else 'off'}: {backend.stats['requests']} request, "
+                f"{backend.stats['segments']} content, {elapsed:.2f}s, "
+                f"{len(segments) / elapsed:.0f} segment/s"
+            )
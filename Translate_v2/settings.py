@@ -0,0 +1,110 @@
+import os
+import tempfile
+from dotenv import load_dotenv
+
+# Nạp .env một lần cho cả package; các module import cấu hình từ đây (có thể ghi đè bằng biến môi trường)
+load_dotenv()
+
+PROJECT_ID = os.getenv("PROJECT_ID")
+
+# Backend dịch: google (Cloud Translation v3), local (stand-in trong process) hoặc http (stand-in server)
+TRANSLATION_BACKEND = os.getenv("TRANSLATION_BACKEND", "google")
+TRANSLATION_BACKEND_URL = os.getenv("TRANSLATION_BACKEND_URL", "http://127.0.0.1:8765")
+LOCAL_BACKEND_LATENCY_MS = float(os.getenv("LOCAL_BACKEND_LATENCY_MS", "0"))
+LOCAL_BACKEND_LATENCY_PER_CHAR_MS = float(os.getenv("LOCAL_BACKEND_LATENCY_PER_CHAR_MS", "0"))
+LOCAL_BACKEND_ERROR_RATE = float(os.getenv("LOCAL_BACKEND_ERROR_RATE", "0"))
+LOCAL_BACKEND_CHARS_PER_SECOND = int(os.getenv("LOCAL_BACKEND_CHARS_PER_SECOND", "0"))
+LOCAL_BACKEND_SEED = int(os.getenv("LOCAL_BACKEND_SEED", "0"))
+
+# Tùy chọn cho gRPC channel dùng chung
+GRPC_KEEPALIVE_TIME_MS = int(os.getenv("TRANSLATE_GRPC_KEEPALIVE_TIME_MS", "30000"))
+GRPC_KEEPALIVE_TIMEOUT_MS = int(os.getenv("TRANSLATE_GRPC_KEEPALIVE_TIMEOUT_MS", "10000"))
+GRPC_MAX_MESSAGE_LENGTH = int(os.getenv("TRANSLATE_GRPC_MAX_MESSAGE_LENGTH", str(32 * 1024 * 1024)))
+
+# Số request dịch chạy song song và quota ký tự/phút của project
+TRANSLATE_MAX_WORKERS = int(os.getenv("TRANSLATE_MAX_WORKERS", "8"))
+TRANSLATE_CHARS_PER_MINUTE = int(os.getenv("TRANSLATE_CHARS_PER_MINUTE", "6000000"))
+
+# Cấu hình AIMD
+AIMD_INITIAL_WINDOW = float(os.getenv("TRANSLATE_AIMD_INITIAL_WINDOW", "2"))
+AIMD_MIN_WINDOW = float(os.getenv("TRANSLATE_AIMD_MIN_WINDOW", "1"))
+AIMD_MAX_WINDOW = float(os.getenv("TRANSLATE_AIMD_MAX_WINDOW", str(TRANSLATE_MAX_WORKERS)))
+AIMD_ADDITIVE_INCREASE = float(os.getenv("TRANSLATE_AIMD_ADDITIVE_INCREASE", "1"))
+AIMD_DECREASE_FACTOR = float(os.getenv("TRANSLATE_AIMD_DECREASE_FACTOR", "0.5"))
+# Request chậm hơn mức này được xem là không khỏe (không tăng window)
+AIMD_LATENCY_TARGET_SECONDS = float(os.getenv("TRANSLATE_AIMD_LATENCY_TARGET_SECONDS", "5"))
+# Thời gian chờ mặc định khi bị 429 mà không có gợi ý retry-after
+AIMD_DEFAULT_BACKOFF_SECONDS = float(os.getenv("TRANSLATE_AIMD_DEFAULT_BACKOFF_SECONDS", "1"))
+
+# Cấu hình translation memory
+TM_ENABLED = os.getenv("TRANSLATION_MEMORY_ENABLED", "1") == "1"
+# Thư mục dữ liệu lâu dài (không nằm trong thư mục mã nguồn của package)
+DATA_DIR = os.getenv(
+    "TRANSLATE_DATA_DIR",
+    os.path.join(os.getenv("XDG_DATA_HOME", os.path.join(os.path.expanduser("~"), ".local", "share")), "toray_translate"),
+)
+TM_DB_PATH = os.getenv("TRANSLATION_MEMORY_DB", os.path.join(DATA_DIR, "translation_memory.sqlite3"))
+TM_MAX_MEMORY_BYTES = int(os.getenv("TRANSLATION_MEMORY_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Cấu hình fuzzy matching
+FUZZY_MATCH_ENABLED = os.getenv("FUZZY_MATCH_ENABLED", "1") == "1"
+FUZZY_MATCH_THRESHOLD = float(os.getenv("FUZZY_MATCH_THRESHOLD", "0.7"))
+# Số segment tối đa của một phạm vi và của mọi phạm vi cộng lại trong process
+# (mỗi segment tốn khoảng 0.7-1 KB: 200000 segment ~ 200 MB)
+FUZZY_MAX_SEGMENTS = int(os.getenv("FUZZY_MAX_SEGMENTS", "100000"))
+FUZZY_MAX_TOTAL_SEGMENTS = int(os.getenv("FUZZY_MAX_TOTAL_SEGMENTS", "200000"))
+# Số ứng viên tối đa được so khớp chính xác cho mỗi lần tra cứu
+FUZZY_MAX_CANDIDATES = int(os.getenv("FUZZY_MAX_CANDIDATES", "16"))
+# Bucket LSH đầy thì không thêm nữa để thời gian tra cứu bị chặn trên
+FUZZY_MAX_BUCKET_SIZE = int(os.getenv("FUZZY_MAX_BUCKET_SIZE", "256"))
+
+# Cấu hình đóng gói segment ngắn
+PACKING_ENABLED = os.getenv("SEGMENT_PACKING_ENABLED", "1") == "1"
+# Segment dài hơn ngưỡng này được gửi riêng như bình thường
+PACK_MAX_SEGMENT_CHARS = int(os.getenv("SEGMENT_PACKING_MAX_SEGMENT_CHARS", "60"))
+PACK_MAX_CHARS = int(os.getenv("SEGMENT_PACKING_MAX_CHARS", "2000"))
+PACK_MAX_SEGMENTS = int(os.getenv("SEGMENT_PACKING_MAX_SEGMENTS", "50"))
+
+# Bỏ qua (không gửi API) các segment chắc chắn không cần dịch: mã hàng, số, đơn vị, ngày, URL, email, dấu câu
+SEGMENT_FILTER_ENABLED = os.getenv("SEGMENT_FILTER_ENABLED", "1") == "1"
+# Gộp các run của một đoạn (w:p / a:p) thành một segment HTML
+PARAGRAPH_SEGMENTS_ENABLED = os.getenv("PARAGRAPH_SEGMENTS_ENABLED", "1") == "1"
+
+TERM_PROTECTION_ENABLED = os.getenv("TERM_PROTECTION_ENABLED", "1") == "1"
+# Chu kỳ (giây) kiểm tra phiên bản thư viện thuật ngữ trong DB; thuật ngữ được duyệt/sửa/xóa ở worker khác
+# được nạp lại trong tối đa chừng này giây
+TERM_VERSION_CHECK_SECONDS = float(os.getenv("TERM_VERSION_CHECK_SECONDS", "5"))
+
+# Cấu hình phát hiện ngôn ngữ cục bộ
+LOCAL_DETECTION_ENABLED = os.getenv("LANGUAGE_DETECTION_LOCAL_ENABLED", "1") == "1"
+# Độ tin cậy dưới ngưỡng này thì hỏi API
+LOCAL_DETECTION_MIN_CONFIDENCE = float(os.getenv("LANGUAGE_DETECTION_MIN_CONFIDENCE", "0.8"))
+# Số file (theo SHA-256) được nhớ kết quả phát hiện ngôn ngữ trong process
+DETECTION_CACHE_SIZE = int(os.getenv("LANGUAGE_DETECTION_CACHE_SIZE", "1024"))
+
+# Cấu hình thư mục làm việc của từng job
+WORKSPACE_ROOT = os.getenv("TRANSLATE_WORKSPACE_ROOT", os.path.join(tempfile.gettempdir(), "toray_translate"))
+WORKSPACE_USE_SHM = os.getenv("TRANSLATE_WORKSPACE_USE_SHM", "0") == "1"
+SHM_ROOT = os.getenv("TRANSLATE_WORKSPACE_SHM_ROOT", "/dev/shm/toray_translate")
+# Tổng dung lượng tối đa các job đang chạy được đặt trên tmpfs, vượt quá thì dùng ổ đĩa
+SHM_BUDGET_BYTES = int(os.getenv("TRANSLATE_WORKSPACE_SHM_BUDGET_BYTES", str(512 * 1024 * 1024)))
+# Giữ lại thư mục job sau khi xong (giây) để debug; 0 = xóa ngay
+RETENTION_SECONDS = float(os.getenv("TRANSLATE_WORKSPACE_RETENTION_SECONDS", "0"))
+
+# Số process xử lý part song song (parse, chuẩn hóa, ghi lại XML); 1 = xử lý ngay trong process hiện tại.
+# Việc gọi API dịch vẫn chạy ở process chính qua client dùng chung (giới hạn tốc độ, concurrency).
+PART_WORKERS = int(os.getenv("TRANSLATE_PART_WORKERS", "1"))
+
+# Part XML lớn hơn ngưỡng này (kích thước giải nén) được dịch theo chế độ streaming, bộ nhớ không phụ thuộc kích thước part
+STREAM_PART_MIN_BYTES = int(os.getenv("TRANSLATE_STREAM_PART_MIN_BYTES", str(64 * 1024 * 1024)))
+# Giới hạn số record / số ký tự đang chờ dịch cùng lúc
+STREAM_BATCH_RECORDS = int(os.getenv("TRANSLATE_STREAM_BATCH_RECORDS", "500"))
+STREAM_BATCH_CHARS = int(os.getenv("TRANSLATE_STREAM_BATCH_CHARS", "200000"))
+
+# Nén song song khi đóng gói file kết quả
+COMPRESSION_WORKERS = int(os.getenv("TRANSLATE_COMPRESSION_WORKERS", str(min(8, os.cpu_count() or 1))))
+XML_COMPRESS_LEVEL = int(os.getenv("TRANSLATE_XML_COMPRESS_LEVEL", "1"))
+DEFAULT_COMPRESS_LEVEL = int(os.getenv("TRANSLATE_DEFAULT_COMPRESS_LEVEL", "6"))
+
+# Dịch cả placeholder của slide layout / slide master (mặc định tắt)
+PPTX_INCLUDE_LAYOUTS = os.getenv("PPTX_INCLUDE_LAYOUTS", "0") == "1"
@@ -0,0 +1,299 @@
+import html
+import re
+import threading
+import time
+from collections import deque, namedtuple
+from .settings import TERM_PROTECTION_ENABLED, TERM_VERSION_CHECK_SECONDS
+
+# Mã ngôn ngữ -> cột tương ứng của KeywordSuggestion
+LANGUAGE_FIELDS = {
+    "ja": "japanese",
+    "en": "english",
+    "vi": "vietnamese",
+    "zh-CN": "chinese_simplified",
+    "zh-TW": "chinese_traditional",
+}
+
+_PROTECTED_SPAN_RE = re.compile(r'<span translate="no">(.*?)</span>', re.DOTALL)
+_HTML_TAG_RE = re.compile(r"(<[^>]+>)")
+
+ProtectedSegment = namedtuple("ProtectedSegment", ["request_text", "local_translation"])
+
+def _is_word_char(ch):
+    # Chữ/số Latin (kể cả có dấu tiếng Việt); chữ CJK không cần ranh giới từ
+    return ch.isalnum() and ord(ch) < 0x2E80
+
+class AhoCorasick:
+    """Automaton Aho-Corasick: tìm tất cả thuật ngữ trong một lần duyệt văn bản"""
+
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [None]
+        self.output_link = [0]
+        self._dirty = False
+
+    def add(self, pattern, value):
+        node = 0
+        for ch in pattern:
+            next_node = self.goto[node].get(ch)
+            if next_node is None:
+                next_node = len(self.goto)
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(None)
+                self.output_link.append(0)
+                self.goto[node][ch] = next_node
+            node = next_node
+        self.output[node] = (len(pattern), value)
+        self._dirty = True
+
+    def copy(self):
+        """Bản sao độc lập của trie (thêm thuật ngữ vào bản sao không ảnh hưởng thread đang tra cứu bản gốc)"""
+        clone = AhoCorasick()
+        clone.goto = [dict(edges) for edges in self.goto]
+        clone.fail = list(self.fail)
+        clone.output = list(self.output)
+        clone.output_link = list(self.output_link)
+        clone._dirty = self._dirty
+        return clone
+
+    def build(self):
+        """Tính lại failure link (chỉ duyệt trie, không đọc lại dữ liệu nguồn)"""
+        queue = deque()
+        for next_node in self.goto[0].values():
+            self.fail[next_node] = 0
+            self.output_link[next_node] = 0
+            queue.append(next_node)
+        while queue:
+            node = queue.popleft()
+            for ch, next_node in self.goto[node].items():
+                fail = self.fail[node]
+                while fail and ch not in self.goto[fail]:
+                    fail = self.fail[fail]
+                fail = self.goto[fail].get(ch, 0)
+                self.fail[next_node] = fail
+                self.output_link[next_node] = fail if self.output[fail] is not None else self.output_link[fail]
+                queue.append(next_node)
+        self._dirty = False
+
+    def iter_matches(self, text):
+        """Sinh (start, end, value) cho mọi thuật ngữ xuất hiện trong text"""
+        if self._dirty:
+            self.build()
+        node = 0
+        for index, ch in enumerate(text):
+            while node and ch not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(ch, 0)
+            match_node = node if self.output[node] is not None else self.output_link[node]
+            while match_node:
+                length, value = self.output[match_node]
+                yield index + 1 - length, index + 1, value
+                match_node = self.output_link[match_node]
+
+class TermProtector:
+    """
+    Thuật ngữ đã duyệt (KeywordSuggestion) biên dịch thành một automaton cho mỗi cặp ngôn ngữ.
+    Thuật ngữ trong segment được thay bằng bản dịch chuẩn và bọc <span translate="no">
+    trước khi gửi API; segment chỉ gồm thuật ngữ được dịch tại chỗ, không gọi API.
+    """
+
+    def __init__(self, loader=None, version=None):
+        self.loader = loader
+        # version() -> giá trị rẻ, thay đổi khi thư viện thuật ngữ đổi (ví dụ số dòng + max(updated_at))
+        self.version = version
+        self._rows = []
+        self._automata = {}
+        self._loaded = False
+        self._loaded_version = None
+        self._next_version_check = 0.0
+        self._lock = threading.RLock()
+        self.stats = {"protected_terms": 0, "local_segments": 0}
+
+    def _version_check_due(self):
+        return self.version is not None and time.monotonic() >= self._next_version_check
+
+    def _ensure_loaded(self):
+        """Nạp thuật ngữ lần đầu, và nạp lại khi phiên bản trong DB đổi (kiểm tra tối đa mỗi TERM_VERSION_CHECK_SECONDS)"""
+        if self._loaded and not self._version_check_due():
+            return
+        with self._lock:
+            if self._loaded and not self._version_check_due():
+                return
+            # Đọc phiên bản trước khi đọc dữ liệu: thay đổi xảy ra trong lúc nạp sẽ được thấy ở lần kiểm tra sau
+            version = self.version() if self.version is not None else None
+            self._next_version_check = time.monotonic() + TERM_VERSION_CHECK_SECONDS
+            if self._loaded:
+                if version == self._loaded_version:
+                    return
+                print("🔄 Thư viện thuật ngữ đã thay đổi, nạp lại term protection")
+            self._rows = [dict(row) for row in self.loader()] if self.loader is not None else []
+            self._automata = {}
+            self._loaded = True
+            self._loaded_version = version
+            print(f"📖 Đã nạp {len(self._rows)} thuật ngữ cho term protection")
+
+    @staticmethod
+    def _row_terms(row, source_lang, target_lang):
+        """(thuật ngữ nguồn đã lower, bản dịch chuẩn) hoặc None nếu dòng thiếu một trong hai ngôn ngữ"""
+        source_term = (row.get(LANGUAGE_FIELDS[source_lang]) or "").strip()
+        target_term = (row.get(LANGUAGE_FIELDS[target_lang]) or "").strip()
+        return (source_term.lower(), target_term) if source_term and target_term else None
+
+    def _add_row_to_automaton(self, automaton, row, source_lang, target_lang):
+        terms = self._row_terms(row, source_lang, target_lang)
+        if terms is not None:
+            automaton.add(*terms)
+
+    def _automaton(self, source_lang, target_lang):
+        self._ensure_loaded()
+        pair = (source_lang, target_lang)
+        automaton = self._automata.get(pair)
+        if automaton is None or automaton._dirty:
+            with self._lock:
+                automaton = self._automata.get(pair)
+                if automaton is None:
+                    automaton = AhoCorasick()
+                    for row in self._rows:
+                        self._add_row_to_automaton(automaton, row, source_lang, target_lang)
+                    self._automata[pair] = automaton
+                if automaton._dirty:
+                    automaton.build()
+        return automaton
+
+    def add_terms(self, row):
+        """
+        Thêm một thuật ngữ vừa được duyệt mà không đọc lại DB. Thuật ngữ được thêm thẳng vào automaton
+        của các cặp ngôn ngữ có mặt trong dòng (bản sao, thread đang tra cứu vẫn dùng bản cũ);
+        failure link được tính lại ở lần tra cứu kế tiếp. Các worker khác thấy thuật ngữ mới qua kiểm tra phiên bản.
+        """
+        self._ensure_loaded()
+        row = dict(row)
+        with self._lock:
+            self._rows.append(row)
+            for (source_lang, target_lang), automaton in list(self._automata.items()):
+                terms = self._row_terms(row, source_lang, target_lang)
+                if terms is None:
+                    continue
+                automaton = automaton.copy()
+                automaton.add(*terms)
+                self._automata[(source_lang, target_lang)] = automaton
+
+    def reload(self):
+        """Nạp lại toàn bộ từ loader ở lần tra cứu kế tiếp (khi thuật ngữ bị sửa hoặc xóa)"""
+        with self._lock:
+            self._loaded = False
+            self._automata = {}
+
+    def find_terms(self, text, source_lang, target_lang):
+        """Các thuật ngữ không chồng nhau (ưu tiên trái nhất, dài nhất), đúng ranh giới từ"""
+        if source_lang not in LANGUAGE_FIELDS or target_lang not in LANGUAGE_FIELDS:
+            return []
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            lowered = text
+        matches = sorted(
+            self._automaton(source_lang, target_lang).iter_matches(lowered),
+            key=lambda match: (match[0], match[0] - match[1]),
+        )
+        selected = []
+        position = 0
+        for start, end, value in matches:
+            if start < position:
+                continue
+            if _is_word_char(text[start]) and start > 0 and _is_word_char(text[start - 1]):
+                continue
+            if _is_word_char(text[end - 1]) and end < len(text) and _is_word_char(text[end]):
+                continue
+            selected.append((start, end, value))
+            position = end
+        return selected
+
+    def protect(self, text, source_lang, target_lang):
+        """
+        Trả về ProtectedSegment hoặc None nếu segment không chứa thuật ngữ.
+        - local_translation: segment chỉ gồm thuật ngữ (và dấu câu/khoảng trắng), đã dịch xong.
+        - request_text: HTML gửi API với thuật ngữ được bọc <span translate="no">.
+        """
+        matches = self.find_terms(text, source_lang, target_lang)
+        if not matches:
+            return None
+
+        gaps = []
+        position = 0
+        for start, end, _ in matches:
+            gaps.append(text[position:start])
+            position = end
+        gaps.append(text[position:])
+
+        with self._lock:
+            self.stats["protected_terms"] += len(matches)
+
+        if all(not ch.isalpha() for gap in gaps for ch in gap):
+            with self._lock:
+                self.stats["local_segments"] += 1
+            parts = []
+            for gap, (_, _, value) in zip(gaps, matches):
+                parts.extend([gap, value])
+            parts.append(gaps[-1])
+            return ProtectedSegment(None, html.escape("".join(parts), quote=False))
+
+        parts = []
+        for gap, (_, _, value) in zip(gaps, matches):
+            parts.extend([html.escape(gap, quote=False), f'<span translate="no">{html.escape(value, quote=False)}</span>'])
+        parts.append(html.escape(gaps[-1], quote=False))
+        return ProtectedSegment("".join(parts), None)
+
+    def protect_html(self, html_text, source_lang, target_lang):
+        """
+        Như protect nhưng cho segment HTML (ví dụ đoạn văn có thẻ đánh dấu run):
+        chỉ bọc thuật ngữ trong phần text giữa các thẻ, không bao giờ dịch tại chỗ cả segment.
+        """
+        pieces = _HTML_TAG_RE.split(html_text)
+        protected_any = False
+        # Vị trí chẵn là text, vị trí lẻ là thẻ
+        for i in range(0, len(pieces), 2):
+            protected = self.protect(html.unescape(pieces[i]), source_lang, target_lang) if pieces[i] else None
+            if protected is None:
+                continue
+            protected_any = True
+            if protected.local_translation is not None:
+                pieces[i] = f'<span translate="no">{protected.local_translation}</span>'
+            else:
+                pieces[i] = protected.request_text
+        return ProtectedSegment("".join(pieces), None) if protected_any else None
+
+def restore_terms(translated_html):
+    """Bỏ thẻ <span translate="no"> khỏi bản dịch HTML (kết quả vẫn ở dạng escape như API trả về)"""
+    return _PROTECTED_SPAN_RE.sub(r"\1", translated_html)
+
+_protector = None
+_protector_lock = threading.Lock()
+_term_loader = None
+_term_version = None
+
+def register_term_loader(loader, version=None):
+    """
+    Đăng ký hàm trả về các dòng thuật ngữ đã duyệt (dict theo LANGUAGE_FIELDS),
+    ví dụ queryset KeywordSuggestion.objects.filter(status="approved").values(...).
+    version(): hàm rẻ trả về phiên bản thư viện thuật ngữ, dùng để nạp lại khi process khác sửa thuật ngữ.
+    """
+    global _term_loader, _term_version
+    _term_loader = loader
+    _term_version = version
+    if _protector is not None:
+        _protector.loader = loader
+        _protector.version = version
+        _protector.reload()
+
+def get_term_protector():
+    """Trả về TermProtector dùng chung cho process (None nếu bị tắt)"""
+    global _protector
+    if not TERM_PROTECTION_ENABLED:
+        return None
+    if _protector is None:
+        with _protector_lock:
+            if _protector is None:
+                _protector = TermProtector(_term_loader, _term_version)
+    return _protector
@@ -0,0 +1 @@
+# Test cho Translate_v2: python -m pytest Translate_v2/tests (hoặc python -m unittest discover Translate_v2/tests)
@@ -0,0 +1,17 @@
+import contextlib
+from unittest import mock
+
+from Translate_v2 import translation_memory
+from Translate_v2.translation_backend import LocalTranslationBackend, set_backend
+from Translate_v2.workspace import job_workspace
+
+@contextlib.contextmanager
+def offline_pipeline(backend=None):
+    """Chạy pipeline dịch với stand-in cục bộ, không dùng translation memory, trong workspace riêng"""
+    backend = backend or LocalTranslationBackend()
+    set_backend(backend)
+    try:
+        with mock.patch.object(translation_memory, "TM_ENABLED", False), job_workspace() as workspace:
+            yield backend, workspace
+    finally:
+        set_backend(None)
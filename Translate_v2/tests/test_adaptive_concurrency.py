@@ -0,0 +1,45 @@
+import unittest
+
+from google.api_core import exceptions as google_exceptions
+
+from Translate_v2.adaptive_concurrency import AIMDController, get_retry_after_seconds, is_overload_error
+
+class AIMDControllerTest(unittest.TestCase):
+    def test_window_grows_after_successful_round(self):
+        controller = AIMDController(initial_window=2, max_window=8)
+        for _ in range(4):
+            controller.acquire()
+            controller.release(0.1, characters=100)
+        self.assertGreater(controller.window, 3)
+        self.assertLessEqual(controller.window, 8)
+
+    def test_overload_halves_once_per_burst_and_backs_off(self):
+        controller = AIMDController(initial_window=8, max_window=8)
+        error = google_exceptions.TooManyRequests("quota")
+        error.retry_after = 30
+        for _ in range(3):
+            controller.acquire()
+        for _ in range(3):
+            controller.release(0.1, error=error)
+        snapshot = controller.snapshot()
+        self.assertEqual(snapshot["window"], 4)
+        self.assertEqual(snapshot["decreases"], 1)
+        self.assertEqual(snapshot["overloads"], 3)
+        self.assertGreater(snapshot["backoff_remaining_seconds"], 25)
+
+    def test_other_errors_do_not_shrink_window(self):
+        controller = AIMDController(initial_window=4)
+        with self.assertRaises(ValueError):
+            with controller.slot(10):
+                raise ValueError("bad request")
+        self.assertEqual(controller.window, 4)
+        self.assertEqual(controller.snapshot()["errors"], 1)
+
+    def test_error_classification(self):
+        self.assertTrue(is_overload_error(google_exceptions.ResourceExhausted("429")))
+        self.assertTrue(is_overload_error(google_exceptions.GatewayTimeout("504")))
+        self.assertFalse(is_overload_error(google_exceptions.BadRequest("400")))
+        self.assertIsNone(get_retry_after_seconds(ValueError()))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import threading
+import unittest
+from unittest import mock
+
+from Translate_v2 import client_provider
+
+class ChannelOptionsTest(unittest.TestCase):
+    def test_options_follow_settings(self):
+        with mock.patch.object(client_provider, "GRPC_KEEPALIVE_TIME_MS", 1000), \
+                mock.patch.object(client_provider, "GRPC_MAX_MESSAGE_LENGTH", 4096):
+            options = dict(client_provider.get_channel_options())
+        self.assertEqual(options["grpc.keepalive_time_ms"], 1000)
+        self.assertEqual(options["grpc.keepalive_timeout_ms"], client_provider.GRPC_KEEPALIVE_TIMEOUT_MS)
+        self.assertEqual(options["grpc.keepalive_permit_without_calls"], 1)
+        self.assertEqual(options["grpc.max_send_message_length"], 4096)
+        self.assertEqual(options["grpc.max_receive_message_length"], 4096)
+
+class SharedClientTest(unittest.TestCase):
+    def setUp(self):
+        client_provider._reset_after_fork()
+        self.addCleanup(client_provider._reset_after_fork)
+        create = mock.patch.object(client_provider, "_create_client", side_effect=lambda: object())
+        self.create = create.start()
+        self.addCleanup(create.stop)
+
+    def test_client_shared_within_process(self):
+        clients = []
+        threads = [threading.Thread(target=lambda: clients.append(client_provider.get_translation_client())) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len({id(client) for client in clients}), 1)
+        self.assertEqual(self.create.call_count, 1)
+
+    def test_client_recreated_in_new_process(self):
+        parent = client_provider.get_translation_client()
+        with mock.patch.object(client_provider.os, "getpid", return_value=-1):
+            child = client_provider.get_translation_client()
+            self.assertIs(client_provider.get_translation_client(), child)
+        self.assertIsNot(child, parent)
+        self.assertEqual(self.create.call_count, 2)
+
+    def test_reset_after_fork_drops_client(self):
+        client = client_provider.get_translation_client()
+        client_provider._reset_after_fork()
+        self.assertIsNot(client_provider.get_translation_client(), client)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+from Translate_v2 import concurrent_executor
+from Translate_v2.concurrent_executor import ConcurrentExecutor, TokenBucket
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+class TokenBucketTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(concurrent_executor, "time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_try_acquire_does_not_wait(self):
+        bucket = TokenBucket(100, 10)
+        self.assertTrue(bucket.try_acquire(60))
+        self.assertFalse(bucket.try_acquire(60))
+        self.clock.now += 2
+        self.assertTrue(bucket.try_acquire(60))
+
+    def test_refill_capped_at_capacity(self):
+        bucket = TokenBucket(100, 10)
+        bucket.try_acquire(100)
+        self.clock.now += 1000
+        self.assertTrue(bucket.try_acquire(100))
+        self.assertFalse(bucket.try_acquire(1))
+
+    def test_acquire_waits_for_refill(self):
+        bucket = TokenBucket(100, 10)
+        bucket.acquire(100)
+        bucket.acquire(30)
+        self.assertAlmostEqual(self.clock.now, 3.0)
+
+    def test_request_larger_than_capacity_is_capped(self):
+        bucket = TokenBucket(100, 10)
+        bucket.acquire(1000)
+        self.assertEqual(self.clock.now, 0.0)
+        self.assertTrue(TokenBucket(100, 10).try_acquire(1000))
+
+class ConcurrentExecutorTest(unittest.TestCase):
+    def test_results_in_input_order_with_errors(self):
+        executor = ConcurrentExecutor(max_workers=4, chars_per_minute=6000000)
+
+        def work(item):
+            time.sleep(0.01 * (5 - item))
+            if item == 2:
+                raise RuntimeError("503")
+            return item * 10
+
+        results = executor.map_ordered(work, range(5), [1] * 5)
+        self.assertEqual([result for result, _ in results], [0, 10, None, 30, 40])
+        self.assertIsInstance(results[2][1], RuntimeError)
+        self.assertTrue(all(error is None for index, (_, error) in enumerate(results) if index != 2))
+
+    def test_concurrency_bounded_by_max_workers(self):
+        executor = ConcurrentExecutor(max_workers=3, chars_per_minute=6000000)
+        lock = threading.Lock()
+        running = [0, 0]
+
+        def work(item):
+            with lock:
+                running[0] += 1
+                running[1] = max(running[1], running[0])
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+            return item
+
+        executor.map_ordered(work, range(12), [1] * 12)
+        self.assertEqual(running[1], 3)
+
+    def test_each_request_charged_its_cost(self):
+        executor = ConcurrentExecutor(max_workers=2, chars_per_minute=600)
+        with mock.patch.object(executor.bucket, "acquire") as acquire:
+            executor.map_ordered(lambda item: item, ["a", "b"], [120, 30])
+        self.assertCountEqual([call.args[0] for call in acquire.call_args_list], [120, 30])
+
+    def test_shared_executor_recreated_after_fork(self):
+        executor = concurrent_executor.get_executor()
+        self.assertIs(concurrent_executor.get_executor(), executor)
+        with mock.patch.object(concurrent_executor.os, "getpid", return_value=-1):
+            self.assertIsNot(concurrent_executor.get_executor(), executor)
+        concurrent_executor._reset_after_fork()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+import zipfile
+from unittest import mock
+
+from Translate_v2 import detect_lang
+
+NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def _write_xlsx(path, shared_strings, rows):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        strings = "".join(f"<si>{si}</si>" for si in shared_strings)
+        archive.writestr("xl/sharedStrings.xml", f'<sst xmlns="{NS}">{strings}</sst>')
+        archive.writestr(
+            "xl/worksheets/sheet1.xml",
+            f'<worksheet xmlns="{NS}"><sheetData>{"".join(rows)}</sheetData></worksheet>',
+        )
+
+def _numeric_rows(count):
+    return (f'<row r="{i}"><c r="A{i}"><v>{i}</v></c><c r="B{i}"><v>{i * 2}</v></c></row>' for i in range(1, count + 1))
+
+class SampleOoxmlTextTest(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.work_dir.name, "book.xlsx")
+
+    def tearDown(self):
+        self.work_dir.cleanup()
+
+    def test_furigana_skipped_and_inline_strings_read(self):
+        _write_xlsx(self.path, ["<t>外径</t><rPh><t>がいけい</t></rPh>"], [
+            '<row r="1"><c r="A1" t="inlineStr"><is><t>寸法</t></is></c></row>',
+        ])
+        self.assertEqual(detect_lang.extract_from_xlsx(self.path), "外径 寸法")
+
+    def test_word_budget_stops_early(self):
+        _write_xlsx(self.path, [f"<t>word{i}</t>" for i in range(500)], [])
+        self.assertEqual(len(detect_lang.extract_from_xlsx(self.path).split()), 100)
+
+    def test_element_budget_stops_on_numeric_sheet(self):
+        _write_xlsx(self.path, ["<t>a</t>"], [*_numeric_rows(1000), '<row r="1001"><c t="inlineStr"><is><t>late</t></is></c></row>'])
+        parts = ["xl/sharedStrings.xml", "xl/worksheets/sheet1.xml"]
+        blocks = (detect_lang._S + "si", detect_lang._S + "is")
+        self.assertEqual(detect_lang.sample_ooxml_text(self.path, parts, blocks, detect_lang._S + "t"), "a late")
+        self.assertEqual(
+            detect_lang.sample_ooxml_text(self.path, parts, blocks, detect_lang._S + "t", element_budget=100), "a"
+        )
+        self.assertEqual(
+            detect_lang.sample_ooxml_text(self.path, parts, blocks, detect_lang._S + "t", byte_budget=1000), "a"
+        )
+
+    def test_memory_does_not_grow_with_sheet_size(self):
+        # Sheet toàn số 200k dòng: dựng cả cây tốn vài trăm MB, lấy mẫu streaming chỉ tốn vài MB
+        _write_xlsx(self.path, ["<t>a</t>"], _numeric_rows(200000))
+        script = textwrap.dedent(f"""
+            import resource
+            from Translate_v2 import detect_lang as d
+            before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            d.sample_ooxml_text({self.path!r}, ["xl/sharedStrings.xml", "xl/worksheets/sheet1.xml"],
+                                (d._S + "si", d._S + "is"), d._S + "t", byte_budget=1 << 40, element_budget=1 << 40)
+            print((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before) // 1024)
+        """)
+        result = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, check=True)
+        self.assertLess(int(result.stdout.split()[-1]), 50)
+
+class DetectionCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+        detect_lang._detection_cache.clear()
+
+    def tearDown(self):
+        detect_lang._detection_cache.clear()
+        self.work_dir.cleanup()
+
+    def _book(self, name, text):
+        path = os.path.join(self.work_dir.name, name)
+        _write_xlsx(path, [f"<t>{text}</t>"], [])
+        return path
+
+    def test_same_content_detected_once(self):
+        first = self._book("a.xlsx", "部品の外径")
+        copy = os.path.join(self.work_dir.name, "copy.xlsx")
+        with open(first, "rb") as src, open(copy, "wb") as dst:
+            dst.write(src.read())
+        with mock.patch.object(detect_lang, "detect_language", return_value="ja") as detect:
+            self.assertEqual(detect_lang.detect_file_language(first), "ja")
+            self.assertEqual(detect_lang.detect_file_language(copy), "ja")
+            self.assertEqual(detect.call_count, 1)
+            detect_lang.detect_file_language(self._book("b.xlsx", "Đường kính ngoài"))
+            self.assertEqual(detect.call_count, 2)
+
+    def test_remembered_language_skips_detection(self):
+        path = self._book("a.xlsx", "部品")
+        content_hash = detect_lang.file_sha256(path)
+        detect_lang.remember_file_language(content_hash, "vi")
+        with mock.patch.object(detect_lang, "extract_content") as extract:
+            self.assertEqual(detect_lang.detect_file_language(path, content_hash), "vi")
+            extract.assert_not_called()
+
+    def test_cache_is_bounded(self):
+        with mock.patch.object(detect_lang, "DETECTION_CACHE_SIZE", 2):
+            for index in range(3):
+                detect_lang.remember_file_language(f"hash{index}", "ja")
+        self.assertEqual(list(detect_lang._detection_cache), ["hash1", "hash2"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from Translate_v2.fuzzy_memory import (
+    FuzzyIndex, SegmentBudget, minhash_signature, shingles, split_code_tokens, substitute_codes,
+)
+from Translate_v2.translation_memory import TranslationMemory
+
+class SubstituteCodesTest(unittest.TestCase):
+    def test_whole_tokens_only(self):
+        translation = substitute_codes("数量 11 個 (100 mm, A10B)", "数量 10 個 (100 mm, A10B)", "SL 10 cái (100 mm, A10B)")
+        self.assertEqual(translation, "SL 11 cái (100 mm, A10B)")
+
+    def test_codes_next_to_cjk_and_punctuation(self):
+        self.assertEqual(split_code_tokens("図番AY00139。")[1], ["AY00139"])
+        translation = substitute_codes("図番AY00140。", "図番AY00139。", "Bản vẽ AY00139.")
+        self.assertEqual(translation, "Bản vẽ AY00140.")
+
+    def test_swapped_codes(self):
+        translation = substitute_codes("10 から 20", "20 から 10", "từ 20 đến 10")
+        self.assertEqual(translation, "từ 10 đến 20")
+
+    def test_ambiguous_token_is_rejected(self):
+        self.assertIsNone(substitute_codes("10 と 11", "10 と 10", "10 và 10"))
+        self.assertIsNone(substitute_codes("部品 AY2", "部品 AY1", "linh kiện"))
+
+    def test_html_span_ids_are_not_codes(self):
+        stored_source = '<span id="r0">部品 AY001</span><span id="r1">数量 10</span>'
+        stored_translation = '<span id="r1">SL 10</span><span id="r0">linh kiện AY001</span>'
+        source = '<span id="r0">部品 AY002</span><span id="r1">数量 10</span>'
+        self.assertEqual(split_code_tokens(source, "text/html")[1], ["AY002", "10"])
+        self.assertEqual(
+            substitute_codes(source, stored_source, stored_translation, "text/html"),
+            '<span id="r1">SL 10</span><span id="r0">linh kiện AY002</span>',
+        )
+
+    def test_html_structure_must_match(self):
+        stored_source = '<span id="r0">部品 AY001</span><span id="r1">です</span>'
+        source = '<span id="r0">部品 AY002です</span>'
+        self.assertIsNone(substitute_codes(source, stored_source, "x", "text/html"))
+
+class FuzzyIndexTest(unittest.TestCase):
+    def test_lookup_near_duplicate(self):
+        index = FuzzyIndex(threshold=0.5)
+        index.add("外径寸法 部品番号 AY00139 改訂日 2024/05/01", "Kích thước ngoài AY00139 ngày 2024/05/01")
+        self.assertEqual(
+            index.lookup("外径寸法 部品番号 AY00140 改訂日 2024/05/01"),
+            "Kích thước ngoài AY00140 ngày 2024/05/01",
+        )
+        self.assertIsNone(index.lookup("内径公差 部品番号 AY00140 改訂日 2024/05/01"))
+
+    def test_html_lookup_keeps_span_ids(self):
+        index = FuzzyIndex(threshold=0.5, mime_type="text/html")
+        index.add('<span id="r0">外径寸法 部品番号 </span><span id="r1">AY00139</span>',
+                  '<span id="r0">Kích thước ngoài </span><span id="r1">AY00139</span>')
+        self.assertEqual(
+            index.lookup('<span id="r0">外径寸法 部品番号 </span><span id="r1">AY00140</span>'),
+            '<span id="r0">Kích thước ngoài </span><span id="r1">AY00140</span>',
+        )
+
+    def test_add_without_overwrite(self):
+        index = FuzzyIndex()
+        index.add("部品 AY1", "mới")
+        index.add("部品 AY1", "cũ", overwrite=False)
+        self.assertEqual(index.translations, ["mới"])
+
+    def test_budget_shared_across_scopes(self):
+        budget = SegmentBudget(3)
+        first = FuzzyIndex(max_segments=2, budget=budget)
+        second = FuzzyIndex(budget=budget)
+        for i in range(3):
+            first.add(f"部品 AY{i}", f"linh kiện AY{i}")
+            second.add(f"図番 AY{i}", f"bản vẽ AY{i}")
+        self.assertEqual((len(first), len(second)), (2, 1))
+        first.close()
+        second.add("図番 AY9", "bản vẽ AY9")
+        self.assertEqual((len(first), len(second), budget.used), (0, 2, 2))
+
+    def test_signature_estimates_jaccard(self):
+        # Các hàm băm độc lập: tỉ lệ phần tử signature trùng nhau xấp xỉ độ tương đồng Jaccard
+        a = shingles("外径寸法 部品番号 AY00139 改訂日 2024/05/01 検査成績書")
+        b = shingles("外径寸法 部品番号 AY00140 改訂日 2024/05/01 検査成績書")
+        c = shingles("梱包仕様 ロット 数量 個 第版 材料規格")
+        self.assertGreaterEqual(
+            sum(x == y for x, y in zip(minhash_signature(a), minhash_signature(b))), len(minhash_signature(a)) // 2
+        )
+        self.assertEqual(sum(x == y for x, y in zip(minhash_signature(a), minhash_signature(c))), 0)
+
+class FuzzyIndexLoadingTest(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.work_dir.name, "tm.sqlite3")
+        TranslationMemory(self.db_path).store_translations(
+            ["外径寸法 部品番号 AY00139"], ["Kích thước ngoài AY00139"], "g", "ja", "vi",
+        )
+
+    def tearDown(self):
+        self.work_dir.cleanup()
+
+    def test_index_is_loaded_in_background(self):
+        memory = TranslationMemory(self.db_path)
+        release = threading.Event()
+        original_iter_scope = memory.store.iter_scope
+
+        def slow_iter_scope(*scope):
+            release.wait(5)
+            return original_iter_scope(*scope)
+
+        with mock.patch.object(memory.store, "iter_scope", side_effect=slow_iter_scope):
+            # Lần tra cứu đầu không chờ SQLite: trả về miss ngay
+            self.assertEqual(memory.lookup(["外径寸法 部品番号 AY00140"], "g", "ja", "vi"), [None])
+            release.set()
+            for index in memory.fuzzy_indexes.values():
+                self.assertTrue(index.ready.wait(5))
+
+        self.assertEqual(memory.lookup(["外径寸法 部品番号 AY00141"], "g", "ja", "vi"), ["Kích thước ngoài AY00141"])
+        self.assertEqual(memory.get_stats()["fuzzy_hits"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import contextlib
+import io
+import unicodedata
+import unittest
+from unittest import mock
+
+from Translate_v2 import detect_lang
+from Translate_v2.language_detector import detect_script_language
+
+class DetectScriptLanguageTest(unittest.TestCase):
+    def test_confident_languages(self):
+        for text, expected in [
+            ("この製品の外径は十二ミリメートルです。取り扱いに注意してください。", "ja"),
+            ("Đường kính ngoài của sản phẩm là mười hai milimét, cần chú ý khi sử dụng.", "vi"),
+            ("这个产品的外径是十二毫米，使用时请注意，我们会对问题进行说明。", "zh-CN"),
+            ("The outer diameter of this product is twelve millimeters, handle with care.", "en"),
+        ]:
+            with self.subTest(expected=expected):
+                language, confidence = detect_script_language(text)
+                self.assertEqual(language, expected)
+                self.assertGreaterEqual(confidence, 0.8)
+
+    def test_decomposed_vietnamese_counted(self):
+        text = unicodedata.normalize("NFD", "Đường kính ngoài của sản phẩm là mười hai milimét")
+        self.assertEqual(detect_script_language(text)[0], "vi")
+
+    def test_ambiguous_text_has_low_confidence(self):
+        for text in ["製品外径寸法", "Hà", "Café au lait with Nguyễn", "部品"]:
+            with self.subTest(text=text):
+                self.assertLess(detect_script_language(text)[1], 0.8)
+
+    def test_no_letters(self):
+        self.assertEqual(detect_script_language("12.5 ± 0.1 / 2024-01-05"), (None, 0.0))
+        self.assertEqual(detect_script_language(""), (None, 0.0))
+
+class DetectLanguageFallbackTest(unittest.TestCase):
+    def test_api_called_only_when_not_confident(self):
+        backend = mock.Mock()
+        backend.detect_language.return_value = "ja"
+        with mock.patch.object(detect_lang, "get_backend", return_value=backend), \
+                contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(detect_lang.detect_language("この製品の外径は十二ミリメートルです。取り扱いに注意してください。"), "ja")
+            backend.detect_language.assert_not_called()
+            self.assertEqual(detect_lang.detect_language("製品外径寸法"), "ja")
+            backend.detect_language.assert_called_once_with("製品外径寸法")
+
+    def test_local_detection_can_be_disabled(self):
+        backend = mock.Mock()
+        backend.detect_language.return_value = "en"
+        with mock.patch.object(detect_lang, "get_backend", return_value=backend), \
+                mock.patch.object(detect_lang, "LOCAL_DETECTION_ENABLED", False):
+            self.assertEqual(detect_lang.detect_language("Đường kính ngoài của sản phẩm là mười hai milimét"), "en")
+        backend.detect_language.assert_called_once()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import json
+import threading
+import unittest
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+from google.api_core import exceptions as google_exceptions
+
+from Translate_v2.local_standin_server import make_handler
+from Translate_v2.translation_backend import HttpTranslationBackend, LocalTranslationBackend
+
+class StandInServerTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(LocalTranslationBackend()))
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def _post(self, path, body):
+        request = urllib.request.Request(f"{self.base_url}{path}", data=body, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=10) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    def test_translate(self):
+        status, payload = self._post("/translate", json.dumps({"contents": ["製品"], "target_language_code": "vi"}).encode())
+        self.assertEqual((status, payload), (200, {"translations": ["[vi] 製品"]}))
+
+    def test_bad_requests_get_json_4xx(self):
+        for path, body in [
+            ("/translate", b"{not json"),
+            ("/translate", b"[1, 2]"),
+            ("/translate", b"\xff\xfe"),
+            ("/translate", json.dumps({"contents": ["x"]}).encode()),
+            ("/detect", b"{}"),
+            ("/translate", json.dumps({"contents": 5, "target_language_code": "vi"}).encode()),
+        ]:
+            with self.subTest(path=path, body=body):
+                status, payload = self._post(path, body)
+                self.assertEqual(status, 400)
+                self.assertIn("detail", payload)
+        self.assertEqual(self._post("/unknown", b"{}")[0], 404)
+
+    def test_http_backend_maps_400_to_bad_request(self):
+        backend = HttpTranslationBackend(self.base_url)
+        self.assertEqual(backend.translate_batch(["製品"], None, "ja", "vi"), ["[vi] 製品"])
+        with self.assertRaises(google_exceptions.BadRequest):
+            backend._post("/translate", {"contents": ["x"]})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import unittest
+import zipfile
+from unittest import mock
+
+from Translate_v2 import multi_target
+from Translate_v2 import translate_docx as translate_docx_module
+from Translate_v2.multi_target import UnsupportedLanguageError
+from Translate_v2.tests.support import offline_pipeline
+from Translate_v2.translate_docx import translate_docx
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+
+def _write_docx(path, paragraphs, header=None):
+    body = "".join(f"<w:p><w:r><w:t>{text}</w:t></w:r></w:p>" for text in paragraphs)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(
+            "[Content_Types].xml",
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.'
+            'wordprocessingml.document.main+xml"/><Override PartName="/word/header1.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.header+xml"/></Types>',
+        )
+        archive.writestr(
+            "_rels/.rels",
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Target="word/document.xml" Type="http://schemas.openxmlformats.org/'
+            'officeDocument/2006/relationships/officeDocument"/></Relationships>',
+        )
+        archive.writestr("word/document.xml", f'<w:document xmlns:w="{W_NS}"><w:body>{body}</w:body></w:document>')
+        if header is not None:
+            archive.writestr(
+                "word/_rels/document.xml.rels",
+                '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                '<Relationship Id="rId1" Target="header1.xml" Type="http://schemas.openxmlformats.org/'
+                'officeDocument/2006/relationships/header"/></Relationships>',
+            )
+            archive.writestr("word/header1.xml", f'<w:hdr xmlns:w="{W_NS}"><w:p><w:r><w:t>{header}</w:t></w:r></w:p></w:hdr>')
+
+def _document_text(path, part="word/document.xml"):
+    with zipfile.ZipFile(path) as archive:
+        return archive.read(part).decode()
+
+class TargetIsolationTest(unittest.TestCase):
+    def test_unsupported_pair_does_not_abort_other_targets(self):
+        with offline_pipeline() as (_, workspace):
+            path = workspace.file_path("in.docx")
+            _write_docx(path, ["部品", "外径"])
+            outputs = translate_docx(path, ["xx", "vi", "en"], "ja")
+
+            self.assertIsInstance(outputs["xx"], UnsupportedLanguageError)
+            for lang in ("vi", "en"):
+                self.assertTrue(os.path.exists(outputs[lang]))
+                self.assertIn(f"[{lang}] 部品", _document_text(outputs[lang]))
+
+    def test_failed_target_is_reported_per_language(self):
+        write_package = multi_target.write_package
+
+        def failing_write(source_path, output_path, replaced_parts):
+            if output_path.endswith("_vi.docx"):
+                raise OSError("No space left on device")
+            return write_package(source_path, output_path, replaced_parts)
+
+        with offline_pipeline() as (_, workspace), mock.patch.object(multi_target, "write_package", failing_write):
+            path = workspace.file_path("in.docx")
+            _write_docx(path, ["部品"])
+            outputs = translate_docx(path, ["vi", "en"], "ja")
+
+            self.assertIsInstance(outputs["vi"], OSError)
+            self.assertIn("[en] 部品", _document_text(outputs["en"]))
+
+    def test_unsupported_source_language_is_domain_error(self):
+        with offline_pipeline() as (_, workspace):
+            path = workspace.file_path("in.docx")
+            _write_docx(path, ["部品"])
+            with self.assertRaises(UnsupportedLanguageError):
+                translate_docx(path, ["vi"], "xx")
+
+class PartPoolTest(unittest.TestCase):
+    def test_parts_prepared_and_applied_in_worker_processes(self):
+        in_pool = mock.Mock(wraps=multi_target._translate_parts_in_pool)
+        with offline_pipeline() as (_, workspace), mock.patch.object(multi_target, "_translate_parts_in_pool", in_pool):
+            path = workspace.file_path("in.docx")
+            _write_docx(path, ["部品", "外径"], header="部品表")
+            outputs = multi_target.translate_package(
+                path, ["vi", "en"], "ja", translate_docx_module.select_parts, translate_docx_module.load_part,
+                translate_docx_module.collect_segments, part_workers=2,
+            )
+
+            for lang in ("vi", "en"):
+                self.assertIn(f"[{lang}] 外径", _document_text(outputs[lang]))
+                self.assertIn(f"[{lang}] 部品表", _document_text(outputs[lang], "word/header1.xml"))
+            in_pool.assert_called_once()
+        pool = multi_target._get_part_pool(2)
+        self.assertEqual(pool._mp_context.get_start_method(), "forkserver")
+
+if __name__ == "__main__":
+    unittest.main()
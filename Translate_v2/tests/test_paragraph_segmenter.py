@@ -0,0 +1,47 @@
+import unittest
+
+from lxml import etree
+
+from Translate_v2.paragraph_segmenter import add_text_elems, build_paragraph_html, split_paragraph_html
+from Translate_v2.segment_collector import SegmentCollector
+
+W = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+
+def _document(paragraphs):
+    body = "".join(
+        "<w:p>" + "".join(f"<w:r><w:t>{text}</w:t></w:r>" for text in runs) + "</w:p>" for runs in paragraphs
+    )
+    return etree.fromstring(f'<w:body xmlns:w="{W}">{body}</w:body>')
+
+def _texts(root):
+    return [[t.text for t in p.iter(f"{{{W}}}t")] for p in root]
+
+class SplitParagraphTest(unittest.TestCase):
+    def test_round_trip(self):
+        html = build_paragraph_html(["外径 ", "A<B", "mm"])
+        self.assertEqual(html, '<span id="r0">外径 </span><span id="r1">A&lt;B</span><span id="r2">mm</span>')
+        self.assertEqual(split_paragraph_html(html, 3), (["外径 ", "A<B", "mm"], [0, 1, 2]))
+
+    def test_text_outside_spans_and_missing_runs(self):
+        pieces, order = split_paragraph_html('Lead <span id="r1">b</span> tail<span id="r9">x</span>', 3)
+        self.assertEqual(pieces, ["Lead ", "b tailx", ""])
+        self.assertEqual(order, [1])
+
+class AddTextElemsTest(unittest.TestCase):
+    def test_runs_of_a_paragraph_are_one_segment(self):
+        root = _document([["外径", "寸法"], ["部品"]])
+        collector = SegmentCollector()
+        add_text_elems(collector, list(root.iter(f"{{{W}}}t")))
+        self.assertEqual(sorted(key[0] for key in collector.unique_texts), ["text/html", "text/plain"])
+
+        collector.apply({
+            ("text/html", '<span id="r0">外径</span><span id="r1">寸法</span>'):
+                '<span id="r1">Kích thước </span><span id="r0">ngoài</span>',
+            ("text/plain", "部品"): "Linh kiện",
+        }, report=False)
+        # Run được đổi chỗ theo thứ tự của bản dịch, định dạng đi theo phần text
+        self.assertEqual(_texts(root), [["Kích thước ", "ngoài"], ["Linh kiện"]])
+        self.assertEqual(root[0][0][0].get("{http://www.w3.org/XML/1998/namespace}space"), "preserve")
+
+if __name__ == "__main__":
+    unittest.main()
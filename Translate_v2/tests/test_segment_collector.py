@@ -0,0 +1,50 @@
+import unittest
+from unittest import mock
+
+from lxml import etree
+
+from Translate_v2.segment_collector import SegmentCollector
+
+def _fake_translate(texts, glossary_id, source_lang, target_lang, mime_type="text/plain"):
+    return [f"[{target_lang}] {text}" for text in texts]
+
+class SegmentCollectorTest(unittest.TestCase):
+    def test_duplicates_translated_once_and_applied_everywhere(self):
+        root = etree.fromstring("<r><t>製品　番号</t><t>製品 番号 </t><t>外径</t><t>AY00139</t></r>")
+        collector = SegmentCollector()
+        for elem in root:
+            collector.add_text_elem(elem)
+        with mock.patch(
+            "Translate_v2.segment_collector.translate_batch_with_glossary", side_effect=_fake_translate
+        ) as translate:
+            stats = collector.translate(None, "ja", "vi")
+
+        self.assertEqual(translate.call_count, 1)
+        self.assertEqual(len(translate.call_args.args[0]), 2)
+        self.assertEqual([elem.text for elem in root], ["[vi] 製品　番号", "[vi] 製品　番号", "[vi] 外径", "AY00139"])
+        self.assertEqual(stats["segments"], 3)
+        self.assertEqual(stats["unique_segments"], 2)
+        self.assertEqual(stats["skipped_segments"], 1)
+
+    def test_mime_types_are_separate_requests(self):
+        collector = SegmentCollector()
+        results = {}
+        collector.add("A & B", lambda text: results.setdefault("plain", text))
+        collector.add("A &amp; B", lambda text: results.setdefault("html", text), "text/html")
+        with mock.patch(
+            "Translate_v2.segment_collector.translate_batch_with_glossary", side_effect=_fake_translate
+        ) as translate:
+            collector.translate(None, "ja", "vi")
+        self.assertEqual([call.args[4] for call in translate.call_args_list], ["text/plain", "text/html"])
+        # Bản dịch text thường được unescape, bản dịch HTML giữ nguyên
+        self.assertEqual(results, {"plain": "[vi] A & B", "html": "[vi] A &amp; B"})
+
+    def test_missing_translation_leaves_node_unchanged(self):
+        root = etree.fromstring("<r><t>製品</t></r>")
+        collector = SegmentCollector()
+        collector.add_text_elem(root[0])
+        collector.apply({}, report=False)
+        self.assertEqual(root[0].text, "製品")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import unicodedata
+import unittest
+from unittest import mock
+
+from Translate_v2 import segment_filter
+from Translate_v2.segment_collector import SegmentCollector
+from Translate_v2.segment_filter import is_untranslatable
+
+def _skip(text, mime_type="text/plain"):
+    return is_untranslatable(unicodedata.normalize("NFKC", text), mime_type)
+
+class IsUntranslatableTest(unittest.TestCase):
+    def test_codes_numbers_units_are_skipped(self):
+        for text in [
+            "SUS304", "M6x1.0", "AY00139", "φ12±0.05", "12.5 mm", "100 x 200 mm", "20~30℃", "1,200 kg", "50%",
+            "2024/01/05", "2024-01-05T10:30", "https://www.toray.co.jp/", "info@toray.com", "・", "(1)", "A",
+        ]:
+            with self.subTest(text=text):
+                self.assertTrue(_skip(text))
+
+    def test_word_prefix_and_cjk_are_translated(self):
+        for text in ["約10mm", "約 10 mm", "外径 12 mm", "10個", "製品番号", "2024年1月5日", "ｱ10"]:
+            with self.subTest(text=text):
+                self.assertFalse(_skip(text))
+
+    def test_letters_other_than_units_are_translated(self):
+        for text in ["10 apples", "Step1", "Ver. 2", "OK", "Kích thước", "10 mm max"]:
+            with self.subTest(text=text):
+                self.assertFalse(_skip(text))
+
+    def test_html_checks_visible_text_only(self):
+        self.assertTrue(_skip('<span id="r0">AY</span><span id="r1">00139</span>', "text/html"))
+        self.assertFalse(_skip('<span id="r0">約</span><span id="r1">10mm</span>', "text/html"))
+
+class CollectorFilterTest(unittest.TestCase):
+    def test_skipped_segments_are_not_sent(self):
+        applied = {}
+        collector = SegmentCollector()
+        for text in ["SUS304", "約10mm", "12.5 mm", "SUS304"]:
+            collector.add(text, lambda translated, text=text: applied.__setitem__(text, translated))
+
+        with mock.patch("Translate_v2.segment_collector.translate_batch_with_glossary",
+                        side_effect=lambda texts, *args: [f"[vi] {text}" for text in texts]) as translate:
+            stats = collector.apply(collector.translate_unique("g", "ja", "vi"), report=False)
+
+        translate.assert_called_once()
+        self.assertEqual(translate.call_args[0][0], ["約10mm"])
+        self.assertEqual(applied, {"約10mm": "[vi] 約10mm"})
+        self.assertEqual(stats["skipped_segments"], 2)
+        self.assertEqual(stats["skipped_chars"], len("SUS304") + len("12.5 mm"))
+
+    def test_filter_can_be_disabled(self):
+        collector = SegmentCollector()
+        with mock.patch.object(segment_filter, "SEGMENT_FILTER_ENABLED", False):
+            collector.add("SUS304", lambda translated: None)
+        self.assertEqual(len(collector.unique_texts), 1)
+
+if __name__ == "__main__":
+    unittest.main()
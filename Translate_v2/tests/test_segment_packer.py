@@ -0,0 +1,39 @@
+import unittest
+
+from Translate_v2.segment_packer import build_packed_text, plan_packs, unpack_translation
+
+class PlanPacksTest(unittest.TestCase):
+    def test_short_segments_packed_long_ones_single(self):
+        texts = ["部品", "外径", "長い" * 40, "", "一行\n二行", "内径"]
+        packs, singles = plan_packs(texts, max_segment_chars=60)
+        self.assertEqual(packs, [[0, 1, 5]])
+        self.assertEqual(singles, [2, 3, 4])
+
+    def test_limits_start_new_pack_and_lone_segment_is_single(self):
+        packs, singles = plan_packs(["a", "b", "c"], max_segments=2)
+        self.assertEqual(packs, [[0, 1]])
+        self.assertEqual(singles, [2])
+
+class PackRoundTripTest(unittest.TestCase):
+    def test_round_trip_keeps_whitespace_and_escapes(self):
+        texts = [" 部品 ", "A < B", "外径"]
+        packed = build_packed_text(texts)
+        self.assertEqual(packed, '<br data-seg="0">部品<br data-seg="1">A &lt; B<br data-seg="2">外径')
+        self.assertEqual(unpack_translation(packed, texts), [" 部品 ", "A < B", "外径"])
+
+    def test_html_segments_are_not_escaped(self):
+        texts = ['<span id="r0">a</span>', "b &amp; c"]
+        packed = build_packed_text(texts, "text/html")
+        self.assertEqual(unpack_translation(packed, texts, "text/html"), texts)
+
+    def test_broken_markers_return_none(self):
+        texts = ["a", "b"]
+        self.assertIsNone(unpack_translation('<br data-seg="0">x', texts))
+        self.assertIsNone(unpack_translation('<br data-seg="1">x<br data-seg="0">y', texts))
+        self.assertIsNone(unpack_translation('lead<br data-seg="0">x<br data-seg="1">y', texts))
+        self.assertIsNone(unpack_translation('<br data-seg="0">x<br data-seg="1"> ', texts))
+        self.assertIsNone(unpack_translation("", texts))
+        self.assertEqual(unpack_translation('<br data-seg="0"> x <br data-seg="1">y', texts), ["x", "y"])
+
+if __name__ == "__main__":
+    unittest.main()
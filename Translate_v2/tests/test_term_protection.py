@@ -0,0 +1,98 @@
+import unittest
+from unittest import mock
+
+from Translate_v2 import term_protection
+from Translate_v2.term_protection import AhoCorasick, TermProtector, restore_terms
+
+class FakeLibrary:
+    """Thư viện thuật ngữ giả lập dùng chung giữa các "worker" (DB)"""
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.revision = 0
+        self.loads = 0
+
+    def load(self):
+        self.loads += 1
+        return list(self.rows)
+
+    def version(self):
+        return len(self.rows), self.revision
+
+def _terms(protector, text):
+    return [value for _, _, value in protector.find_terms(text, "ja", "vi")]
+
+class AhoCorasickTest(unittest.TestCase):
+    def test_overlapping_matches(self):
+        automaton = AhoCorasick()
+        for pattern in ["he", "she", "his", "hers"]:
+            automaton.add(pattern, pattern)
+        matches = sorted((start, end) for start, end, _ in automaton.iter_matches("ushers"))
+        self.assertEqual(matches, [(1, 4), (2, 4), (2, 6)])
+
+class TermProtectorTest(unittest.TestCase):
+    def setUp(self):
+        self.library = FakeLibrary([{"japanese": "炭素繊維", "vietnamese": "sợi carbon"}])
+
+    def test_protect_wraps_terms_and_restores(self):
+        protector = TermProtector(self.library.load)
+        protected = protector.protect("炭素繊維の強度", "ja", "vi")
+        self.assertEqual(protected.request_text, '<span translate="no">sợi carbon</span>の強度')
+        self.assertEqual(restore_terms(protected.request_text), "sợi carbonの強度")
+        self.assertEqual(protector.protect("炭素繊維", "ja", "vi").local_translation, "sợi carbon")
+
+    def test_other_worker_changes_are_picked_up(self):
+        worker_a = TermProtector(self.library.load, self.library.version)
+        worker_b = TermProtector(self.library.load, self.library.version)
+        self.assertEqual(_terms(worker_b, "炭素繊維"), ["sợi carbon"])
+
+        # Worker A duyệt một thuật ngữ mới, sửa và xóa thuật ngữ cũ; worker B chỉ thấy qua phiên bản trong DB
+        new_row = {"japanese": "樹脂", "vietnamese": "nhựa"}
+        self.library.rows.append(new_row)
+        self.library.revision += 1
+        worker_a.add_terms(new_row)
+        self.assertEqual(_terms(worker_a, "樹脂"), ["nhựa"])
+
+        with mock.patch.object(term_protection, "TERM_VERSION_CHECK_SECONDS", 0):
+            worker_b._next_version_check = 0
+            self.assertEqual(_terms(worker_b, "樹脂"), ["nhựa"])
+            self.library.rows = [new_row]
+            self.library.revision += 1
+            self.assertEqual(_terms(worker_b, "炭素繊維"), [])
+
+    def test_version_is_checked_at_most_once_per_interval(self):
+        version = mock.Mock(return_value=(1, 0))
+        protector = TermProtector(self.library.load, version)
+        with mock.patch.object(term_protection, "TERM_VERSION_CHECK_SECONDS", 3600):
+            for _ in range(10):
+                _terms(protector, "炭素繊維")
+        self.assertEqual(version.call_count, 1)
+        self.assertEqual(self.library.loads, 1)
+
+    def test_add_terms_does_not_reload_or_rebuild_eagerly(self):
+        protector = TermProtector(self.library.load)
+        _terms(protector, "炭素繊維")
+        with mock.patch.object(AhoCorasick, "build") as build:
+            for index in range(5):
+                protector.add_terms({"japanese": f"用語{index}", "vietnamese": f"term {index}"})
+            build.assert_not_called()
+        self.assertEqual(_terms(protector, "用語3"), ["term 3"])
+        self.assertEqual(self.library.loads, 1)
+
+    def test_add_terms_updates_only_affected_pairs(self):
+        self.library.rows[0]["english"] = "carbon fiber"
+        protector = TermProtector(self.library.load)
+        _terms(protector, "炭素繊維")
+        protector.find_terms("炭素繊維", "ja", "en")
+        ja_vi = protector._automata[("ja", "vi")]
+        ja_en = protector._automata[("ja", "en")]
+        with mock.patch.object(protector, "_add_row_to_automaton") as add_row:
+            protector.add_terms({"japanese": "樹脂", "vietnamese": "nhựa"})
+            self.assertEqual(_terms(protector, "樹脂と炭素繊維"), ["nhựa", "sợi carbon"])
+            add_row.assert_not_called()
+        # Cặp ja-en không có thuật ngữ mới: giữ nguyên automaton; automaton cũ của ja-vi không bị sửa
+        self.assertIs(protector._automata[("ja", "en")], ja_en)
+        self.assertEqual([value for _, _, value in ja_vi.iter_matches("樹脂")], [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+
+from lxml import etree
+
+from Translate_v2.translate_docx import clean_and_merge_runs_in_tree
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+M_NS = "http://schemas.openxmlformats.org/officeDocument/2006/math"
+
+def _paragraph(body):
+    return etree.fromstring(f'<w:p xmlns:w="{W_NS}" xmlns:m="{M_NS}">{body}</w:p>')
+
+def _run(text, bold=False):
+    rpr = "<w:rPr><w:b/></w:rPr>" if bold else ""
+    return f'<w:r w:rsidR="00A1">{rpr}<w:t>{text}</w:t></w:r>'
+
+def _content(paragraph):
+    """Thứ tự nội dung của đoạn: text của run hoặc tên phần tử khác"""
+    return [
+        "".join(child.itertext()) if child.tag == f"{{{W_NS}}}r" else etree.QName(child).localname
+        for child in paragraph
+    ]
+
+class MergeRunsTest(unittest.TestCase):
+    def test_adjacent_runs_with_same_format_are_merged(self):
+        paragraph = _paragraph(_run("製品") + _run(" 番号 ") + _run("強調", bold=True))
+        self.assertEqual(clean_and_merge_runs_in_tree(paragraph), 2)
+        self.assertEqual(_content(paragraph), ["製品 番号 ", "強調"])
+        merged_text = paragraph[0].find(f"{{{W_NS}}}t")
+        self.assertEqual(merged_text.get("{http://www.w3.org/XML/1998/namespace}space"), "preserve")
+        self.assertIsNone(paragraph[0].get(f"{{{W_NS}}}rsidR"))
+
+    def test_ignorable_elements_do_not_block_merge(self):
+        paragraph = _paragraph(
+            _run("前") + '<w:proofErr w:type="spellStart"/>'
+            + '<w:r><w:lastRenderedPageBreak/><w:t>後</w:t></w:r>'
+        )
+        clean_and_merge_runs_in_tree(paragraph)
+        self.assertEqual(_content(paragraph), ["前後", "proofErr"])
+
+    def test_intervening_elements_keep_runs_in_place(self):
+        for between in [
+            "<m:oMath><m:r><m:t>x</m:t></m:r></m:oMath>",
+            '<w:fldSimple w:instr="PAGE">' + _run("1") + "</w:fldSimple>",
+            '<w:ins w:id="1" w:author="a">' + _run("挿入") + "</w:ins>",
+            '<w:bookmarkStart w:id="0" w:name="b"/>',
+            "<w:r><w:tab/></w:r>",
+        ]:
+            with self.subTest(between=between):
+                paragraph = _paragraph(_run("前") + between + _run("後"))
+                expected = _content(_paragraph(_run("前") + between + _run("後")))
+                clean_and_merge_runs_in_tree(paragraph)
+                self.assertEqual(_content(paragraph), expected)
+
+    def test_nested_runs_merge_within_their_own_parent(self):
+        paragraph = _paragraph(
+            _run("前") + '<w:hyperlink w:anchor="a">' + _run("リン") + _run("ク") + "</w:hyperlink>" + _run("後")
+        )
+        clean_and_merge_runs_in_tree(paragraph)
+        self.assertEqual(_content(paragraph), ["前", "hyperlink", "後"])
+        self.assertEqual(_content(paragraph[1]), ["リンク"])
+
+if __name__ == "__main__":
+    unittest.main()
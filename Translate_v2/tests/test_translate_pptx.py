@@ -0,0 +1,51 @@
+import unittest
+from unittest import mock
+
+from lxml import etree
+
+from Translate_v2.segment_collector import SegmentCollector
+from Translate_v2.translate_pptx import collect_segments
+
+A_NS = "http://schemas.openxmlformats.org/drawingml/2006/main"
+
+def _part(*paragraphs):
+    body = "".join(f'<a:p><a:r><a:rPr sz="1800"/><a:t>{text}</a:t></a:r></a:p>' for text in paragraphs)
+    return etree.ElementTree(etree.fromstring(f'<root xmlns:a="{A_NS}">{body}</root>'))
+
+def _run_props(tree):
+    return [
+        (rpr.get("sz"), rpr.find(f"{{{A_NS}}}latin").get("typeface"))
+        for rpr in tree.getroot().iter(f"{{{A_NS}}}rPr")
+    ]
+
+def _translate(parsed_parts, target_lang="vi"):
+    collector = SegmentCollector()
+    collect_segments(parsed_parts, collector, target_lang)
+    with mock.patch("Translate_v2.segment_collector.translate_batch_with_glossary",
+                    side_effect=lambda texts, *args: [f"[vi] {text}" for text in texts]):
+        collector.apply(collector.translate_unique("g", "ja", target_lang), report=False)
+
+class SlideFontTest(unittest.TestCase):
+    def test_baseline_font_for_every_part(self):
+        # Như bản gốc: mọi run đã dịch sang tiếng Việt/Anh được đặt Arial (latin, cs) và 25pt
+        parts = [
+            ("ppt/slides/slide1.xml", _part("表紙", "副題")),
+            ("ppt/slides/slide2.xml", _part("見出し", "本文")),
+            ("ppt/notesSlides/notesSlide1.xml", _part("ノート")),
+            ("ppt/charts/chart1.xml", _part("売上")),
+        ]
+        _translate(parts)
+        for name, tree in parts:
+            with self.subTest(part=name):
+                self.assertTrue(all(props == ("2500", "Arial") for props in _run_props(tree)))
+                rpr = next(tree.getroot().iter(f"{{{A_NS}}}rPr"))
+                self.assertEqual(rpr.find(f"{{{A_NS}}}cs").get("typeface"), "Arial")
+
+    def test_no_font_change_for_other_targets(self):
+        slide = _part("見出し")
+        _translate([("ppt/slides/slide3.xml", slide)], target_lang="zh-CN")
+        rpr = next(slide.getroot().iter(f"{{{A_NS}}}rPr"))
+        self.assertEqual((rpr.get("sz"), len(rpr)), ("1800", 0))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import contextlib
+import io
+import unittest
+from unittest import mock
+
+from Translate_v2 import segment_packer, translate_text
+from Translate_v2.concurrent_executor import get_executor
+from Translate_v2.tests.support import offline_pipeline
+from Translate_v2.translate_text import split_long_segment
+from Translate_v2.translation_backend import LocalTranslationBackend
+
+class MarkerDroppingBackend(LocalTranslationBackend):
+    """Stand-in làm mất marker trong content đã gộp (buộc dịch lại từng segment)"""
+
+    def __init__(self):
+        super().__init__()
+        self.requests = []
+
+    def translate_batch(self, contents, glossary_id, source_lang_code, target_lang_code, mime_type="text/plain"):
+        self.requests.append((mime_type, list(contents)))
+        translations = super().translate_batch(contents, glossary_id, source_lang_code, target_lang_code, mime_type)
+        return [segment_packer._MARKER_RE.sub(" ", text) for text in translations]
+
+class PackingDispatchTest(unittest.TestCase):
+    def test_packs_and_singles_share_the_executor(self):
+        texts = ["部品", "外径", "内径", "長い説明文" * 20]
+        executor = get_executor()
+        with offline_pipeline(MarkerDroppingBackend()) as (backend, _), \
+                mock.patch.object(executor, "map_ordered", wraps=executor.map_ordered) as map_ordered:
+            results = translate_text.translate_batch_with_glossary(texts, None, "ja", "vi")
+
+        self.assertEqual(results, [f"[vi] {text}" for text in texts])
+        # Lượt đầu: content đã gộp (HTML) và segment dài trong cùng một lần gửi; lượt sau: dịch lại từng segment
+        first_round = map_ordered.call_args_list[0].args[1]
+        self.assertEqual(len(first_round), 2)
+        self.assertEqual(len(map_ordered.call_args_list), 2)
+        mime_types = [mime_type for mime_type, _ in backend.requests]
+        self.assertCountEqual(mime_types[:2], ["text/html", "text/plain"])
+        self.assertEqual(backend.requests[-1], ("text/plain", texts[:3]))
+
+    def test_stats_are_logged_not_printed(self):
+        stdout = io.StringIO()
+        with offline_pipeline(), contextlib.redirect_stdout(stdout), \
+                self.assertLogs(translate_text.logger, "DEBUG") as logs:
+            translate_text.translate_batch_with_glossary(["部品", "外径", "内径"], None, "ja", "vi")
+        self.assertEqual(stdout.getvalue(), "")
+        self.assertTrue(any("Packing" in line for line in logs.output))
+
+    def test_failed_sub_batch_is_retried(self):
+        backend = LocalTranslationBackend()
+        calls = []
+        original = backend.translate_batch
+
+        def flaky(contents, *args, **kwargs):
+            calls.append(list(contents))
+            if len(calls) == 1:
+                raise RuntimeError("503")
+            return original(contents, *args, **kwargs)
+
+        backend.translate_batch = flaky
+        with offline_pipeline(backend), mock.patch.object(translate_text, "RETRY_BACKOFF_SECONDS", 0), \
+                mock.patch.object(segment_packer, "PACKING_ENABLED", False):
+            results = translate_text.translate_batch_with_glossary(["部品", "外径"], None, "ja", "vi")
+        self.assertEqual(results, ["[vi] 部品", "[vi] 外径"])
+        self.assertEqual(len(calls), 2)
+
+class RecordingBackend(LocalTranslationBackend):
+    def __init__(self):
+        super().__init__()
+        self.contents = []
+
+    def translate_batch(self, contents, glossary_id, source_lang_code, target_lang_code, mime_type="text/plain"):
+        self.contents.extend(contents)
+        return super().translate_batch(contents, glossary_id, source_lang_code, target_lang_code, mime_type)
+
+class LongSegmentTest(unittest.TestCase):
+    def test_split_at_sentences_is_lossless(self):
+        text = "一文目です。二文目です。三文目です。 Four. Five!"
+        chunks = split_long_segment(text, 12)
+        self.assertEqual("".join(piece + separator for piece, separator in chunks), text)
+        self.assertTrue(all(len(piece) <= 12 for piece, _ in chunks))
+        self.assertEqual(chunks[0], ("一文目です。二文目です。", ""))
+        self.assertEqual(split_long_segment("short", 12), [("short", "")])
+
+    def test_sentence_longer_than_limit_is_cut(self):
+        chunks = split_long_segment("aaaa bbbb cccc", 6)
+        self.assertEqual(chunks, [("aaaa", " "), ("bbbb", " "), ("cccc", "")])
+        self.assertEqual(split_long_segment("x" * 10, 4), [("xxxx", ""), ("xxxx", ""), ("xx", "")])
+
+    def test_html_split_only_outside_tags(self):
+        text = '<span id="r0">一文目。</span>外の文。<span id="r1">二文目。</span>'
+        chunks = split_long_segment(text, 30, "text/html")
+        self.assertEqual("".join(piece + separator for piece, separator in chunks), text)
+        self.assertEqual([piece for piece, _ in chunks], [
+            '<span id="r0">一文目。</span>外の文。', '<span id="r1">二文目。</span>',
+        ])
+        with self.assertRaises(ValueError):
+            split_long_segment('<span id="r0">' + "文。" * 20 + "</span>", 25, "text/html")
+
+    def test_long_segment_translated_in_pieces(self):
+        text = "一文目です。二文目です。三文目です。"
+        with offline_pipeline(RecordingBackend()) as (backend, _), \
+                mock.patch.object(translate_text, "MAX_CODEPOINTS_PER_REQUEST", 12), \
+                mock.patch.object(segment_packer, "PACKING_ENABLED", False):
+            results = translate_text.translate_batch_with_glossary([text, "短い"], None, "ja", "vi")
+        self.assertTrue(all(len(content) <= 12 for content in backend.contents))
+        self.assertEqual(results, ["[vi] 一文目です。二文目です。 [vi] 三文目です。", "[vi] 短い"])
+
+    def test_unsplittable_segment_sent_whole(self):
+        html_text = '<span id="r0">' + "文。" * 20 + "</span>"
+        with offline_pipeline(RecordingBackend()) as (backend, _), \
+                mock.patch.object(translate_text, "MAX_CODEPOINTS_PER_REQUEST", 25), \
+                mock.patch.object(segment_packer, "PACKING_ENABLED", False):
+            results = translate_text.translate_batch_with_glossary(
+                [html_text, "一文目です。二文目です。三文目です。四文目です。五文目です。"], None, "ja", "vi", mime_type="text/html"
+            )
+        # Chỉ segment không tách được gửi nguyên, segment khác vẫn được tách
+        self.assertEqual([content for content in backend.contents if len(content) > 25], [html_text])
+        self.assertEqual(results[0], '<span id="r0">[vi] ' + "文。" * 20 + "</span>")
+        self.assertEqual(results[1], "[vi] 一文目です。二文目です。三文目です。四文目です。 [vi] 五文目です。")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import io
+import os
+import tempfile
+import unittest
+import warnings
+from unittest import mock
+
+import openpyxl
+from lxml import etree
+
+from Translate_v2.segment_collector import SegmentCollector
+from Translate_v2.tests.support import offline_pipeline
+from Translate_v2 import translate_xlsx as xlsx_module
+from Translate_v2.translate_xlsx import SHEET_NAME_MAX_LENGTH, sanitize_sheet_name, stream_worksheet, translate_xlsx
+
+def _worksheet(values):
+    rows = "".join(
+        f'<row r="{i}"><c r="A{i}" t="inlineStr"><is><t>{value}</t></is></c><c r="B{i}"><v>{i}</v></c></row>'
+        for i, value in enumerate(values, 1)
+    )
+    return f'<worksheet xmlns="{xlsx_module.SPREADSHEET_NS}"><sheetData>{rows}</sheetData></worksheet>'.encode()
+
+class SheetNameTest(unittest.TestCase):
+    def test_invalid_characters_length_and_duplicates(self):
+        used = set()
+        self.assertEqual(sanitize_sheet_name("[vi] 売上", used), "vi 売上")
+        self.assertEqual(sanitize_sheet_name("[vi] 売上", used), "vi 売上 (2)")
+        self.assertEqual(sanitize_sheet_name("a/b:c*d?e\\f", used), "a b c d e f")
+        self.assertEqual(sanitize_sheet_name("'quoted'", used), "quoted")
+        self.assertEqual(sanitize_sheet_name("[]", used), "Sheet")
+        long_name = sanitize_sheet_name("Doanh thu theo khu vực và theo quý năm 2024", used)
+        self.assertLessEqual(len(long_name), SHEET_NAME_MAX_LENGTH)
+        self.assertTrue(long_name.startswith("Doanh thu theo khu vực"))
+
+class TranslateXlsxTest(unittest.TestCase):
+    def test_offline_translation_loads_in_openpyxl(self):
+        with tempfile.TemporaryDirectory() as work_dir, warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            path = os.path.join(work_dir, "spec.xlsx")
+            workbook = openpyxl.Workbook()
+            workbook.active.title = "売上"
+            workbook.active["A1"] = "製品番号"
+            workbook.active["B1"] = 12.5
+            # Tên gốc vừa đủ 31 ký tự: bản dịch ("vi " + tên) dài hơn và phải được cắt lại
+            workbook.create_sheet(("売上" + "一覧" * 20)[:SHEET_NAME_MAX_LENGTH])
+            workbook.save(path)
+
+            with offline_pipeline():
+                output = translate_xlsx(path, target_lang=["vi"], source_lang="ja")["vi"]
+                translated = openpyxl.load_workbook(output)
+
+        self.assertEqual([str(warning.message) for warning in caught], [])
+
+        self.assertEqual(translated.sheetnames[0], "vi 売上")
+        self.assertTrue(all(len(name) <= SHEET_NAME_MAX_LENGTH for name in translated.sheetnames))
+        self.assertEqual(translated["vi 売上"]["A1"].value, "[vi] 製品番号")
+        self.assertEqual(translated["vi 売上"]["B1"].value, 12.5)
+
+class CollectSegmentsTest(unittest.TestCase):
+    def test_furigana_skipped_and_drawing_text_kept(self):
+        shared_strings = etree.ElementTree(etree.fromstring(
+            f'<sst xmlns="{xlsx_module.SPREADSHEET_NS}"><si><t>外径</t><rPh sb="0" eb="2"><t>ガイケイ</t></rPh></si>'
+            f"<si><r><t>内径</t></r></si></sst>"
+        ))
+        drawing = etree.ElementTree(etree.fromstring(
+            '<xdr:wsDr xmlns:xdr="http://schemas.openxmlformats.org/drawingml/2006/spreadsheetDrawing" '
+            'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main"><a:p><a:r><a:t>図面</a:t></a:r></a:p></xdr:wsDr>'
+        ))
+        collector = SegmentCollector()
+        xlsx_module.collect_segments(
+            [("xl/sharedStrings.xml", shared_strings), ("xl/drawings/drawing1.xml", drawing)], collector, "vi"
+        )
+        self.assertEqual([text for _, text, _ in collector.nodes], ["外径", "内径", "図面"])
+
+class StreamWorksheetTest(unittest.TestCase):
+    def _stream(self, values):
+        calls = []
+
+        def fake_translate(texts, glossary_id, source_lang, target_lang, mime_type="text/plain"):
+            calls.append(list(texts))
+            return [f"[vi] {text}" for text in texts]
+
+        output = io.BytesIO()
+        with mock.patch("Translate_v2.segment_collector.translate_batch_with_glossary", side_effect=fake_translate):
+            stats = stream_worksheet(io.BytesIO(_worksheet(values)), output, None, "ja", "vi")
+        texts = [elem.text for elem in etree.fromstring(output.getvalue()).iter(xlsx_module._T)]
+        return stats, calls, texts
+
+    def test_repeated_strings_translated_once_across_batches(self):
+        values = [f"部品 {i % 10}" for i in range(1500)] + ["AY00139"] * 1500
+        stats, calls, texts = self._stream(values)
+        self.assertEqual(sum(len(batch) for batch in calls), 10)
+        self.assertEqual(texts[:1500], [f"[vi] {value}" for value in values[:1500]])
+        self.assertEqual(texts[1500:], ["AY00139"] * 1500)
+        self.assertEqual(stats["cells"], 3000)
+        # Mỗi batch 500 dòng: chuỗi bỏ qua được đếm theo batch, không dừng ở giới hạn cache
+        self.assertEqual(stats["skipped"], 3)
+
+    def test_small_cache_evicts_without_losing_batch(self):
+        values = [f"部品 {i}" for i in range(1200)] + [f"部品 {i}" for i in range(1200)]
+        with mock.patch.object(xlsx_module, "_INLINE_CACHE_BYTES", 1000):
+            _, calls, texts = self._stream(values)
+        self.assertEqual(texts, [f"[vi] {value}" for value in values])
+        self.assertGreater(sum(len(batch) for batch in calls), 1200)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from Translate_v2 import translation_memory
+from Translate_v2.translation_memory import LRUCache, TranslationMemory, normalize_segment
+
+class TranslationMemoryTest(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.work_dir.name, "data", "tm.sqlite3")
+        # Fuzzy index nạp nền từ SQLite có thể còn mở file khi thư mục tạm bị xóa (fuzzy có test riêng)
+        patcher = mock.patch.object(translation_memory, "FUZZY_MATCH_ENABLED", False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.work_dir.cleanup()
+
+    def test_normalized_key_and_persistence(self):
+        TranslationMemory(self.db_path).store_translations(["製品　番号 "], ["Mã sản phẩm"], "g", "ja", "vi")
+        memory = TranslationMemory(self.db_path)
+        self.assertEqual(memory.lookup(["製品 番号"], "g", "ja", "vi"), ["Mã sản phẩm"])
+        self.assertEqual(memory.lookup(["製品 番号"], "g", "ja", "en"), [None])
+        self.assertEqual(memory.get_stats()["persistent_hits"], 1)
+
+    def test_mime_types_do_not_share_entries(self):
+        memory = TranslationMemory(self.db_path)
+        memory.store_translations(["A & B"], ["A &amp; B (html)"], "g", "ja", "vi", "text/html")
+        self.assertEqual(memory.lookup(["A & B"], "g", "ja", "vi", "text/plain"), [None])
+        memory.store_translations(["A & B"], ["A & B (plain)"], "g", "ja", "vi", "text/plain")
+
+        fresh = TranslationMemory(self.db_path)
+        self.assertEqual(fresh.lookup(["A & B"], "g", "ja", "vi", "text/html"), ["A &amp; B (html)"])
+        self.assertEqual(fresh.lookup(["A & B"], "g", "ja", "vi"), ["A & B (plain)"])
+
+    def test_invalidate_glossary(self):
+        memory = TranslationMemory(self.db_path)
+        memory.store_translations(["製品"], ["sản phẩm"], "g", "ja", "vi")
+        memory.invalidate_glossary("g")
+        self.assertEqual(memory.lookup(["製品"], "g", "ja", "vi"), [None])
+
+    def test_old_schema_without_mime_type_is_dropped(self):
+        os.makedirs(os.path.dirname(self.db_path))
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                "CREATE TABLE translation_memory (source_text TEXT, source_lang TEXT, target_lang TEXT, "
+                "glossary_id TEXT, glossary_version INTEGER, translated_text TEXT)"
+            )
+            conn.execute("INSERT INTO translation_memory VALUES ('製品', 'ja', 'vi', 'g', 0, '<b>x</b>')")
+        memory = TranslationMemory(self.db_path)
+        self.assertEqual(memory.lookup(["製品"], "g", "ja", "vi"), [None])
+
+    def test_default_db_is_outside_the_package(self):
+        package_dir = os.path.dirname(os.path.abspath(translation_memory.__file__))
+        self.assertFalse(os.path.abspath(translation_memory.TM_DB_PATH).startswith(package_dir + os.sep))
+
+class LRUCacheTest(unittest.TestCase):
+    def test_evicts_least_recently_used_by_bytes(self):
+        key = lambda text: (text, "ja", "vi", "g", 0, "text/plain")
+        cache = LRUCache(max_bytes=3 * LRUCache._entry_size(key("a"), "x"))
+        for text in "abc":
+            cache.put(key(text), "x")
+        cache.get(key("a"))
+        cache.put(key("d"), "x")
+        self.assertIsNone(cache.get(key("b")))
+        self.assertEqual(cache.get(key("a")), "x")
+        self.assertEqual(len(cache), 3)
+
+    def test_normalize_segment(self):
+        self.assertEqual(normalize_segment(" ＡＢＣ　１２３\n"), "ABC 123")
+
+if __name__ == "__main__":
+    unittest.main()
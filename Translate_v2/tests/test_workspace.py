@@ -0,0 +1,66 @@
+import contextlib
+import io
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from Translate_v2 import workspace
+from Translate_v2.workspace import current_workspace, derived_path, job_workspace, purge_expired_workspaces
+
+class JobWorkspaceTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.disk_root = os.path.join(self.root.name, "disk")
+        self.shm_root = os.path.join(self.root.name, "shm", "toray_translate")
+        os.makedirs(os.path.dirname(self.shm_root))
+        for name, value in [("WORKSPACE_ROOT", self.disk_root), ("SHM_ROOT", self.shm_root), ("RETENTION_SECONDS", 0)]:
+            patcher = mock.patch.object(workspace, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(self.root.cleanup)
+
+    def test_directory_removed_after_job(self):
+        with job_workspace() as job:
+            self.assertIs(current_workspace(), job)
+            self.assertEqual(derived_path("/uploads/report.docx", "_vi.docx"), os.path.join(job.path, "report_vi.docx"))
+            with open(job.file_path("in.docx"), "w") as f:
+                f.write("x")
+        self.assertFalse(os.path.exists(job.path))
+        self.assertIsNone(current_workspace())
+        self.assertEqual(derived_path("/uploads/report.docx", "_vi.docx"), "/uploads/report_vi.docx")
+
+    def test_directory_removed_when_job_fails(self):
+        with self.assertRaises(RuntimeError):
+            with job_workspace() as job:
+                raise RuntimeError("translate failed")
+        self.assertFalse(os.path.exists(job.path))
+
+    def test_retained_workspace_purged_after_retention(self):
+        with mock.patch.object(workspace, "RETENTION_SECONDS", 60), contextlib.redirect_stdout(io.StringIO()):
+            with job_workspace() as job:
+                pass
+            self.assertTrue(os.path.isdir(job.path))
+            purge_expired_workspaces(now=time.time() + 30)
+            self.assertTrue(os.path.isdir(job.path))
+            purge_expired_workspaces(now=time.time() + 120)
+        self.assertFalse(os.path.exists(job.path))
+
+    def test_running_job_not_purged(self):
+        with job_workspace() as job:
+            purge_expired_workspaces(now=time.time() + 10 ** 6)
+            self.assertTrue(os.path.isdir(job.path))
+
+    def test_shm_used_within_budget(self):
+        with mock.patch.object(workspace, "WORKSPACE_USE_SHM", True), mock.patch.object(workspace, "SHM_BUDGET_BYTES", 100):
+            with job_workspace(expected_bytes=60) as first:
+                self.assertTrue(first.path.startswith(self.shm_root))
+                with job_workspace(expected_bytes=60) as second:
+                    self.assertTrue(second.path.startswith(self.disk_root))
+            with job_workspace(expected_bytes=60) as third:
+                self.assertTrue(third.path.startswith(self.shm_root))
+        self.assertEqual(workspace._shm_reserved_bytes, 0)
+
+if __name__ == "__main__":
+    unittest.main()
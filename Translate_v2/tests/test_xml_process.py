@@ -0,0 +1,172 @@
+import io
+import os
+import tempfile
+import unittest
+import zipfile
+from unittest import mock
+
+from Translate_v2.xml_process import RawZipWriter, compress_entry, copy_zip_entry_raw, select_related_parts, write_package
+
+def _make_source(path):
+    with zipfile.ZipFile(path, "w") as zf:
+        info = zipfile.ZipInfo("[Content_Types].xml", date_time=(2021, 3, 4, 5, 6, 8))
+        info.external_attr = 0o100644 << 16
+        zf.writestr(info, b"<Types/>" * 50, compress_type=zipfile.ZIP_DEFLATED)
+        info = zipfile.ZipInfo("word/media/画像.png", date_time=(2022, 7, 8, 9, 10, 12))
+        info.external_attr = 0o100600 << 16
+        zf.writestr(info, os.urandom(4096), compress_type=zipfile.ZIP_STORED)
+        info = zipfile.ZipInfo("word/document.xml", date_time=(2023, 1, 2, 3, 4, 6))
+        info.external_attr = 0o100640 << 16
+        zf.writestr(info, b"<w:document>old</w:document>", compress_type=zipfile.ZIP_DEFLATED)
+
+def _raw_data(path, name):
+    """Dữ liệu nén (chưa giải nén) của một entry"""
+    with zipfile.ZipFile(path) as zf, open(path, "rb") as fp:
+        info = zf.getinfo(name)
+        fp.seek(info.header_offset + 26)
+        name_length, extra_length = int.from_bytes(fp.read(2), "little"), int.from_bytes(fp.read(2), "little")
+        fp.seek(info.header_offset + 30 + name_length + extra_length)
+        return fp.read(info.compress_size)
+
+_RELS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/"
+_MAIN = "application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"
+_HEADER = "application/vnd.openxmlformats-officedocument.wordprocessingml.header+xml"
+_STYLES = "application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"
+
+def _relationships(*targets):
+    rels = "".join(
+        f'<Relationship Id="rId{i}" Type="{_RELS}{rel_type}" Target="{target}"{extra}/>'
+        for i, (rel_type, target, extra) in enumerate(targets)
+    )
+    return f'<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">{rels}</Relationships>'
+
+def _make_related_package():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        zf.writestr(
+            "[Content_Types].xml",
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            f'<Override PartName="/word/document.xml" ContentType="{_MAIN}"/>'
+            f'<Override PartName="/word/header1.xml" ContentType="{_HEADER}"/>'
+            f'<Override PartName="/word/header2.xml" ContentType="{_HEADER}"/>'
+            f'<Override PartName="/word/styles.xml" ContentType="{_STYLES}"/>'
+            f'<Override PartName="/word/orphan.xml" ContentType="{_HEADER}"/></Types>',
+        )
+        zf.writestr("_rels/.rels", _relationships(
+            ("officeDocument", "word/document.xml", ""), ("extended-properties", "docProps/app.xml", ""),
+        ))
+        zf.writestr("word/_rels/document.xml.rels", _relationships(
+            ("header", "header1.xml", ""), ("styles", "styles.xml", ""), ("header", "/word/header1.xml", ""),
+            ("hyperlink", "https://www.toray.co.jp/", ' TargetMode="External"'), ("header", "missing.xml", ""),
+        ))
+        zf.writestr("word/_rels/styles.xml.rels", _relationships(("header", "header2.xml", "")))
+        for name in ["word/document.xml", "word/header1.xml", "word/header2.xml", "word/styles.xml", "word/orphan.xml",
+                     "docProps/app.xml"]:
+            zf.writestr(name, "<x/>")
+    return zipfile.ZipFile(buffer)
+
+class RawZipWriterTest(unittest.TestCase):
+    def test_written_archive_is_valid(self):
+        buffer = io.BytesIO()
+        with RawZipWriter(buffer) as writer:
+            info, data = compress_entry("a.xml", b"<a>" * 100, (2020, 1, 1, 0, 0, 0), 0o100644 << 16)
+            writer.write_compressed(info, [data])
+            info, data = compress_entry("ảnh/ö.png", b"\x89PNG" * 10)
+            writer.write_compressed(info, [data[:5], data[5:]])
+        with zipfile.ZipFile(buffer) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(zf.namelist(), ["a.xml", "ảnh/ö.png"])
+            self.assertEqual(zf.read("a.xml"), b"<a>" * 100)
+            self.assertEqual(zf.getinfo("a.xml").external_attr, 0o100644 << 16)
+            self.assertEqual(zf.getinfo("a.xml").date_time, (2020, 1, 1, 0, 0, 0))
+
+    def test_zip64_end_record_when_over_entry_limit(self):
+        buffer = io.BytesIO()
+        with mock.patch.object(zipfile, "ZIP_FILECOUNT_LIMIT", 1), RawZipWriter(buffer) as writer:
+            for index in range(3):
+                info, data = compress_entry(f"{index}.xml", b"<x/>")
+                writer.write_compressed(info, [data])
+        self.assertIn(zipfile.stringEndArchive64, buffer.getvalue())
+        with zipfile.ZipFile(buffer) as zf:
+            self.assertEqual(zf.namelist(), ["0.xml", "1.xml", "2.xml"])
+            self.assertIsNone(zf.testzip())
+
+    def test_size_mismatch_is_rejected(self):
+        writer = RawZipWriter(io.BytesIO())
+        info, data = compress_entry("a.xml", b"<a/>")
+        with self.assertRaises(zipfile.BadZipFile):
+            writer.write_compressed(info, [data[:-1]])
+
+    def test_no_central_directory_on_exception(self):
+        buffer = io.BytesIO()
+        with self.assertRaises(RuntimeError), RawZipWriter(buffer) as writer:
+            info, data = compress_entry("a.xml", b"<a/>")
+            writer.write_compressed(info, [data])
+            raise RuntimeError("lỗi giữa chừng")
+        self.assertNotIn(zipfile.stringEndArchive, buffer.getvalue())
+        self.assertNotIn(zipfile.stringCentralDir, buffer.getvalue())
+
+class WritePackageTest(unittest.TestCase):
+    def test_passthrough_is_raw_and_metadata_preserved(self):
+        with tempfile.TemporaryDirectory() as work_dir:
+            source = os.path.join(work_dir, "in.docx")
+            output = os.path.join(work_dir, "out.docx")
+            streamed = os.path.join(work_dir, "types.xml")
+            _make_source(source)
+            with open(streamed, "wb") as f:
+                f.write(b"<Types>streamed</Types>")
+            write_package(source, output, {
+                "word/document.xml": b"<w:document>new</w:document>",
+                "[Content_Types].xml": streamed,
+            })
+
+            self.assertEqual(_raw_data(output, "word/media/画像.png"), _raw_data(source, "word/media/画像.png"))
+            self.assertFalse(os.path.exists(f"{streamed}.z"))
+            with zipfile.ZipFile(source) as zin, zipfile.ZipFile(output) as zout:
+                self.assertIsNone(zout.testzip())
+                self.assertEqual(zout.namelist(), zin.namelist())
+                self.assertEqual(zout.read("word/document.xml"), b"<w:document>new</w:document>")
+                self.assertEqual(zout.read("[Content_Types].xml"), b"<Types>streamed</Types>")
+                for original in zin.infolist():
+                    copied = zout.getinfo(original.filename)
+                    self.assertEqual(copied.date_time, original.date_time)
+                    self.assertEqual(copied.external_attr, original.external_attr)
+
+    def test_failure_leaves_no_tmp_output(self):
+        with tempfile.TemporaryDirectory() as work_dir:
+            source = os.path.join(work_dir, "in.docx")
+            output = os.path.join(work_dir, "out.docx")
+            _make_source(source)
+            missing = os.path.join(work_dir, "missing.xml")
+            with self.assertRaises(FileNotFoundError):
+                write_package(source, output, {"word/document.xml": missing})
+            self.assertEqual(sorted(os.listdir(work_dir)), ["in.docx"])
+
+    def test_copy_entry_raw_between_archives(self):
+        with tempfile.TemporaryDirectory() as work_dir:
+            source = os.path.join(work_dir, "in.zip")
+            _make_source(source)
+            buffer = io.BytesIO()
+            with zipfile.ZipFile(source) as zin, open(source, "rb") as fp, RawZipWriter(buffer) as writer:
+                for info in zin.infolist():
+                    copy_zip_entry_raw(fp, info, writer)
+            with zipfile.ZipFile(source) as zin, zipfile.ZipFile(buffer) as zout:
+                self.assertIsNone(zout.testzip())
+                for name in zin.namelist():
+                    self.assertEqual(zout.read(name), zin.read(name))
+
+class SelectRelatedPartsTest(unittest.TestCase):
+    def test_follows_relationships_from_main_part(self):
+        with _make_related_package() as package:
+            self.assertEqual(select_related_parts(package, {_MAIN, _HEADER}), ["word/document.xml", "word/header1.xml"])
+
+    def test_only_selected_content_types_are_traversed(self):
+        with _make_related_package() as package:
+            self.assertEqual(select_related_parts(package, {_MAIN, _HEADER, _STYLES}), [
+                "word/document.xml", "word/header1.xml", "word/styles.xml", "word/header2.xml",
+            ])
+            self.assertEqual(select_related_parts(package, {_HEADER}), [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import io
+import unittest
+
+from lxml import etree
+
+from Translate_v2.xml_stream import stream_records
+
+NS = "urn:test"
+P = f"{{{NS}}}p"
+
+def _bracket(records):
+    for record in records:
+        record.text = f"[{record.text}]"
+
+def _stream(source, **kwargs):
+    output = io.BytesIO()
+    count = stream_records(io.BytesIO(source), output, {P}, _bracket, **kwargs)
+    return count, output.getvalue()
+
+class StreamRecordsTest(unittest.TestCase):
+    def test_mixed_content_outside_records_is_kept(self):
+        source = (
+            f'<doc xmlns="{NS}">head &amp; <sec a="1">intro<p>one</p>mid &lt;<p>two</p>end</sec>'
+            f"after<empty/>tail<b>bold</b></doc>"
+        ).encode()
+        for batch_records in (1, 100):
+            count, output = _stream(source, batch_records=batch_records)
+            self.assertEqual(count, 2)
+            root = etree.fromstring(output)
+            expected = etree.fromstring(source)
+            for p in expected.iter(P):
+                p.text = f"[{p.text}]"
+            self.assertEqual(etree.tostring(root, method="c14n"), etree.tostring(expected, method="c14n"))
+
+    def test_large_part_keeps_text_and_tails(self):
+        # Part lớn hơn bộ đệm của parser: text / tail không có sẵn ở sự kiện "start"
+        body = "".join(f"<sec>lead {i}<p>row {i}</p>tail {i}</sec>gap {i}" for i in range(5000))
+        source = f'<doc xmlns="{NS}">{body}</doc>'.encode()
+        count, output = _stream(source, batch_records=7)
+        self.assertEqual(count, 5000)
+        text = "".join(etree.fromstring(output).itertext())
+        self.assertEqual(text, "".join(f"lead {i}[row {i}]tail {i}gap {i}" for i in range(5000)))
+
+    def test_declaration_copied_from_source(self):
+        _, output = _stream(f'<?xml version="1.0" encoding="UTF-8" standalone="no"?><doc xmlns="{NS}"/>'.encode())
+        self.assertTrue(output.startswith(b"<?xml version='1.0' encoding='UTF-8' standalone='no'?>"))
+        _, output = _stream(f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><doc xmlns="{NS}"/>'.encode())
+        self.assertIn(b"standalone='yes'", output.split(b"\n")[0])
+        _, output = _stream(f'<doc xmlns="{NS}"><p>x</p></doc>'.encode())
+        self.assertNotIn(b"standalone", output.split(b"\n")[0])
+
+if __name__ == "__main__":
+    unittest.main()
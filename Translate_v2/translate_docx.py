@@ -1,176 +1,348 @@
-import shutil
 import os
 from lxml import etree as ET
-from fastapi import HTTPException
-import html
-from .detect_lang import detect_language, extract_content, LANGUAGES, language_pair
-from .translate_text import translate_text_with_glossary
-from .xml_process import copy_and_extract, compress_folder
+from .detect_lang import LANGUAGES
+from .multi_target import translate_package
+from .paragraph_segmenter import PARAGRAPH_TAGS, add_text_elems
+from .segment_collector import SegmentCollector
+from .xml_process import FolderPackage, parse_part, select_related_parts, write_xml_parts
+from .xml_stream import stream_records
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+_W_R = f"{{{W_NS}}}r"
+_W_T = f"{{{W_NS}}}t"
+_W_RPR = f"{{{W_NS}}}rPr"
+_W_LANG = f"{{{W_NS}}}lang"
+# Phần tử không mang nội dung: anh em nằm giữa hai run (proofErr) hoặc con trong run (lastRenderedPageBreak)
+# không ngăn việc gộp run
+_IGNORABLE_SIBLINGS = {f"{{{W_NS}}}proofErr"}
+_IGNORABLE_RUN_CHILDREN = {f"{{{W_NS}}}lastRenderedPageBreak"}
+_XML_SPACE = "{http://www.w3.org/XML/1998/namespace}space"
+
+# Part có nội dung cần dịch: văn bản chính, header, footer, footnote, endnote, comment, chart, SmartArt.
+# styles, settings, fontTable, theme, customXml... không được parse và giữ nguyên byte-for-byte.
+DOCX_TEXT_CONTENT_TYPES = {
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.template.main+xml",
+    "application/vnd.ms-word.document.macroEnabled.main+xml",
+    "application/vnd.ms-word.template.macroEnabledTemplate.main+xml",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.header+xml",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.footer+xml",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.footnotes+xml",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.endnotes+xml",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.comments+xml",
+    "application/vnd.openxmlformats-officedocument.drawingml.chart+xml",
+    "application/vnd.openxmlformats-officedocument.drawingml.diagramData+xml",
+    "application/vnd.ms-office.drawingml.diagramDrawing+xml",
+}
 
 # Thêm vào cùng file, trước khi dùng
 def clean_and_merge_runs(xml_file_path):
-    namespaces = {'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'}
-
     # Parse XML
     parser = ET.XMLParser(remove_blank_text=True)
     tree = ET.parse(xml_file_path, parser)
-    root = tree.getroot()
-
-    def clean_run(run):
-        # Remove rsid attributes
-        for attr in list(run.attrib):
-            if 'rsidR' in attr:
-                del run.attrib[attr]
-
-        rpr = run.find('w:rPr', namespaces)
-        if rpr is not None:
-            # Remove <w:lang> in rPr
-            for lang_tag in rpr.findall('w:lang', namespaces):
-                rpr.remove(lang_tag)
+    clean_and_merge_runs_in_tree(tree.getroot())
 
-        for t in run.findall('w:t', namespaces):
-            t.attrib.pop('{http://www.w3.org/XML/1998/namespace}space', None)
+    tree.write(xml_file_path, pretty_print=True, xml_declaration=True, encoding="UTF-8")
+    print(f"🧹 Đã clean file XML: {xml_file_path}")
 
+def _rpr_fingerprint(elem):
+    """
+    Dấu vân tay chuẩn hóa của <w:rPr>: (tag, thuộc tính đã sắp xếp, con đệ quy).
+    Tính một lần cho mỗi run thay vì ET.tostring cho từng cặp run khi so sánh.
+    """
+    if elem is None:
+        return None
+    return (elem.tag, tuple(sorted(elem.attrib.items())), tuple(_rpr_fingerprint(child) for child in elem))
+
+def _clean_run(run):
+    """Xóa rsid, <w:lang>, xml:space; trả về (dấu vân tay rPr, <w:t> nếu run chỉ chứa text)"""
+    for attr in list(run.attrib):
+        if 'rsidR' in attr:
+            del run.attrib[attr]
+
+    rpr = None
+    text_elem = None
+    text_only = True
+    for child in run:
+        if child.tag == _W_RPR:
+            rpr = child
+        elif child.tag == _W_T and text_elem is None:
+            child.attrib.pop(_XML_SPACE, None)
+            text_elem = child
+        elif child.tag in _IGNORABLE_RUN_CHILDREN:
+            continue
+        else:
+            # Run có tab, ngắt dòng, hình vẽ... không được gộp để không mất nội dung
+            text_only = False
+
+    if rpr is not None:
+        for lang_tag in rpr.findall(_W_LANG):
+            rpr.remove(lang_tag)
         # Xóa <w:rPr> nếu đã rỗng
-        if rpr is not None and len(rpr) == 0:
+        if len(rpr) == 0:
             run.remove(rpr)
-
-    def rpr_equal(rpr1, rpr2):
-        if rpr1 is None and rpr2 is None:
-            return True
-        if rpr1 is None or rpr2 is None:
-            return False
-        return ET.tostring(rpr1) == ET.tostring(rpr2)
-
-    for para in root.findall('.//w:p', namespaces):
-        runs = para.findall('w:r', namespaces)
-
-        new_runs = []
-        current_run = None
-
-        for run in runs:
-            clean_run(run)
-            rpr = run.find('w:rPr', namespaces)
-            t_elem = run.find('w:t', namespaces)
-            text = t_elem.text if t_elem is not None else ''
-
-            if current_run is None:
-                current_run = ET.fromstring(ET.tostring(run))
-                continue
-
-            current_rpr = current_run.find('w:rPr', namespaces)
-
-            if rpr_equal(rpr, current_rpr):
-                current_text_elem = current_run.find('w:t', namespaces)
-                if current_text_elem is not None:
-                    current_text_elem.text = (current_text_elem.text or '') + text
-                else:
-                    new_t_elem = ET.SubElement(current_run, '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}t')
-                    new_t_elem.text = text
-            else:
-                new_runs.append(current_run)
-                current_run = ET.fromstring(ET.tostring(run))
-
-        if current_run is not None:
-            new_runs.append(current_run)
-
-        # Replace all old runs
-        for run in runs:
-            para.remove(run)
-        for run in new_runs:
-            para.append(run)
-
-    tree.write(xml_file_path, pretty_print=True, xml_declaration=True, encoding="UTF-8")
-    print(f"🧹 Đã clean file XML: {xml_file_path}")
+            rpr = None
+
+    return _rpr_fingerprint(rpr), text_elem if text_only else None
+
+def _previous_run(run):
+    """Anh em liền trước của run, bỏ qua các phần tử không mang nội dung (proofErr)"""
+    previous = run.getprevious()
+    while previous is not None and previous.tag in _IGNORABLE_SIBLINGS:
+        previous = previous.getprevious()
+    return previous
+
+def clean_and_merge_runs_in_tree(root, on_text=None):
+    """
+    Chuẩn hóa và gộp run trên cây đã parse trong một lần duyệt:
+    - mỗi run được clean và tính dấu vân tay rPr đúng một lần
+    - các run chỉ chứa text, liền kề nhau (chỉ cách nhau bởi proofErr) và cùng định dạng được gộp tại chỗ
+      vào run đầu tiên; công thức, field, bookmark, w:ins/w:del hay run khác nằm giữa sẽ ngắt việc gộp
+    - đồng thời gom các phần tử text (<w:t>, <a:t>...) còn lại, gọi on_text(elem) cho từng phần tử có nội dung
+    Trả về số phần tử text có nội dung của part.
+    """
+    runs = []
+    other_texts = []
+    for elem in root.iter(_W_R, "{*}t"):
+        if elem.tag == _W_R:
+            runs.append(elem)
+        elif elem.tag != _W_T:
+            other_texts.append(elem)
+
+    text_elems = []
+    anchor_run = anchor_text = anchor_fingerprint = None
+    for run in runs:
+        fingerprint, text_elem = _clean_run(run)
+        if (
+            text_elem is not None
+            and anchor_text is not None
+            and _previous_run(run) is anchor_run
+            and fingerprint == anchor_fingerprint
+        ):
+            anchor_text.text = (anchor_text.text or '') + (text_elem.text or '')
+            run.getparent().remove(run)
+            continue
+
+        anchor_run, anchor_text, anchor_fingerprint = run, text_elem, fingerprint
+        text_elems.extend(child for child in run if child.tag == _W_T)
+
+    text_count = 0
+    for elem in text_elems + other_texts:
+        if not elem.text:
+            continue
+        if elem.tag == _W_T and elem.text != elem.text.strip():
+            # Giữ khoảng trắng đầu/cuối của text đã gộp
+            elem.set(_XML_SPACE, "preserve")
+        if not elem.text.strip():
+            continue
+        text_count += 1
+        if on_text is not None:
+            on_text(elem)
+    return text_count
+
+def select_parts(package):
+    """Part cần dịch, chọn theo [Content_Types].xml và các file .rels (DOCX_TEXT_CONTENT_TYPES)"""
+    return select_related_parts(package, DOCX_TEXT_CONTENT_TYPES)
+
+def load_part(package, name, on_text=None):
+    """Parse và chuẩn hóa run một part; trả về None nếu part không có text (giữ nguyên byte-for-byte)"""
+    print(f"🔵 Đang xử lý file XML: {name}")
+
+    tree = parse_part(package, name)
+    if clean_and_merge_runs_in_tree(tree.getroot(), on_text):
+        return tree
+    return None
+
+def load_parts(package, collector=None):
+    """
+    Parse và chuẩn hóa run các part có text (một lần parse cho mỗi part, không ghi/parse lại).
+    package là zipfile.ZipFile hoặc FolderPackage; trả về [(tên part, tree)].
+    Nếu có collector, text node được đăng ký ngay trong lần duyệt chuẩn hóa.
+    """
+    parsed_parts = []
+    for name in select_parts(package):
+        part_texts = []
+        tree = load_part(package, name, part_texts.append)
+        if tree is not None:
+            parsed_parts.append((name, tree))
+            if collector is not None:
+                add_text_elems(collector, part_texts)
+    return parsed_parts
+
+def collect_segments(parsed_parts, collector, _target_lang=None):
+    """
+    Đăng ký mọi text node của các part vào collector (mỗi đoạn văn là một segment).
+    DOCX không chỉnh sửa gì theo ngôn ngữ đích; tham số thứ ba chỉ để khớp giao diện của translate_package.
+    """
+    for _, tree in parsed_parts:
+        add_text_elems(collector, [elem for elem in tree.getroot().iter("{*}t") if elem.text and elem.text.strip()])
+
+def stream_part(source, output, name, glossary_id, source_lang, target_lang):
+    """Chế độ streaming cho part rất lớn: mỗi đoạn (w:p / a:p) là một record, chuẩn hóa và dịch theo batch"""
+    def translate_records(records):
+        collector = SegmentCollector()
+        for record in records:
+            part_texts = []
+            clean_and_merge_runs_in_tree(record, part_texts.append)
+            add_text_elems(collector, part_texts)
+        collector.apply(collector.translate_unique(glossary_id, source_lang, target_lang), report=False)
+
+    stream_records(source, output, set(PARAGRAPH_TAGS), translate_records)
 
 def translate_all_xml_in_folder(folder_path, glossary_id, source_lang, target_lang):
-    for root_dir, dirs, files in os.walk(folder_path):
-        for file in files:
-            if file.endswith(".xml"):
-                xml_file_path = os.path.join(root_dir, file)
-                print(f"🔵 Đang xử lý file XML: {xml_file_path}")
-
-                clean_and_merge_runs(xml_file_path)
-
-                parser = ET.XMLParser(remove_blank_text=True)
-                tree = ET.parse(xml_file_path, parser)
-                root = tree.getroot()
-
-                # Namespace cho file Word (docx)
-                ns = {"w": "http://schemas.openxmlformats.org/wordprocessingml/2006/main"}
-
-                # # Nếu là styles.xml hoặc các file khác, thay đổi font chữ
-                # for rFonts_elem in root.findall(".//w:rFonts", namespaces=ns):
-                #     if rFonts_elem is not None:
-                #         # Cập nhật font chữ
-                #         rFonts_elem.set("{http://schemas.openxmlformats.org/wordprocessingml/2006/main}ascii", "Times New Roman")
-                #         rFonts_elem.set("{http://schemas.openxmlformats.org/wordprocessingml/2006/main}eastAsia", "Times New Roman")
-                #         rFonts_elem.set("{http://schemas.openxmlformats.org/wordprocessingml/2006/main}hAnsi", "Times New Roman")
-                #         rFonts_elem.set("{http://schemas.openxmlformats.org/wordprocessingml/2006/main}cs", "Times New Roman")
-
-                        # print(f"✅ Đã thay đổi font chữ: ascii={old_ascii}, eastAsia={old_eastAsia}, hAnsi={old_hAnsi}, cs={old_cs} -> Arial")
-
-                # Duyệt qua các phần tử khác và dịch nội dung
-                for elem in root.iter():
-                    if elem.tag.endswith("}t") and elem.text and elem.text.strip():
-                        original_text = elem.text.strip()
-                        try:
-                            translated_text = translate_text_with_glossary(
-                                original_text, glossary_id, source_lang, target_lang
-                            )
-                            elem.text = html.unescape(translated_text)
-                        except Exception as e:
-                            print(f"⚠️ Lỗi khi dịch đoạn text: {original_text} — {e}")
-
-                # Ghi lại file
-                tree.write(xml_file_path, pretty_print=True, xml_declaration=True, encoding="UTF-8")
-                print(f"✅ Đã lưu file dịch: {xml_file_path}")
-                
-def translate_docx(docx_file, target_lang=None):
-    extracted_folder = copy_and_extract(docx_file)
-
-    source_lang = detect_language(extract_content(docx_file))
-    if source_lang not in LANGUAGES:
-        raise HTTPException(status_code=400, detail=f"Unsupported source language: {source_lang}")
-    print(f"Detected language: {LANGUAGES[source_lang]}")
-    
-    # Nếu chỉ định ngôn ngữ đích cụ thể
-    if target_lang:
+    # Bước 1: gom toàn bộ text node của các part
+    collector = SegmentCollector()
+    parsed_parts = load_parts(FolderPackage(folder_path), collector)
+
+    # Bước 2: dịch mỗi chuỗi duy nhất một lần cho cả tài liệu
+    collector.translate(glossary_id, source_lang, target_lang)
+
+    # Bước 3: ghi lại các file
+    write_xml_parts(parsed_parts, folder_path)
+
+def translate_docx(file_path, target_lang=None, source_lang=None):
+    """
+    Dịch file DOCX. target_lang là một mã ngôn ngữ, một list mã ngôn ngữ (giải nén và parse
+    một lần cho mọi ngôn ngữ đích) hoặc None (mọi ngôn ngữ khác ngôn ngữ nguồn).
+    Trả về dict ngôn ngữ đích -> đường dẫn file đã dịch.
+    """
+    if isinstance(target_lang, str):
         target_langs = [target_lang]
     else:
-        target_langs = [lang for lang in LANGUAGES.keys() if lang != source_lang]
-
-    for target_lang in target_langs:
-        extracted_folder_temp = f"{extracted_folder}_{target_lang}"
-        if os.path.exists(extracted_folder_temp):
-            shutil.rmtree(extracted_folder_temp)
-        extracted_folder_temp = shutil.copytree(extracted_folder, f"{extracted_folder}_{target_lang}")
-
-        pair_code = f"{source_lang}-{target_lang}" if f"{source_lang}-{target_lang}" in language_pair.keys() else f"{target_lang}-{source_lang}"
-
-        if pair_code not in language_pair:
-            raise HTTPException(status_code=400, detail=f"Unsupported language pair: {pair_code}")
-        
-        glossary_id = f"toray_translation_glossary_{language_pair[pair_code]}"
-        translate_all_xml_in_folder(extracted_folder_temp, glossary_id, source_lang, target_lang)
-        
-        # Đặt tên file dịch theo format của translate.py
-        base_name = docx_file.rsplit(".", 1)[0]
-        output_docx = f"{base_name}_{target_lang}.docx"
-        compress_folder(extracted_folder_temp, docx_file, output_docx)
-
-        # Xóa thư mục tạm extracted_folder_temp
-        shutil.rmtree(extracted_folder_temp, ignore_errors=True)
-
-    # Xóa thư mục tạm extracted_folder
-    shutil.rmtree(extracted_folder, ignore_errors=True)
-
-    # Xóa file zip tạm
-    zip_path = docx_file.replace(".docx", "_copy.zip")
-    if os.path.exists(zip_path):
-        os.remove(zip_path)
-
-# Ví dụ sử dụng:
+        target_langs = list(target_lang or LANGUAGES.keys())
+    return translate_package(
+        file_path, target_langs, source_lang, select_parts, load_part, collect_segments, stream_part=stream_part
+    )
+
 if __name__ == "__main__":
-    docx_file = r"C:\Users\User\OneDrive - Hanoi University of Science and Technology\Documents\Lập trình cơ bản\Projects\[ISE] Toray translator project\Test library\docx_BaiTapER - Copy (2).docx"
-    translate_docx(docx_file)
\ No newline at end of file
+    # Benchmark: python -m Translate_v2.translate_docx [--pages 1000] [file.docx]
+    import argparse
+    import io
+    import tempfile
+    import time
+    import zipfile
+
+    parser = argparse.ArgumentParser(description="Benchmark docx run normalization + segment extraction")
+    parser.add_argument("file", nargs="?", help="file docx; mặc định sinh tài liệu giả lập")
+    parser.add_argument("--pages", type=int, default=1000)
+    args = parser.parse_args()
+
+    def build_sample_docx(path, pages):
+        """Tài liệu giả lập: mỗi trang 30 đoạn, mỗi đoạn vài run bị tách bởi rsid/lang như file Word thật"""
+        body = []
+        for page in range(pages):
+            for line in range(30):
+                runs = "".join(
+                    f'<w:r w:rsidR="00{(page * 7 + line + k) % 97:06d}"><w:rPr>'
+                    f'{"<w:b/>" if k == 3 else ""}<w:lang w:val="ja-JP"/></w:rPr>'
+                    f'<w:t xml:space="preserve">段落 {line} 部品 {k} </w:t></w:r>'
+                    for k in range(5)
+                )
+                body.append(f'<w:p><w:pPr><w:jc w:val="left"/></w:pPr><w:proofErr w:type="spellStart"/>{runs}</w:p>')
+            body.append('<w:p><w:r><w:br w:type="page"/></w:r></w:p>')
+        document = f'<?xml version="1.0" encoding="UTF-8"?><w:document xmlns:w="{W_NS}"><w:body>{"".join(body)}</w:body></w:document>'
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr("[Content_Types].xml", '<?xml version="1.0" encoding="UTF-8"?><Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types"/>')
+            archive.writestr("word/document.xml", document)
+
+    def legacy_clean_and_merge_runs(root):
+        """Thuật toán cũ: ET.tostring cho mỗi cặp rPr và bản sao fromstring(tostring) cho mỗi run"""
+        namespaces = {'w': W_NS}
+        for para in root.findall('.//w:p', namespaces):
+            runs = para.findall('w:r', namespaces)
+            new_runs, current_run = [], None
+            for run in runs:
+                for attr in list(run.attrib):
+                    if 'rsidR' in attr:
+                        del run.attrib[attr]
+                rpr = run.find('w:rPr', namespaces)
+                if rpr is not None:
+                    for lang_tag in rpr.findall('w:lang', namespaces):
+                        rpr.remove(lang_tag)
+                    if len(rpr) == 0:
+                        run.remove(rpr)
+                        rpr = None
+                for t in run.findall('w:t', namespaces):
+                    t.attrib.pop(_XML_SPACE, None)
+                t_elem = run.find('w:t', namespaces)
+                text = t_elem.text if t_elem is not None else ''
+                if current_run is None:
+                    current_run = ET.fromstring(ET.tostring(run))
+                    continue
+                current_rpr = current_run.find('w:rPr', namespaces)
+                same = rpr is None and current_rpr is None or (
+                    rpr is not None and current_rpr is not None and ET.tostring(rpr) == ET.tostring(current_rpr)
+                )
+                if same:
+                    current_text_elem = current_run.find('w:t', namespaces)
+                    if current_text_elem is not None:
+                        current_text_elem.text = (current_text_elem.text or '') + text
+                    else:
+                        ET.SubElement(current_run, _W_T).text = text
+                else:
+                    new_runs.append(current_run)
+                    current_run = ET.fromstring(ET.tostring(run))
+            if current_run is not None:
+                new_runs.append(current_run)
+            for run in runs:
+                para.remove(run)
+            for run in new_runs:
+                para.append(run)
+
+    # Đếm số lần parse/serialize qua lxml (cả cây lẫn từng phần tử)
+    counts = {"parse": 0, "serialize": 0}
+    original_parse, original_fromstring, original_tostring = ET.parse, ET.fromstring, ET.tostring
+
+    def counted(kind, func):
+        def wrapper(*a, **kw):
+            counts[kind] += 1
+            return func(*a, **kw)
+        return wrapper
+
+    ET.parse = counted("parse", original_parse)
+    ET.fromstring = counted("parse", original_fromstring)
+    ET.tostring = counted("serialize", original_tostring)
+
+    def before(package):
+        """Luồng cũ: parse, chuẩn hóa, ghi ra file, parse lại rồi mới gom text"""
+        texts = 0
+        with tempfile.TemporaryDirectory() as work_dir:
+            for name in package.namelist():
+                if not name.endswith(".xml"):
+                    continue
+                path = os.path.join(work_dir, name.replace("/", "_"))
+                with open(path, "wb") as f:
+                    f.write(package.read(name))
+                tree = ET.parse(path, ET.XMLParser(remove_blank_text=True))
+                legacy_clean_and_merge_runs(tree.getroot())
+                with open(path, "wb") as f:
+                    f.write(ET.tostring(tree, pretty_print=True, xml_declaration=True, encoding="UTF-8"))
+                tree = ET.parse(path, ET.XMLParser(remove_blank_text=True))
+                texts += sum(1 for e in tree.getroot().iter() if isinstance(e.tag, str) and e.tag.endswith("}t") and e.text and e.text.strip())
+        return texts
+
+    def after(package):
+        """Luồng mới: một lần parse, chuẩn hóa + gom text trong cùng một lần duyệt"""
+        texts = []
+        for name in package.namelist():
+            if name.endswith(".xml"):
+                clean_and_merge_runs_in_tree(parse_part(package, name).getroot(), texts.append)
+        return len(texts)
+
+    with tempfile.TemporaryDirectory() as sample_dir:
+        path = args.file
+        if path is None:
+            path = os.path.join(sample_dir, "sample.docx")
+            build_sample_docx(path, args.pages)
+        print(f"{path}: {os.path.getsize(path) / 1e6:.1f} MB")
+
+        with zipfile.ZipFile(path) as package:
+            for label, run_flow in (("before (clean + write + reparse)", before), ("after (single pass)", after)):
+                counts.update(parse=0, serialize=0)
+                started = time.perf_counter()
+                segments = run_flow(package)
+                elapsed = time.perf_counter() - started
+                print(
+                    f"  {label:34s} {elapsed:.2f}s, {segments} segment, "
+                    f"{counts['parse']} parse, {counts['serialize']} serialize"
+                )
@@ -2,6 +2,7 @@ from pdf2docx import Converter
 from .translate_docx import translate_docx
 from docx2pdf import convert
 from .detect_lang import LANGUAGES
+from .workspace import derived_path
 import os
 # Đường dẫn tới file PDF nguồn và file DOCX đích
 
@@ -15,7 +16,7 @@ def pdf_to_docx(pdf_file, docx_file):
     
 def docx_to_pdf(docx_file):
     # Chuyển đổi DOCX sang PDF
-    pdf_output = docx_file.replace(".docx", ".pdf")
+    pdf_output = derived_path(docx_file, ".pdf")
     convert(docx_file, pdf_output)
     return pdf_output
 
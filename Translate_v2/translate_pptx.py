@@ -1,12 +1,29 @@
 from lxml import etree
-import os
-import time
-import html
-import shutil
-from fastapi import HTTPException
-from .detect_lang import detect_language, extract_content, LANGUAGES, language_pair
-from .translate_text import translate_text_with_glossary
-from .xml_process import copy_and_extract, compress_folder
+from .detect_lang import detect_file_language, LANGUAGES
+from .multi_target import translate_package
+from .paragraph_segmenter import add_text_elems
+from .segment_collector import SegmentCollector
+from .xml_process import FolderPackage, parse_part, select_related_parts, write_xml_parts
+from .settings import PPTX_INCLUDE_LAYOUTS
+
+# Part có text cần dịch: slide, ghi chú, chart, SmartArt (đi theo quan hệ từ presentation.xml)
+PPTX_TEXT_CONTENT_TYPES = {
+    "application/vnd.openxmlformats-officedocument.presentationml.presentation.main+xml",
+    "application/vnd.openxmlformats-officedocument.presentationml.slideshow.main+xml",
+    "application/vnd.openxmlformats-officedocument.presentationml.template.main+xml",
+    "application/vnd.ms-powerpoint.presentation.macroEnabled.main+xml",
+    "application/vnd.ms-powerpoint.slideshow.macroEnabled.main+xml",
+    "application/vnd.ms-powerpoint.template.macroEnabled.main+xml",
+    "application/vnd.openxmlformats-officedocument.presentationml.slide+xml",
+    "application/vnd.openxmlformats-officedocument.presentationml.notesSlide+xml",
+    "application/vnd.openxmlformats-officedocument.drawingml.chart+xml",
+    "application/vnd.openxmlformats-officedocument.drawingml.diagramData+xml",
+    "application/vnd.ms-office.drawingml.diagramDrawing+xml",
+}
+PPTX_LAYOUT_CONTENT_TYPES = {
+    "application/vnd.openxmlformats-officedocument.presentationml.slideLayout+xml",
+    "application/vnd.openxmlformats-officedocument.presentationml.slideMaster+xml",
+}
 def rpr_format_key(r_elem):
     """
     Sinh ra key định danh format của <a:rPr> trong <a:r>.
@@ -120,118 +137,81 @@ def set_font_ariel_for_vietnamese(elem, slide_idx=0, is_first_text=False):
         else:
             sz = "1000"  # 10pt cho còn lại
         rpr.set("sz", sz)
-def translate_all_xml_in_folder(folder_path, glossary_id, source_lang, target_lang):
-    for root_dir, dirs, files in os.walk(folder_path):
-        for file in files:
-            if not file.endswith(".xml"):
-                continue
-
-            xml_file_path = os.path.join(root_dir, file)
-
-            # Chỉ xử lý slide chính
-            rel_path = os.path.relpath(xml_file_path, folder_path).replace("\\", "/")
-            if not (rel_path.startswith("ppt/slides/slide") and rel_path.endswith(".xml")):
-                continue
-
-            print(f"🔵 Đang xử lý file XML: {xml_file_path}")
-
-            try:
-                parser = etree.XMLParser(remove_blank_text=True)
-                tree = etree.parse(xml_file_path, parser)
-                root = tree.getroot()
-
-                # 🔧 Ghép đoạn trước khi dịch
-                merge_all_paragraphs(root)
-
-                # Bắt đầu dịch từng đoạn văn bản
-                for elem in root.iter():
-                    if elem.tag.endswith("}t") and elem.text and elem.text.strip():
-                        original_text = elem.text.strip()
-                        try:
-                            translated_text = translate_text_with_glossary(
-                                original_text, glossary_id, source_lang, target_lang
-                            )
-                            if translated_text:
-                                elem.text = html.unescape(translated_text)
-                                if target_lang == "vi" or target_lang == "en":
-                                    set_font_ariel_for_vietnamese(elem)
-                        except Exception as e:
-                            print(f"⚠️ Lỗi khi dịch đoạn text: {original_text} — {e}")
-
-                # Ghi lại file XML
-                tree.write(xml_file_path, pretty_print=True, xml_declaration=True, encoding="UTF-8")
-                print(f"✅ Đã lưu file dịch: {xml_file_path}")
-
-            except Exception as e:
-                print(f"❌ Không thể xử lý file {xml_file_path} — {e}")
-
-
-def translate_xlsx(xlsx_file):
-    start = time.time()
-    extracted_folder = copy_and_extract(xlsx_file)
-
-    source_lang = detect_language(extract_content(xlsx_file))
-    if source_lang not in LANGUAGES:
-        raise HTTPException(status_code=400, detail=f"Unsupported source language: {source_lang}")
-    print(f"Detected language: {LANGUAGES[source_lang]}")
-    target_langs = [lang for lang in LANGUAGES.keys() if lang != source_lang]
-    for target_lang in target_langs:
-        extracted_folder_temp = f"{extracted_folder}_{target_lang}"
-        if os.path.exists(extracted_folder_temp):
-            shutil.rmtree(extracted_folder_temp)
-        extracted_folder_temp = shutil.copytree(extracted_folder, f"{extracted_folder}_{target_lang}")
-
-        pair_code = f"{source_lang}-{target_lang}" if f"{source_lang}-{target_lang}" in language_pair.keys() else f"{target_lang}-{source_lang}"
-
-        if pair_code not in language_pair:
-            raise HTTPException(status_code=400, detail=f"Unsupported language pair: {pair_code}")
-        
-        glossary_id = f"toray_translation_glossary_{language_pair[pair_code]}"
-        translate_all_xml_in_folder(extracted_folder_temp, glossary_id, source_lang, target_lang)
-        output_xlsx = xlsx_file.replace(".pptx", f"_{target_lang}.pptx")
-        compress_folder(extracted_folder_temp, xlsx_file, output_xlsx)
-
-        # Xóa thư mục tạm extracted_folder_temp
-        shutil.rmtree(extracted_folder_temp, ignore_errors=True)
-    # Xóa thư mục tạm extracted_folder
-    shutil.rmtree(extracted_folder, ignore_errors=True)
-
-    # Xóa file zip tạm
-    zip_path = xlsx_file.replace(".pptx", "_copy.zip")
-    if os.path.exists(zip_path):
-        os.remove(zip_path)
-    end = time.time()
-    print("Total time: ", end - start)
-        
-        
-def translate_pptx(file_path, target_lang):
-    extracted_folder = copy_and_extract(file_path)
-
-    source_lang = detect_language(extract_content(file_path))
-    if source_lang == target_lang:
-        raise ValueError("Source and target languages must be different.")
-
-    pair_code = f"{source_lang}-{target_lang}" if f"{source_lang}-{target_lang}" in language_pair else f"{target_lang}-{source_lang}"
-    if pair_code not in language_pair:
-        raise ValueError(f"Unsupported language pair: {pair_code}")
-
-    glossary_id = f"toray_translation_glossary_{language_pair[pair_code]}"
-
-    extracted_folder_temp = f"{extracted_folder}_{target_lang}"
-    if os.path.exists(extracted_folder_temp):
-        shutil.rmtree(extracted_folder_temp)
-    shutil.copytree(extracted_folder, extracted_folder_temp)
-
-    translate_all_xml_in_folder(extracted_folder_temp, glossary_id, source_lang, target_lang)
-
-    output_path = file_path.replace(".pptx", f"_{target_lang}.pptx")
-    compress_folder(extracted_folder_temp, file_path, output_path)
-
-    shutil.rmtree(extracted_folder_temp, ignore_errors=True)
-    shutil.rmtree(extracted_folder, ignore_errors=True)
-
-    zip_path = file_path.replace(".pptx", "_copy.zip")
-    if os.path.exists(zip_path):
-        os.remove(zip_path)
-
-    return output_path
+def select_parts(package, include_layouts=None):
+    """
+    Slide, ghi chú (notesSlide), chart và dữ liệu SmartArt, chọn theo [Content_Types].xml và các file .rels.
+    include_layouts (mặc định PPTX_INCLUDE_LAYOUTS): thêm slide layout / slide master.
+    """
+    include_layouts = PPTX_INCLUDE_LAYOUTS if include_layouts is None else include_layouts
+    content_types = PPTX_TEXT_CONTENT_TYPES | (PPTX_LAYOUT_CONTENT_TYPES if include_layouts else set())
+    return select_related_parts(package, content_types)
+
+def load_part(package, name):
+    """Parse một part và ghép run cùng định dạng; trả về None nếu part không có text hoặc không xử lý được"""
+    print(f"🔵 Đang xử lý file XML: {name}")
+
+    try:
+        tree = parse_part(package, name)
+        # Part không có text (presentation.xml...) được giữ nguyên byte-for-byte
+        if not any(elem.text and elem.text.strip() for elem in tree.getroot().iter("{*}t")):
+            return None
+
+        # 🔧 Ghép đoạn trước khi dịch
+        merge_all_paragraphs(tree.getroot())
+        return tree
+
+    except Exception as e:
+        print(f"❌ Không thể xử lý file {name} — {e}")
+        return None
+
+def load_parts(package, include_layouts=None):
+    """
+    Parse các part có text (slide, ghi chú, chart, SmartArt) và ghép run cùng định dạng.
+    package là zipfile.ZipFile hoặc FolderPackage; trả về [(tên part, tree)].
+    """
+    parsed_parts = []
+    for name in select_parts(package, include_layouts):
+        tree = load_part(package, name)
+        if tree is not None:
+            parsed_parts.append((name, tree))
+    return parsed_parts
+
+def collect_segments(parsed_parts, collector, target_lang):
+    """Đăng ký text node của mọi part (slide, ghi chú, chart, SmartArt); bản dịch tiếng Việt/Anh được đặt font Arial"""
+    on_translated = set_font_ariel_for_vietnamese if target_lang in ("vi", "en") else None
+    for rel_path, tree in parsed_parts:
+        elems = [elem for elem in tree.getroot().iter("{*}t") if elem.text and elem.text.strip()]
+        add_text_elems(collector, elems, on_translated)
+
+def translate_all_xml_in_folder(folder_path, glossary_id, source_lang, target_lang, include_layouts=None):
+    # Bước 1: gom toàn bộ text node của slide, ghi chú, chart, SmartArt (và layout/master nếu bật)
+    parsed_parts = load_parts(FolderPackage(folder_path), include_layouts)
+    collector = SegmentCollector()
+    collect_segments(parsed_parts, collector, target_lang)
+
+    # Bước 2: dịch mỗi chuỗi duy nhất một lần cho cả bản trình chiếu
+    collector.translate(glossary_id, source_lang, target_lang)
+
+    # Bước 3: ghi lại các file XML
+    write_xml_parts(parsed_parts, folder_path)
+
+def translate_pptx(file_path, target_lang=None, source_lang=None, include_layouts=None):
+    """
+    Dịch file PPTX sang target_lang, trả về đường dẫn file đã dịch.
+    Nếu target_lang là list hoặc None (mọi ngôn ngữ khác ngôn ngữ nguồn): giải nén và parse một lần
+    cho mọi ngôn ngữ đích, trả về dict ngôn ngữ đích -> đường dẫn file đã dịch.
+    include_layouts: dịch cả slide layout / slide master (mặc định PPTX_INCLUDE_LAYOUTS).
+    """
+    def select(package):
+        return select_parts(package, include_layouts)
+
+    if isinstance(target_lang, str):
+        source_lang = source_lang or detect_file_language(file_path)
+        if source_lang == target_lang:
+            raise ValueError("Source and target languages must be different.")
+        output = translate_package(file_path, [target_lang], source_lang, select, load_part, collect_segments)[target_lang]
+        if isinstance(output, Exception):
+            raise output
+        return output
+    target_langs = list(target_lang or LANGUAGES.keys())
+    return translate_package(file_path, target_langs, source_lang, select, load_part, collect_segments)
@@ -1,35 +1,378 @@
+import logging
 import os
-from google.cloud import translate_v3 as translate
+import re
+import time
 from dotenv import load_dotenv
+from .translation_backend import get_backend
+from .translation_memory import get_translation_memory
+from .concurrent_executor import get_executor
+from .adaptive_concurrency import get_controller
+from .term_protection import get_term_protector, restore_terms
+from . import segment_packer
 load_dotenv()
 project_id = os.getenv("PROJECT_ID")
 google_credentials_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
-os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = google_credentials_path
+if google_credentials_path is not None:
+    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = google_credentials_path
+
+# Thống kê theo từng lần gọi (TM, packing, concurrency...) ở mức DEBUG, không in ra stdout
+logger = logging.getLogger(__name__)
+
+# Giới hạn của Cloud Translation API cho mỗi request translate_text
+MAX_SEGMENTS_PER_REQUEST = 1024
+MAX_CODEPOINTS_PER_REQUEST = 30000
+# Số lần thử lại cho mỗi sub-batch bị lỗi
+MAX_BATCH_RETRIES = 3
+RETRY_BACKOFF_SECONDS = 1.0
+
 def translate_text_with_glossary(
     text: str,
     glossary_id: str,
     source_lang_code: str,
     target_lang_code: str,
 ) -> str:
-    client = translate.TranslationServiceClient()
-    location = "us-central1"
-    parent = f"projects/{project_id}/locations/{location}"
+    # Dùng chung pipeline với bản dịch theo batch (term protection, translation memory, retry)
+    return translate_batch_with_glossary([text], glossary_id, source_lang_code, target_lang_code)[0]
+
+def split_into_batches(texts, max_segments=MAX_SEGMENTS_PER_REQUEST, max_codepoints=MAX_CODEPOINTS_PER_REQUEST):
+    """
+    Chia danh sách segment thành các sub-batch theo giới hạn số segment và số codepoint.
+    Trả về list các list chỉ số (index) trong `texts`, giữ nguyên thứ tự đầu vào.
+    Segment dài hơn max_codepoints cần được tách trước (split_long_segment), nếu không sẽ nằm riêng một batch.
+    """
+    batches = []
+    current = []
+    current_size = 0
+    for index, text in enumerate(texts):
+        size = len(text)
+        if current and (len(current) >= max_segments or current_size + size > max_codepoints):
+            batches.append(current)
+            current = []
+            current_size = 0
+        current.append(index)
+        current_size += size
+    if current:
+        batches.append(current)
+    return batches
+
+# Ranh giới câu: sau dấu kết thúc câu (kể cả dấu toàn góc) hoặc xuống dòng, kèm khoảng trắng theo sau
+_SENTENCE_END_CHARS = ("。", "．", "！", "？", "!", "?", ".")
+_SENTENCE_END_RE = re.compile(r"(?<=[。．！？!?.\n])\s*")
+_HTML_TOKEN_RE = re.compile(r"(<[^>]+>)")
+_HTML_TAG_NAME_RE = re.compile(r"</?([A-Za-z][A-Za-z0-9]*)")
+_HTML_VOID_TAGS = {"br", "hr", "img", "wbr", "input", "meta", "link"}
+# Ngôn ngữ viết liền không cần khoảng trắng giữa các câu khi ghép bản dịch
+_NO_SPACE_LANGS = ("ja", "zh", "zh-CN", "zh-TW", "ko")
+
+def _sentence_pieces(text):
+    """Tách text thành [(câu, khoảng trắng theo sau)]"""
+    pieces = []
+    start = 0
+    for match in _SENTENCE_END_RE.finditer(text):
+        if match.start() == start or match.start() == len(text):
+            continue
+        pieces.append((text[start:match.start()], match.group(0)))
+        start = match.end()
+    if start < len(text):
+        pieces.append((text[start:], ""))
+    return pieces
+
+def _html_pieces(text):
+    """
+    Tách HTML thành các đoạn chỉ tại vị trí ngoài mọi thẻ (độ sâu 0): giữa các phần tử gốc
+    hoặc tại ranh giới câu trong text gốc. Trả về [(đoạn, khoảng trắng theo sau)].
+    """
+    pieces = []
+    current = ""
+    depth = 0
+    for i, token in enumerate(_HTML_TOKEN_RE.split(text)):
+        if i % 2:
+            if depth == 0 and current:
+                # Text gốc đứng trước thẻ là một đoạn riêng
+                pieces.append((current, ""))
+                current = ""
+            current += token
+            name = _HTML_TAG_NAME_RE.match(token)
+            if token.startswith("</"):
+                depth -= 1
+            elif name and not token.endswith("/>") and name.group(1).lower() not in _HTML_VOID_TAGS:
+                depth += 1
+            if depth == 0:
+                pieces.append((current, ""))
+                current = ""
+        elif depth == 0:
+            sentences = _sentence_pieces(current + token)
+            current = ""
+            if sentences:
+                pieces.extend(sentences[:-1])
+                current, tail = sentences[-1]
+                if tail:
+                    pieces.append((current, tail))
+                    current = ""
+        else:
+            current += token
+    if current:
+        pieces.append((current, ""))
+    return pieces
+
+def split_long_segment(text, max_codepoints=MAX_CODEPOINTS_PER_REQUEST, mime_type="text/plain"):
+    """
+    Tách segment dài hơn max_codepoints thành các đoạn vừa một request, ưu tiên ranh giới câu
+    (các câu liền nhau được gộp lại tới sát giới hạn). Trả về [(đoạn, khoảng trắng theo sau)].
+    Text thường: câu vẫn quá dài được cắt tại khoảng trắng, không có thì cắt cứng.
+    HTML: chỉ tách ngoài thẻ; không tách được thì báo lỗi ngay (ValueError) thay vì gửi request chắc chắn lỗi.
+    """
+    if len(text) <= max_codepoints:
+        return [(text, "")]
+    pieces = _html_pieces(text) if mime_type == "text/html" else _sentence_pieces(text)
+
+    chunks = []
+    for piece, separator in pieces:
+        while len(piece) > max_codepoints:
+            if mime_type == "text/html":
+                raise ValueError(
+                    f"Segment HTML dài {len(text)} ký tự vượt giới hạn {max_codepoints} ký tự/request "
+                    f"và không tách được theo câu ngoài thẻ"
+                )
+            cut = piece.rfind(" ", 0, max_codepoints + 1)
+            cut = cut if cut > 0 else max_codepoints
+            rest = piece[cut:].lstrip(" ")
+            chunks.append((piece[:cut], piece[cut:len(piece) - len(rest)]))
+            piece = rest
+        if chunks and len(chunks[-1][0]) + len(chunks[-1][1]) + len(piece) <= max_codepoints:
+            previous, previous_separator = chunks[-1]
+            chunks[-1] = (previous + previous_separator + piece, separator)
+        else:
+            chunks.append((piece, separator))
+    return chunks
+
+def translate_batch_with_glossary(
+    texts: list,
+    glossary_id: str,
+    source_lang_code: str,
+    target_lang_code: str,
+    mime_type: str = "text/plain",
+) -> list:
+    """
+    Dịch một danh sách segment, gom thành ít request nhất có thể.
+    Thuật ngữ đã duyệt được giữ nguyên bản dịch chuẩn (segment chỉ gồm thuật ngữ không cần gọi API),
+    segment đã có trong translation memory không được gửi lên API.
+    mime_type="text/html": segment là HTML (đã escape), bản dịch trả về giữ nguyên các thẻ.
+    Kết quả trả về theo đúng thứ tự đầu vào; sub-batch lỗi được thử lại riêng,
+    nếu vẫn lỗi thì các segment của nó nhận chuỗi rỗng.
+    """
+    if not texts:
+        return []
+
+    results = [""] * len(texts)
+    protector = get_term_protector()
+    # mime type -> (vị trí trong texts, nội dung gửi đi)
+    groups = {}
+    local_segments = 0
+    protected_segments = 0
+    for i, text in enumerate(texts):
+        if protector is None:
+            protected = None
+        elif mime_type == "text/html":
+            protected = protector.protect_html(text, source_lang_code, target_lang_code)
+        else:
+            protected = protector.protect(text, source_lang_code, target_lang_code)
+        if protected is None:
+            request_mime_type, request_text = mime_type, text
+        elif protected.local_translation is not None:
+            results[i] = protected.local_translation
+            local_segments += 1
+            continue
+        else:
+            request_mime_type, request_text = "text/html", protected.request_text
+            protected_segments += 1
+        indices, request_texts = groups.setdefault(request_mime_type, ([], []))
+        indices.append(i)
+        request_texts.append(request_text)
+
+    if protector is not None and (local_segments or protected_segments):
+        logger.debug(
+            "🛡️ Term protection: %d segment có thuật ngữ, %d segment dịch tại chỗ", protected_segments, local_segments
+        )
 
-    glossary = client.glossary_path(
-        project_id, location, glossary_id
+    for request_mime_type, (indices, request_texts) in groups.items():
+        translations = _translate_with_memory(
+            request_texts, glossary_id, source_lang_code, target_lang_code, request_mime_type
+        )
+        for i, translated_text in zip(indices, translations):
+            results[i] = restore_terms(translated_text) if request_mime_type == "text/html" else translated_text
+    return results
+
+def _translate_with_memory(texts, glossary_id, source_lang_code, target_lang_code, mime_type):
+    memory = get_translation_memory()
+    if memory is None:
+        return _translate_uncached(texts, glossary_id, source_lang_code, target_lang_code, mime_type)
+
+    results = memory.lookup(texts, glossary_id, source_lang_code, target_lang_code, mime_type)
+    missing = [i for i, value in enumerate(results) if value is None]
+    if missing:
+        missing_texts = [texts[i] for i in missing]
+        translations = _translate_uncached(
+            missing_texts, glossary_id, source_lang_code, target_lang_code, mime_type
+        )
+        memory.store_translations(
+            missing_texts, translations, glossary_id, source_lang_code, target_lang_code, mime_type
+        )
+        for i, translated_text in zip(missing, translations):
+            results[i] = translated_text
+
+    if logger.isEnabledFor(logging.DEBUG):
+        stats = memory.get_stats()
+        logger.debug(
+            "📚 Translation memory: %d/%d segment có sẵn (tổng hit %d, fuzzy %d, miss %d)",
+            len(texts) - len(missing), len(texts), stats["hits"], stats["fuzzy_hits"], stats["misses"],
+        )
+    return results
+
+def _translate_uncached(texts, glossary_id, source_lang_code, target_lang_code, mime_type):
+    """
+    Gộp các segment ngắn thành ít content hơn (ngăn cách bằng marker) trước khi gửi API.
+    Pack bị mất/lệch marker trong bản dịch được dịch lại từng segment.
+    """
+    if not segment_packer.PACKING_ENABLED or len(texts) < 2:
+        return _translate_batch_uncached(texts, glossary_id, source_lang_code, target_lang_code, mime_type)
+    packs, singles = segment_packer.plan_packs(texts)
+    if not packs:
+        return _translate_batch_uncached(texts, glossary_id, source_lang_code, target_lang_code, mime_type)
+
+    results = [""] * len(texts)
+    packed_texts = [segment_packer.build_packed_text([texts[i] for i in pack], mime_type) for pack in packs]
+    # Content đã gộp (HTML) và segment dài được gửi cùng một lượt qua executor dùng chung (AIMD giới hạn đồng thời)
+    packed_translations, single_translations = _translate_groups_uncached(
+        [(packed_texts, "text/html"), ([texts[i] for i in singles], mime_type)],
+        glossary_id, source_lang_code, target_lang_code,
     )
+    for i, translated_text in zip(singles, single_translations):
+        results[i] = translated_text
 
-    glossary_config = translate.TranslateTextGlossaryConfig(glossary=glossary)
+    fallback = []
+    for pack, translated_text in zip(packs, packed_translations):
+        pieces = segment_packer.unpack_translation(translated_text, [texts[i] for i in pack], mime_type)
+        if pieces is None:
+            fallback.extend(pack)
+            continue
+        for i, piece in zip(pack, pieces):
+            results[i] = piece
 
-    response = client.translate_text(
-        request={
-            "contents": [text],
-            "target_language_code": target_lang_code,
-            "source_language_code": source_lang_code,
-            "parent": parent,
-            "glossary_config": glossary_config,
-        }
+    logger.debug(
+        "📦 Packing: %d segment ngắn gộp thành %d content, %d segment phải dịch lại từng cái",
+        sum(len(pack) for pack in packs), len(packs), len(fallback),
     )
+    if fallback:
+        translations = _translate_batch_uncached(
+            [texts[i] for i in fallback], glossary_id, source_lang_code, target_lang_code, mime_type
+        )
+        for i, translated_text in zip(fallback, translations):
+            results[i] = translated_text
+    return results
+
+def _translate_batch_uncached(texts, glossary_id, source_lang_code, target_lang_code, mime_type="text/plain"):
+    return _translate_groups_uncached([(texts, mime_type)], glossary_id, source_lang_code, target_lang_code)[0]
+
+def _translate_groups_uncached(groups, glossary_id, source_lang_code, target_lang_code):
+    """
+    Dịch nhiều nhóm segment (texts, mime type) trong cùng một lượt: sub-batch của mọi nhóm được gửi song song
+    qua ConcurrentExecutor dùng chung. Trả về list kết quả theo thứ tự các nhóm.
+    Segment vượt giới hạn codepoint của một request được tách theo câu, dịch từng đoạn rồi ghép lại.
+    """
+    split_groups = [[_split_or_whole(text, mime_type) for text in texts] for texts, mime_type in groups]
+    if all(len(chunks) == 1 for group in split_groups for chunks in group):
+        return _dispatch_groups(groups, glossary_id, source_lang_code, target_lang_code)
+
+    long_segments = sum(len(chunks) > 1 for group in split_groups for chunks in group)
+    logger.debug("✂️ Tách %d segment dài hơn %d ký tự theo câu", long_segments, MAX_CODEPOINTS_PER_REQUEST)
+    flat_groups = [
+        ([piece for chunks in group for piece, _ in chunks], mime_type)
+        for group, (_, mime_type) in zip(split_groups, groups)
+    ]
+    flat_results = _dispatch_groups(flat_groups, glossary_id, source_lang_code, target_lang_code)
+    joiner = "" if target_lang_code in _NO_SPACE_LANGS else " "
+    results = []
+    for group, translations in zip(split_groups, flat_results):
+        translations = iter(translations)
+        group_results = []
+        for chunks in group:
+            if len(chunks) == 1:
+                group_results.append(next(translations))
+                continue
+            parts = []
+            for index, (piece, separator) in enumerate(chunks):
+                parts.append(next(translations).strip())
+                # Giữ khoảng trắng gốc giữa các câu; câu viết liền (。) thì thêm khoảng trắng nếu ngôn ngữ đích cần
+                if not separator and index + 1 < len(chunks) and piece.endswith(_SENTENCE_END_CHARS):
+                    separator = joiner
+                parts.append(separator)
+            group_results.append("".join(parts))
+        results.append(group_results)
+    return results
+
+def _split_or_whole(text, mime_type):
+    """Tách segment dài; không tách được (ví dụ một phần tử HTML dài hơn giới hạn) thì gửi nguyên segment"""
+    try:
+        return split_long_segment(text, MAX_CODEPOINTS_PER_REQUEST, mime_type)
+    except ValueError as e:
+        logger.warning("⚠️ Không tách được segment %d ký tự, gửi nguyên segment — %s", len(text), e)
+        return [(text, "")]
+
+def _dispatch_groups(groups, glossary_id, source_lang_code, target_lang_code):
+    """Gửi sub-batch của mọi nhóm qua executor dùng chung, sub-batch lỗi được thử lại riêng"""
+    results = [[""] * len(texts) for texts, _ in groups]
+
+    backend = get_backend()
+    executor = get_executor()
+    controller = get_controller()
+    # Mỗi sub-batch: (chỉ số nhóm, list chỉ số segment trong nhóm)
+    pending = [
+        (group, batch)
+        for group, (texts, _) in enumerate(groups)
+        for batch in split_into_batches(texts)
+    ]
+    if not pending:
+        return results
+
+    def batch_texts(item):
+        group, batch = item
+        return [groups[group][0][i] for i in batch]
+
+    def translate_sub_batch(item):
+        contents = batch_texts(item)
+        # AIMD giới hạn số request đồng thời theo tình trạng quota thực tế
+        with controller.slot(sum(len(text) for text in contents)):
+            return backend.translate_batch(
+                contents, glossary_id, source_lang_code, target_lang_code, groups[item[0]][1]
+            )
+
+    for attempt in range(MAX_BATCH_RETRIES):
+        failed = []
+        # Các sub-batch được gửi song song, kết quả nhận lại theo thứ tự
+        outcomes = executor.map_ordered(
+            translate_sub_batch, pending, [sum(map(len, batch_texts(item))) for item in pending]
+        )
+        for (group, batch), (translations, error) in zip(pending, outcomes):
+            if error is not None:
+                logger.warning("⚠️ Lỗi khi dịch batch %d segment (lần %d) — %s", len(batch), attempt + 1, error)
+                failed.append((group, batch))
+                continue
+            for i, translated_text in zip(batch, translations):
+                results[group][i] = translated_text
+
+        if not failed:
+            break
+        pending = failed
+        if attempt + 1 < MAX_BATCH_RETRIES:
+            time.sleep(RETRY_BACKOFF_SECONDS * (2 ** attempt))
+    else:
+        logger.error("❌ Bỏ qua %d segment sau %d lần thử", sum(len(batch) for _, batch in pending), MAX_BATCH_RETRIES)
 
-    translations = [translation.translated_text for translation in response.glossary_translations]
-    return translations[0] if translations else ""
\ No newline at end of file
+    if logger.isEnabledFor(logging.DEBUG):
+        snapshot = controller.snapshot()
+        logger.debug(
+            "📈 Concurrency: window=%s, throughput=%s ký tự/s, 429=%s",
+            snapshot["window"], snapshot["characters_per_second"], snapshot["overloads"],
+        )
+    return results
@@ -1,125 +1,225 @@
 from lxml import etree
-import os
+import re
 import time
 import html
-import shutil
-from fastapi import HTTPException
-from .detect_lang import detect_language, extract_content, LANGUAGES, language_pair
-from .translate_text import translate_text_with_glossary
-from .xml_process import copy_and_extract, compress_folder
+from .detect_lang import LANGUAGES
+from .multi_target import translate_package
+from .segment_collector import SegmentCollector
+from .translation_memory import LRUCache
+from .xml_process import FolderPackage, parse_part, part_contains, serialize_part, write_xml_parts
+from .xml_stream import STREAM_PART_MIN_BYTES, stream_records
+
+SPREADSHEET_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_ROW = f"{{{SPREADSHEET_NS}}}row"
+_CELL = f"{{{SPREADSHEET_NS}}}c"
+_SI = f"{{{SPREADSHEET_NS}}}si"
+_T = f"{{{SPREADSHEET_NS}}}t"
+_RPH = f"{{{SPREADSHEET_NS}}}rPh"
+# Text trong drawing (hình, text box) dùng namespace DrawingML
+_DRAWING_T = "{http://schemas.openxmlformats.org/drawingml/2006/main}t"
+# Dung lượng tối đa (byte) của cache LRU các chuỗi inline đã dịch trong một worksheet (dùng lại giữa các batch)
+_INLINE_CACHE_BYTES = 64 * 1024 * 1024
+
+# Excel: tên sheet tối đa 31 ký tự, không chứa []:*?/\, không bắt đầu/kết thúc bằng dấu nháy, không trùng nhau
+SHEET_NAME_MAX_LENGTH = 31
+_INVALID_SHEET_CHARS_RE = re.compile(r"[\[\]:*?/\\]")
+
+def sanitize_sheet_name(name, used_names):
+    """Chuẩn hóa tên sheet đã dịch thành tên hợp lệ, không trùng với used_names (so sánh không phân biệt hoa thường)"""
+    cleaned = " ".join(_INVALID_SHEET_CHARS_RE.sub(" ", name).split()).strip("'").strip()
+    cleaned = cleaned[:SHEET_NAME_MAX_LENGTH].rstrip("' ") or "Sheet"
+    candidate = cleaned
+    index = 2
+    while candidate.lower() in used_names:
+        suffix = f" ({index})"
+        candidate = cleaned[:SHEET_NAME_MAX_LENGTH - len(suffix)].rstrip("' ") + suffix
+        index += 1
+    used_names.add(candidate.lower())
+    return candidate
+
+def is_worksheet(name):
+    return name.startswith("xl/worksheets/sheet") and name.endswith(".xml")
+
+def select_parts(package):
+    """
+    Các part chứa text (shared strings, tên sheet, drawing, styles) và các worksheet có ô inline string
+    (t="inlineStr"); worksheet chỉ chứa số, công thức, ngày hoặc ô shared string được giữ nguyên.
+    """
+    selected = []
+    for name in package.namelist():
+        # 🔍 Chỉ xử lý các file cần thiết
+        if (
+            name == "xl/sharedStrings.xml"
+            or name == "xl/workbook.xml"
+            or (name.startswith("xl/drawings/drawing") and name.endswith(".xml"))  # Thêm xử lý cho drawing*.xml
+            or name == "xl/styles.xml"
+            or (is_worksheet(name) and part_contains(package, name, b'"inlineStr"'))
+        ):
+            selected.append(name)
+    return selected
+
+def should_stream(name, file_size):
+    """Worksheet luôn được đọc theo streaming (từng <row>), các part khác khi vượt ngưỡng kích thước"""
+    return is_worksheet(name) or file_size >= STREAM_PART_MIN_BYTES
+
+def string_text_elems(record):
+    """
+    Các <t> có nội dung trong record (<si> / <is>) hoặc cả part (kể cả <a:t> của drawing),
+    bỏ qua phiên âm furigana trong <rPh>
+    """
+    return [
+        elem for elem in record.iter(_T, _DRAWING_T)
+        if elem.text and elem.text.strip() and elem.getparent().tag != _RPH
+    ]
+
+def load_part(package, name):
+    """Parse một part; trả về None nếu không đọc được"""
+    print(f"🔵 Đang xử lý file XML: {name}")
+
+    try:
+        # Đọc file XML bằng lxml
+        return parse_part(package, name)
+    except Exception as e:
+        print(f"❌ Không thể xử lý file {name} — {e}")
+        return None
+
+def load_parts(package):
+    """
+    Parse các part chứa text (shared strings, tên sheet, drawing, styles).
+    package là zipfile.ZipFile hoặc FolderPackage; trả về [(tên part, tree)].
+    """
+    parsed_parts = []
+    for name in select_parts(package):
+        tree = load_part(package, name)
+        if tree is not None:
+            parsed_parts.append((name, tree))
+    return parsed_parts
+
+def collect_segments(parsed_parts, collector, target_lang):
+    """Đăng ký text node và tên sheet; bản dịch tiếng Việt/Anh dùng font Times New Roman"""
+    for rel_path, tree in parsed_parts:
+        root = tree.getroot()
+        if rel_path == "xl/styles.xml" and target_lang in ("en", "vi"):
+            ns = {"a": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+
+            # Sửa font trong <fonts>
+            fonts_elem = root.find(".//a:fonts", namespaces=ns)
+            if fonts_elem is not None:
+                for font in fonts_elem.findall("a:font", namespaces=ns):
+                    name_elem = font.find("a:name", namespaces=ns)
+                    if name_elem is not None and "val" in name_elem.attrib:
+                        name_elem.set("val", "Times New Roman")
+            else:
+                print("Không tìm thấy thẻ <fonts> (có namespace)")
+
+        if rel_path == "xl/workbook.xml":
+            nsmap = {"ns": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+            used_names = set()
+            for sheet in root.findall(".//ns:sheet", namespaces=nsmap):
+                if "name" in sheet.attrib:
+                    original_name = html.unescape(sheet.attrib["name"]).strip()
+                    collector.add(original_name, lambda translated_name, sheet=sheet: sheet.set(
+                        "name", sanitize_sheet_name(translated_name, used_names)
+                    ))
+
+        for elem in string_text_elems(root):
+            collector.add_text_elem(elem)
+
+def stream_part(source, output, name, glossary_id, source_lang, target_lang):
+    """
+    Chế độ streaming: mỗi <si> của sharedStrings / mỗi <row> của worksheet là một record, dịch theo batch.
+    Trong worksheet chỉ ô t="inlineStr" được dịch; ô số, công thức, ngày và ô shared string (t="s",
+    đã dịch qua sharedStrings.xml) được ghi lại nguyên vẹn.
+    """
+    if is_worksheet(name):
+        stream_worksheet(source, output, glossary_id, source_lang, target_lang)
+        return
+    if name != "xl/sharedStrings.xml":
+        tree = etree.parse(source, etree.XMLParser(remove_blank_text=True))
+        collector = SegmentCollector()
+        collect_segments([(name, tree)], collector, target_lang)
+        collector.apply(collector.translate_unique(glossary_id, source_lang, target_lang), report=False)
+        output.write(serialize_part(tree))
+        return
+
+    def translate_records(records):
+        collector = SegmentCollector()
+        for record in records:
+            for elem in string_text_elems(record):
+                collector.add_text_elem(elem)
+        collector.apply(collector.translate_unique(glossary_id, source_lang, target_lang), report=False)
+
+    stream_records(source, output, {_SI}, translate_records)
+
+def _inline_entry_size(key, value):
+    return len(key[1].encode("utf-8")) + len(value.encode("utf-8")) + 64
+
+def stream_worksheet(source, output, glossary_id, source_lang, target_lang):
+    """
+    Dịch các ô inline string của một worksheet theo từng batch <row>, chuỗi lặp lại giữa các batch chỉ dịch một lần.
+    Trả về thống kê: số dòng, số ô inline string, số chuỗi không cần dịch (cộng dồn theo batch).
+    """
+    # Khóa của SegmentCollector: (mime type, chuỗi chuẩn hóa)
+    translations = LRUCache(_INLINE_CACHE_BYTES, size_of=_inline_entry_size)
+    cells = 0
+    skipped = 0
+
+    def translate_rows(rows):
+        nonlocal cells, skipped
+        collector = SegmentCollector()
+        for row in rows:
+            for cell in row.iterchildren(_CELL):
+                if cell.get("t") == "inlineStr":
+                    cells += 1
+                    for elem in string_text_elems(cell):
+                        collector.add_text_elem(elem)
+        skipped += len(collector.skipped)
+        if not collector.nodes:
+            return
+
+        batch_translations = {}
+        missing = SegmentCollector()
+        for key, text in collector.unique_texts.items():
+            cached = translations.get(key)
+            if cached is None:
+                missing.unique_texts[key] = text
+            else:
+                batch_translations[key] = cached
+        for key, translated_text in missing.translate_unique(glossary_id, source_lang, target_lang).items():
+            translations.put(key, translated_text)
+            batch_translations[key] = translated_text
+        collector.apply(batch_translations, report=False)
+
+    rows = stream_records(source, output, {_ROW}, translate_rows)
+    print(f"📊 Worksheet: {rows} dòng, {cells} ô inline string, {skipped} chuỗi không cần dịch được bỏ qua")
+    return {"rows": rows, "cells": cells, "skipped": skipped}
 
 def translate_all_xml_in_folder(folder_path, glossary_id, source_lang, target_lang):
-    for root_dir, dirs, files in os.walk(folder_path):
-        for file in files:
-            if not file.endswith(".xml"):
-                continue
-
-            xml_file_path = os.path.join(root_dir, file)
-
-            # 🔍 Chỉ xử lý các file cần thiết
-            rel_path = os.path.relpath(xml_file_path, folder_path).replace("\\", "/")  # Normalize for Windows
-            if not (
-                rel_path == "xl/sharedStrings.xml"
-                or rel_path == "xl/workbook.xml"
-                or rel_path.startswith("xl/drawings/drawing")  # Thêm xử lý cho drawing*.xml
-                or rel_path == "xl/styles.xml"
-
-                # or rel_path.startswith("xl/worksheets/sheet") and rel_path.endswith(".xml")
-            ):
-                continue
-
-            print(f"🔵 Đang xử lý file XML: {xml_file_path}")
-
-            try:
-                # Đọc file XML bằng lxml
-                parser = etree.XMLParser(remove_blank_text=True)
-                tree = etree.parse(xml_file_path, parser)
-                root = tree.getroot()
-                if rel_path == "xl/styles.xml" and (folder_path.endswith("en") or folder_path.endswith("vi")):
-                    ns = {"a": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
-
-                    # Sửa font trong <fonts>
-                    fonts_elem = root.find(".//a:fonts", namespaces=ns)
-                    if fonts_elem is not None:
-                        for font in fonts_elem.findall("a:font", namespaces=ns):
-                            name_elem = font.find("a:name", namespaces=ns)
-                            if name_elem is not None and "val" in name_elem.attrib:
-                                old_font = name_elem.attrib["val"]
-                                name_elem.set("val", "Times New Roman")
-                    else:
-                        print("Không tìm thấy thẻ <fonts> (có namespace)")
-                        
-                if rel_path == "xl/workbook.xml":
-                    nsmap = {"ns": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
-                    for sheet in root.findall(".//ns:sheet", namespaces=nsmap):
-                        if "name" in sheet.attrib:
-                            original_name = html.unescape(sheet.attrib["name"]).strip()
-                            try:
-                                translated_name = translate_text_with_glossary(
-                                    original_name, glossary_id, source_lang, target_lang
-                                )
-                                if translated_name:
-                                    sheet.attrib["name"] = html.unescape(translated_name)
-                                    # print(f"✅ Dịch tên sheet: '{original_name}' -> '{translated_name}'")
-                                else:
-                                    print(f"⚠️ Không thể dịch tên sheet: '{original_name}'")
-                            except Exception as e:
-                                print(f"⚠️ Lỗi khi dịch tên sheet: {original_name} — {e}")
-                for elem in root.iter():
-                    if elem.tag.endswith("}t") and elem.text and elem.text.strip():
-                        original_text = elem.text.strip()
-                        try:
-                            translated_text = translate_text_with_glossary(
-                                original_text, glossary_id, source_lang, target_lang
-                            )
-                            if translated_text:
-                                elem.text = html.unescape(translated_text)
-                        except Exception as e:
-                            print(f"⚠️ Lỗi khi dịch đoạn text: {original_text} — {e}")
-
-                # Ghi lại file XML với định dạng chuẩn
-                tree.write(xml_file_path, pretty_print=True, xml_declaration=True, encoding="UTF-8")
-                print(f"✅ Đã lưu file dịch: {xml_file_path}")
-
-            except Exception as e:
-                print(f"❌ Không thể xử lý file {xml_file_path} — {e}")
-
-def translate_xlsx(xlsx_file):
+    # Bước 1: gom toàn bộ text node (và tên sheet) của các part
+    parsed_parts = load_parts(FolderPackage(folder_path))
+    collector = SegmentCollector()
+    collect_segments(parsed_parts, collector, target_lang)
+
+    # Bước 2: dịch mỗi chuỗi duy nhất một lần cho cả workbook
+    collector.translate(glossary_id, source_lang, target_lang)
+
+    # Bước 3: ghi lại file XML với định dạng chuẩn
+    write_xml_parts(parsed_parts, folder_path)
+
+def translate_xlsx(file_path, target_lang=None, source_lang=None):
+    """
+    Dịch file XLSX. target_lang là một mã ngôn ngữ, một list mã ngôn ngữ hoặc None (mọi ngôn ngữ khác
+    ngôn ngữ nguồn). Workbook chỉ được giải nén và parse một lần; trả về dict ngôn ngữ đích -> đường dẫn file đã dịch.
+    """
     start = time.time()
-    extracted_folder = copy_and_extract(xlsx_file)
-
-    source_lang = detect_language(extract_content(xlsx_file))
-    if source_lang not in LANGUAGES:
-        raise HTTPException(status_code=400, detail=f"Unsupported source language: {source_lang}")
-    print(f"Detected language: {LANGUAGES[source_lang]}")
-    target_langs = [lang for lang in LANGUAGES.keys() if lang != source_lang]
-    for target_lang in target_langs:
-        extracted_folder_temp = f"{extracted_folder}_{target_lang}"
-        if os.path.exists(extracted_folder_temp):
-            shutil.rmtree(extracted_folder_temp)
-        extracted_folder_temp = shutil.copytree(extracted_folder, f"{extracted_folder}_{target_lang}")
-
-        pair_code = f"{source_lang}-{target_lang}" if f"{source_lang}-{target_lang}" in language_pair.keys() else f"{target_lang}-{source_lang}"
-
-        if pair_code not in language_pair:
-            raise HTTPException(status_code=400, detail=f"Unsupported language pair: {pair_code}")
-        
-        glossary_id = f"toray_translation_glossary_{language_pair[pair_code]}"
-        translate_all_xml_in_folder(extracted_folder_temp, glossary_id, source_lang, target_lang)
-        output_xlsx = xlsx_file.replace(".xlsx", f"_{target_lang}.xlsx")
-        compress_folder(extracted_folder_temp, xlsx_file, output_xlsx)
-
-        # Xóa thư mục tạm extracted_folder_temp
-        shutil.rmtree(extracted_folder_temp, ignore_errors=True)
-    # Xóa thư mục tạm extracted_folder
-    shutil.rmtree(extracted_folder, ignore_errors=True)
-
-    # Xóa file zip tạm
-    zip_path = xlsx_file.replace(".xlsx", "_copy.zip")
-    if os.path.exists(zip_path):
-        os.remove(zip_path)
+    target_langs = [target_lang] if isinstance(target_lang, str) else list(target_lang or LANGUAGES.keys())
+    outputs = translate_package(
+        file_path, target_langs, source_lang, select_parts, load_part, collect_segments,
+        stream_part=stream_part, stream_filter=should_stream,
+    )
     end = time.time()
     print("Total time: ", end - start)
+    return outputs
 # Ví dụ sử dụng:
 if __name__ == "__main__":
     xlsx_file = r"C:\Users\User\OneDrive - Hanoi University of Science and Technology\Documents\Lập trình cơ bản\Projects\[ISE] Toray translator project\Test library\仕样書- AY00139 .xlsx"
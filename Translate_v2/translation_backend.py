@@ -0,0 +1,244 @@
+import json
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from google.api_core import exceptions as google_exceptions
+from google.cloud import translate_v3 as translate
+from .client_provider import get_translation_client
+from .concurrent_executor import TokenBucket
+from .settings import (
+    PROJECT_ID, TRANSLATION_BACKEND, TRANSLATION_BACKEND_URL, LOCAL_BACKEND_LATENCY_MS, LOCAL_BACKEND_LATENCY_PER_CHAR_MS,
+    LOCAL_BACKEND_ERROR_RATE, LOCAL_BACKEND_CHARS_PER_SECOND, LOCAL_BACKEND_SEED,
+)
+
+LOCATION = "us-central1"
+
+class TranslationBackend:
+    """Giao diện chung cho các dịch vụ dịch: phát hiện ngôn ngữ, dịch theo batch, tra cứu glossary"""
+
+    name = "base"
+
+    def detect_language(self, text: str) -> str:
+        raise NotImplementedError
+
+    def translate_batch(self, contents: list, glossary_id: str, source_lang_code: str, target_lang_code: str, mime_type: str = "text/plain") -> list:
+        """Dịch một request gồm nhiều segment, trả về list bản dịch cùng thứ tự và cùng độ dài"""
+        raise NotImplementedError
+
+    def lookup_glossary(self, glossary_id: str):
+        """Trả về thông tin glossary (dict) hoặc None nếu không tồn tại"""
+        raise NotImplementedError
+
+class GoogleTranslationBackend(TranslationBackend):
+    """Cloud Translation API v3 dùng client chung của process"""
+
+    name = "google"
+
+    def __init__(self, project_id=None):
+        self.project_id = project_id or PROJECT_ID
+        self.parent = f"projects/{self.project_id}/locations/{LOCATION}"
+
+    def detect_language(self, text):
+        client = get_translation_client()
+        request = translate.DetectLanguageRequest(content=text, parent=self.parent)
+        response = client.detect_language(request=request)
+        return response.languages[0].language_code
+
+    def translate_batch(self, contents, glossary_id, source_lang_code, target_lang_code, mime_type="text/plain"):
+        client = get_translation_client()
+        glossary = client.glossary_path(self.project_id, LOCATION, glossary_id)
+        glossary_config = translate.TranslateTextGlossaryConfig(glossary=glossary)
+
+        response = client.translate_text(
+            request={
+                "contents": contents,
+                "mime_type": mime_type,
+                "target_language_code": target_lang_code,
+                "source_language_code": source_lang_code,
+                "parent": self.parent,
+                "glossary_config": glossary_config,
+            }
+        )
+        translations = [translation.translated_text for translation in response.glossary_translations]
+        if len(translations) != len(contents):
+            raise ValueError(f"Số bản dịch trả về ({len(translations)}) không khớp số segment ({len(contents)})")
+        return translations
+
+    def lookup_glossary(self, glossary_id):
+        client = get_translation_client()
+        try:
+            glossary = client.get_glossary(name=client.glossary_path(self.project_id, LOCATION, glossary_id))
+        except google_exceptions.NotFound:
+            return None
+        language_codes = list(glossary.language_codes_set.language_codes) or [
+            glossary.language_pair.source_language_code,
+            glossary.language_pair.target_language_code,
+        ]
+        return {
+            "glossary_id": glossary_id,
+            "name": glossary.name,
+            "language_codes": language_codes,
+            "entry_count": glossary.entry_count,
+        }
+
+_KANA_RE = re.compile(r"[぀-ヿ]")
+_HAN_RE = re.compile(r"[一-鿿]")
+_TAG_RE = re.compile(r"(<[^>]+>)")
+_VIETNAMESE_RE = re.compile(r"[ăâđêôơưạảấầẩẫậắằẳẵặẹẻẽếềểễệỉịọỏốồổỗộớờởỡợụủứừửữựỳỵỷỹ]", re.IGNORECASE)
+
+class LocalTranslationBackend(TranslationBackend):
+    """
+    Stand-in cục bộ, xác định (deterministic), không cần credentials.
+    Bản dịch có dạng "[<target>] <text>". Có thể cấu hình độ trễ mỗi request,
+    tỉ lệ lỗi giả lập (503) và giới hạn ký tự/giây (vượt quá trả lỗi 429 như API thật).
+    """
+
+    name = "local"
+
+    def __init__(self, latency_ms=0, latency_per_char_ms=0.0, error_rate=0.0, chars_per_second=0, seed=0):
+        self.latency_ms = latency_ms
+        self.latency_per_char_ms = latency_per_char_ms
+        self.error_rate = error_rate
+        self.bucket = TokenBucket(chars_per_second * 60, chars_per_second) if chars_per_second else None
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "segments": 0, "characters": 0, "errors": 0}
+
+    def _simulate(self, characters):
+        with self._lock:
+            self.stats["requests"] += 1
+            fail = self.error_rate and self._random.random() < self.error_rate
+        delay = (self.latency_ms + self.latency_per_char_ms * characters) / 1000.0
+        if delay:
+            time.sleep(delay)
+        if self.bucket is not None and not self.bucket.try_acquire(characters):
+            with self._lock:
+                self.stats["errors"] += 1
+            error = google_exceptions.ResourceExhausted("Quota exceeded (local stand-in)")
+            # Gợi ý thời gian chờ như RetryInfo của API thật
+            error.retry_after = min(characters, self.bucket.capacity) / self.bucket.refill_per_second
+            raise error
+        if fail:
+            with self._lock:
+                self.stats["errors"] += 1
+            raise google_exceptions.ServiceUnavailable("Simulated failure (local stand-in)")
+
+    def detect_language(self, text):
+        self._simulate(len(text))
+        if _KANA_RE.search(text):
+            return "ja"
+        if _VIETNAMESE_RE.search(text):
+            return "vi"
+        if _HAN_RE.search(text):
+            return "zh-CN"
+        return "en"
+
+    def translate_batch(self, contents, glossary_id, source_lang_code, target_lang_code, mime_type="text/plain"):
+        characters = sum(len(text) for text in contents)
+        self._simulate(characters)
+        with self._lock:
+            self.stats["segments"] += len(contents)
+            self.stats["characters"] += characters
+        if mime_type == "text/html":
+            return [self._translate_html(text, target_lang_code) for text in contents]
+        return [f"[{target_lang_code}] {text}" for text in contents]
+
+    @staticmethod
+    def _translate_html(text, target_lang_code):
+        # Như API thật: giữ nguyên thẻ, chỉ "dịch" text node, bỏ qua nội dung translate="no"
+        parts = []
+        protected_depth = 0
+        for part in _TAG_RE.split(text):
+            if _TAG_RE.fullmatch(part):
+                if part.startswith("<span") and 'translate="no"' in part:
+                    protected_depth += 1
+                elif part == "</span>" and protected_depth:
+                    protected_depth -= 1
+                parts.append(part)
+            elif part.strip() and not protected_depth:
+                parts.append(f"[{target_lang_code}] {part}")
+            else:
+                parts.append(part)
+        return "".join(parts)
+
+    def lookup_glossary(self, glossary_id):
+        return {"glossary_id": glossary_id, "name": glossary_id, "language_codes": [], "entry_count": 0}
+
+class HttpTranslationBackend(TranslationBackend):
+    """Client cho server stand-in chạy riêng (xem local_standin_server.py)"""
+
+    name = "http"
+
+    def __init__(self, base_url, timeout=60):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def _post(self, path, payload):
+        request = urllib.request.Request(
+            f"{self.base_url}{path}",
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read().decode("utf-8"))
+        except urllib.error.HTTPError as e:
+            # Chuyển mã lỗi HTTP thành exception của google.api_core giống API thật
+            error = google_exceptions.from_http_status(e.code, e.read().decode("utf-8", "replace"))
+            if e.headers.get("Retry-After"):
+                error.retry_after = float(e.headers["Retry-After"])
+            raise error
+
+    def detect_language(self, text):
+        return self._post("/detect", {"content": text})["language_code"]
+
+    def translate_batch(self, contents, glossary_id, source_lang_code, target_lang_code, mime_type="text/plain"):
+        return self._post("/translate", {
+            "contents": contents,
+            "mime_type": mime_type,
+            "glossary_id": glossary_id,
+            "source_language_code": source_lang_code,
+            "target_language_code": target_lang_code,
+        })["translations"]
+
+    def lookup_glossary(self, glossary_id):
+        return self._post("/glossary", {"glossary_id": glossary_id}).get("glossary")
+
+def create_backend(name=None):
+    """Tạo backend theo tên (mặc định lấy từ biến môi trường / settings TRANSLATION_BACKEND)"""
+    name = (name or TRANSLATION_BACKEND).lower()
+    if name == "google":
+        return GoogleTranslationBackend()
+    if name == "local":
+        return LocalTranslationBackend(
+            latency_ms=LOCAL_BACKEND_LATENCY_MS,
+            latency_per_char_ms=LOCAL_BACKEND_LATENCY_PER_CHAR_MS,
+            error_rate=LOCAL_BACKEND_ERROR_RATE,
+            chars_per_second=LOCAL_BACKEND_CHARS_PER_SECOND,
+            seed=LOCAL_BACKEND_SEED,
+        )
+    if name == "http":
+        return HttpTranslationBackend(TRANSLATION_BACKEND_URL)
+    raise ValueError(f"Unsupported translation backend: {name}")
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_backend():
+    """Trả về backend dùng chung cho process"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend()
+                print(f"🔧 Translation backend: {_backend.name}")
+    return _backend
+
+def set_backend(backend):
+    """Thay backend đang dùng (ví dụ khi benchmark hoặc load test trong cùng process)"""
+    global _backend
+    with _backend_lock:
+        _backend = backend
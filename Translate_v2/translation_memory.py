@@ -0,0 +1,310 @@
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from .fuzzy_memory import FuzzyIndex, FUZZY_MATCH_ENABLED, FUZZY_MAX_SEGMENTS
+from .settings import TM_ENABLED, DATA_DIR, TM_DB_PATH, TM_MAX_MEMORY_BYTES
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+def normalize_segment(text: str) -> str:
+    """Chuẩn hóa segment làm khóa tra cứu: NFKC, gộp khoảng trắng, bỏ khoảng trắng hai đầu"""
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+class LRUCache:
+    """
+    LRU trong process, loại bỏ theo tổng dung lượng (byte UTF-8) của key và value.
+    size_of(key, value) -> số byte của một entry; mặc định tính theo chuỗi nguồn ở key[0] (khóa của TM).
+    """
+
+    def __init__(self, max_bytes=TM_MAX_MEMORY_BYTES, size_of=None):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._size_of = size_of or self._entry_size
+
+    @staticmethod
+    def _entry_size(key, value):
+        return len(key[0].encode("utf-8")) + len(value.encode("utf-8")) + 64
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        size = self._size_of(key, value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.current_bytes -= self._size_of(key, old)
+            self._data[key] = value
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                old_key, old_value = self._data.popitem(last=False)
+                self.current_bytes -= self._size_of(old_key, old_value)
+
+    def discard_glossary(self, glossary_id):
+        with self._lock:
+            for key in [k for k in self._data if k[3] == glossary_id]:
+                self.current_bytes -= self._size_of(key, self._data.pop(key))
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.current_bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+class SqliteStore:
+    """Tầng lưu trữ lâu dài trong file SQLite cục bộ (mỗi thread một connection)"""
+
+    def __init__(self, db_path=TM_DB_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._init_schema()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_schema(self):
+        conn = self._connection()
+        with conn:
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(translation_memory)")]
+            if columns and "mime_type" not in columns:
+                # Bảng cũ không phân biệt text/plain và text/html: bản dịch cũ có thể lẫn loại, bỏ đi
+                conn.execute("DROP TABLE translation_memory")
+                print("🧹 Translation memory cũ (không có mime type) đã được xóa")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS translation_memory (
+                    source_text TEXT NOT NULL,
+                    source_lang TEXT NOT NULL,
+                    target_lang TEXT NOT NULL,
+                    glossary_id TEXT NOT NULL,
+                    glossary_version INTEGER NOT NULL,
+                    mime_type TEXT NOT NULL,
+                    translated_text TEXT NOT NULL,
+                    PRIMARY KEY (source_text, source_lang, target_lang, glossary_id, glossary_version, mime_type)
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS glossary_versions (
+                    glossary_id TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL
+                )
+                """
+            )
+
+    def get_glossary_version(self, glossary_id):
+        row = self._connection().execute(
+            "SELECT version FROM glossary_versions WHERE glossary_id = ?", (glossary_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def bump_glossary_version(self, glossary_id):
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                """
+                INSERT INTO glossary_versions (glossary_id, version) VALUES (?, 1)
+                ON CONFLICT(glossary_id) DO UPDATE SET version = version + 1
+                """,
+                (glossary_id,),
+            )
+            version = conn.execute(
+                "SELECT version FROM glossary_versions WHERE glossary_id = ?", (glossary_id,)
+            ).fetchone()[0]
+            # Xóa các bản dịch thuộc phiên bản glossary cũ
+            conn.execute(
+                "DELETE FROM translation_memory WHERE glossary_id = ? AND glossary_version < ?",
+                (glossary_id, version),
+            )
+        return version
+
+    def get_many(self, keys):
+        conn = self._connection()
+        found = {}
+        for key in keys:
+            row = conn.execute(
+                """
+                SELECT translated_text FROM translation_memory
+                WHERE source_text = ? AND source_lang = ? AND target_lang = ?
+                AND glossary_id = ? AND glossary_version = ? AND mime_type = ?
+                """,
+                key,
+            ).fetchone()
+            if row:
+                found[key] = row[0]
+        return found
+
+    def iter_scope(self, source_lang, target_lang, glossary_id, glossary_version, mime_type,
+                   limit=FUZZY_MAX_SEGMENTS):
+        """Các cặp (nguồn, bản dịch) đã lưu của một cặp ngôn ngữ + glossary + mime type, dùng để dựng fuzzy index"""
+        return self._connection().execute(
+            """
+            SELECT source_text, translated_text FROM translation_memory
+            WHERE source_lang = ? AND target_lang = ? AND glossary_id = ? AND glossary_version = ? AND mime_type = ?
+            LIMIT ?
+            """,
+            (source_lang, target_lang, glossary_id, glossary_version, mime_type, limit),
+        )
+
+    def put_many(self, items):
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                """
+                INSERT OR REPLACE INTO translation_memory
+                (source_text, source_lang, target_lang, glossary_id, glossary_version, mime_type, translated_text)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                [(*key, value) for key, value in items],
+            )
+
+class TranslationMemory:
+    """
+    Translation memory hai tầng đặt trước các lời gọi dịch.
+    Khóa: (segment đã chuẩn hóa, ngôn ngữ nguồn, ngôn ngữ đích, glossary id, phiên bản glossary, mime type);
+    bản dịch text/html (đã escape, có thẻ) không bao giờ được trả cho request text/plain và ngược lại.
+    """
+
+    def __init__(self, db_path=TM_DB_PATH, max_memory_bytes=TM_MAX_MEMORY_BYTES):
+        self.memory = LRUCache(max_memory_bytes)
+        self.store = SqliteStore(db_path)
+        self.stats = {"memory_hits": 0, "persistent_hits": 0, "fuzzy_hits": 0, "misses": 0}
+        self._stats_lock = threading.Lock()
+        self.fuzzy_indexes = {}
+        self._fuzzy_lock = threading.Lock()
+
+    def _keys(self, texts, glossary_id, source_lang, target_lang, mime_type):
+        version = self.store.get_glossary_version(glossary_id)
+        return [
+            (normalize_segment(text), source_lang, target_lang, glossary_id, version, mime_type)
+            for text in texts
+        ]
+
+    def _fuzzy_index(self, scope, create=True):
+        """
+        Fuzzy index của một phạm vi (nguồn, đích, glossary, phiên bản, mime type), dùng lần đầu thì tạo rỗng
+        và nạp dữ liệu từ SQLite ở thread nền (không chặn request đang dịch).
+        """
+        index = self.fuzzy_indexes.get(scope)
+        if index is None and create:
+            with self._fuzzy_lock:
+                index = self.fuzzy_indexes.get(scope)
+                if index is None:
+                    index = FuzzyIndex(mime_type=scope[-1])
+                    self.fuzzy_indexes[scope] = index
+                    threading.Thread(
+                        target=self._load_fuzzy_index, args=(scope, index), name="fuzzy-index-load", daemon=True,
+                    ).start()
+        return index
+
+    def _load_fuzzy_index(self, scope, index):
+        try:
+            for source_text, translated_text in self.store.iter_scope(*scope):
+                # Bản dịch mới lưu trong lúc nạp không bị bản cũ trong SQLite ghi đè
+                index.add(source_text, translated_text, overwrite=False)
+        except Exception as e:
+            print(f"⚠️ Không nạp được fuzzy index {scope}: {e}")
+        finally:
+            index.ready.set()
+
+    def lookup(self, texts, glossary_id, source_lang, target_lang, mime_type="text/plain"):
+        """Tra cứu danh sách segment, trả về list bản dịch (None nếu chưa có trong memory)"""
+        keys = self._keys(texts, glossary_id, source_lang, target_lang, mime_type)
+        results = [self.memory.get(key) for key in keys]
+
+        missing = list({key for key, value in zip(keys, results) if value is None})
+        persistent = self.store.get_many(missing) if missing else {}
+        for key, value in persistent.items():
+            self.memory.put(key, value)
+
+        memory_hits = persistent_hits = fuzzy_hits = misses = 0
+        for i, key in enumerate(keys):
+            if results[i] is not None:
+                memory_hits += 1
+            elif key in persistent:
+                results[i] = persistent[key]
+                persistent_hits += 1
+            else:
+                # Segment gần giống chỉ khác mã/số: thay token vào bản dịch đã lưu
+                fuzzy = self._fuzzy_index(key[1:]).lookup(key[0]) if FUZZY_MATCH_ENABLED else None
+                if fuzzy is not None:
+                    results[i] = fuzzy
+                    self.memory.put(key, fuzzy)
+                    fuzzy_hits += 1
+                else:
+                    misses += 1
+
+        with self._stats_lock:
+            self.stats["memory_hits"] += memory_hits
+            self.stats["persistent_hits"] += persistent_hits
+            self.stats["fuzzy_hits"] += fuzzy_hits
+            self.stats["misses"] += misses
+        return results
+
+    def store_translations(self, texts, translations, glossary_id, source_lang, target_lang, mime_type="text/plain"):
+        """Lưu các bản dịch thành công (bỏ qua bản dịch rỗng)"""
+        keys = self._keys(texts, glossary_id, source_lang, target_lang, mime_type)
+        items = [(key, value) for key, value in zip(keys, translations) if value]
+        for key, value in items:
+            self.memory.put(key, value)
+            index = self._fuzzy_index(key[1:], create=False)
+            if index is not None:
+                index.add(key[0], value)
+        if items:
+            self.store.put_many(items)
+
+    def invalidate_glossary(self, glossary_id):
+        """Vô hiệu hóa mọi bản dịch gắn với glossary khi glossary được tạo lại"""
+        version = self.store.bump_glossary_version(glossary_id)
+        self.memory.discard_glossary(glossary_id)
+        with self._fuzzy_lock:
+            for scope in [scope for scope in self.fuzzy_indexes if scope[2] == glossary_id]:
+                self.fuzzy_indexes.pop(scope).close()
+        print(f"🧹 Đã vô hiệu hóa translation memory của {glossary_id} (phiên bản {version})")
+        return version
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats["hits"] = stats["memory_hits"] + stats["persistent_hits"] + stats["fuzzy_hits"]
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        stats["memory_entries"] = len(self.memory)
+        stats["memory_bytes"] = self.memory.current_bytes
+        return stats
+
+_translation_memory = None
+_translation_memory_lock = threading.Lock()
+
+def get_translation_memory():
+    """Trả về TranslationMemory dùng chung cho cả process (None nếu bị tắt)"""
+    global _translation_memory
+    if not TM_ENABLED:
+        return None
+    if _translation_memory is None:
+        with _translation_memory_lock:
+            if _translation_memory is None:
+                _translation_memory = TranslationMemory()
+    return _translation_memory
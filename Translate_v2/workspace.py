@@ -0,0 +1,98 @@
+import contextvars
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from .settings import WORKSPACE_ROOT, WORKSPACE_USE_SHM, SHM_ROOT, SHM_BUDGET_BYTES, RETENTION_SECONDS
+
+_RETAINED_MARKER = ".retained"
+_current_workspace = contextvars.ContextVar("translate_workspace", default=None)
+_shm_lock = threading.Lock()
+_shm_reserved_bytes = 0
+
+class JobWorkspace:
+    """Thư mục riêng của một job dịch: file tải lên, file trung gian và file kết quả"""
+
+    def __init__(self, path, reserved_shm_bytes=0):
+        self.path = path
+        self.reserved_shm_bytes = reserved_shm_bytes
+
+    def file_path(self, name):
+        return os.path.join(self.path, name)
+
+    def cleanup(self, retain=False):
+        global _shm_reserved_bytes
+        if self.reserved_shm_bytes:
+            with _shm_lock:
+                _shm_reserved_bytes -= self.reserved_shm_bytes
+            self.reserved_shm_bytes = 0
+        if retain:
+            # File đánh dấu: chỉ workspace đã kết thúc mới bị dọn, thời điểm ghi là lúc job kết thúc
+            with open(os.path.join(self.path, _RETAINED_MARKER), "w") as f:
+                f.write(str(time.time()))
+            print(f"🗂️ Giữ lại workspace {self.path} trong {RETENTION_SECONDS:.0f}s")
+        else:
+            shutil.rmtree(self.path, ignore_errors=True)
+
+def _reserve_shm(expected_bytes):
+    """Giữ chỗ trên tmpfs nếu còn trong ngân sách, trả về True nếu được dùng tmpfs"""
+    global _shm_reserved_bytes
+    if not WORKSPACE_USE_SHM or not os.path.isdir(os.path.dirname(SHM_ROOT)):
+        return False
+    with _shm_lock:
+        if _shm_reserved_bytes + expected_bytes > SHM_BUDGET_BYTES:
+            return False
+        _shm_reserved_bytes += expected_bytes
+    return True
+
+def purge_expired_workspaces(now=None):
+    """Xóa các workspace được giữ lại đã quá thời gian lưu giữ (không đụng tới job đang chạy)"""
+    now = now or time.time()
+    for root in (WORKSPACE_ROOT, SHM_ROOT):
+        if not os.path.isdir(root):
+            continue
+        for name in os.listdir(root):
+            marker = os.path.join(root, name, _RETAINED_MARKER)
+            try:
+                if name.startswith("job-") and now - os.path.getmtime(marker) > RETENTION_SECONDS:
+                    shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+            except OSError:
+                continue
+
+@contextmanager
+def job_workspace(expected_bytes=0):
+    """
+    Tạo thư mục riêng cho một job và đặt nó làm workspace hiện tại (theo context/thread).
+    expected_bytes: dung lượng ước tính, dùng để quyết định có đặt trên tmpfs hay không.
+    Thư mục luôn được dọn khi job kết thúc (kể cả khi lỗi), trừ khi có cấu hình lưu giữ.
+    """
+    purge_expired_workspaces()
+    use_shm = _reserve_shm(expected_bytes)
+    root = SHM_ROOT if use_shm else WORKSPACE_ROOT
+    os.makedirs(root, exist_ok=True)
+    workspace = JobWorkspace(
+        tempfile.mkdtemp(prefix="job-", dir=root),
+        reserved_shm_bytes=expected_bytes if use_shm else 0,
+    )
+    token = _current_workspace.set(workspace)
+    try:
+        yield workspace
+    finally:
+        _current_workspace.reset(token)
+        workspace.cleanup(retain=RETENTION_SECONDS > 0)
+
+def current_workspace():
+    """Workspace của job đang chạy trong context hiện tại (None nếu không có)"""
+    return _current_workspace.get()
+
+def derived_path(file_path, suffix):
+    """
+    Đường dẫn file/thư mục sinh ra từ file gốc: <tên file gốc không đuôi><suffix>.
+    Nằm trong workspace của job hiện tại; ngoài job thì đặt cạnh file gốc như trước.
+    """
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    workspace = current_workspace()
+    directory = workspace.path if workspace is not None else os.path.dirname(file_path)
+    return os.path.join(directory, f"{stem}{suffix}")
@@ -1,71 +1,466 @@
-import shutil
+import copy
+import io
+import struct
+import threading
 import zipfile
+import zlib
 import os
-from fastapi import HTTPException
-def copy_and_extract(file_path):
-    if not os.path.isfile(file_path):
-        raise FileNotFoundError(f"File {file_path} không tồn tại.")
-
-    # Lấy thư mục và tên file gốc
-    file_dir = os.path.dirname(file_path)
-    file_name = os.path.splitext(os.path.basename(file_path))[0]
-
-    # Tạo file .zip từ file .docx
-    zip_path = os.path.join(file_dir, f"{file_name}_copy.zip")
-    shutil.copyfile(file_path, zip_path)
-
-    # Tạo folder để extract (cùng thư mục với file gốc)
-    extract_dir = os.path.join(file_dir, f"{file_name}_extracted")
-    os.makedirs(extract_dir, exist_ok=True)
-
-    # Giải nén file zip
-    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-        zip_ref.extractall(extract_dir)
-
-    return extract_dir
-def compress_folder(folder_path,file_path,  output_path):
-    if not os.path.isdir(folder_path):
-        raise FileNotFoundError(f"Folder {folder_path} không tồn tại.")
-
-    file_extension = file_path.split(".")[-1].lower()
-
-    if file_extension == "pdf":
-        temp_zip_path = output_path.replace('.pdf', '.zip')
-
-    elif file_extension == "docx":
-        temp_zip_path = output_path.replace('.docx', '.zip')
-    elif file_extension == "xlsx":
-        temp_zip_path = output_path.replace('.xlsx', '.zip')
-    elif file_extension == "pptx":
-        temp_zip_path = output_path.replace('.pptx', '.zip')
-    else:
-        raise HTTPException(status_code=400, detail="Unsupported file type")
-    # Đảm bảo thư mục chứa file zip tồn tại
-    zip_dir = os.path.dirname(temp_zip_path)
-    if zip_dir and not os.path.exists(zip_dir):
-        os.makedirs(zip_dir)
-
-    # Nếu file zip tạm đã tồn tại, xóa đi
-    if os.path.exists(temp_zip_path):
-        os.remove(temp_zip_path)
-
-    # Tiến hành nén folder thành file zip
-    with zipfile.ZipFile(temp_zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-        for root, dirs, files in os.walk(folder_path):
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from lxml import etree
+from .settings import COMPRESSION_WORKERS, XML_COMPRESS_LEVEL, DEFAULT_COMPRESS_LEVEL
+def write_xml_parts(parsed_parts, folder_path):
+    """Ghi các cây XML (đường dẫn tương đối, tree) vào thư mục đã giải nén"""
+    for rel_path, tree in parsed_parts:
+        xml_file_path = os.path.join(folder_path, rel_path)
+        try:
+            tree.write(xml_file_path, pretty_print=True, xml_declaration=True, encoding="UTF-8")
+            print(f"✅ Đã lưu file dịch: {xml_file_path}")
+        except Exception as e:
+            print(f"❌ Không thể xử lý file {xml_file_path} — {e}")
+
+class FolderPackage:
+    """Thư mục đã giải nén, dùng chung giao diện namelist()/read() với zipfile.ZipFile"""
+
+    def __init__(self, folder_path):
+        self.folder_path = folder_path
+
+    def namelist(self):
+        names = []
+        for root_dir, dirs, files in os.walk(self.folder_path):
             for file in files:
-                file_path = os.path.join(root, file)
-                arcname = os.path.relpath(file_path, folder_path)  # tên tương đối bên trong zip
-                zipf.write(file_path, arcname)
+                names.append(os.path.relpath(os.path.join(root_dir, file), self.folder_path).replace("\\", "/"))
+        return names
+
+    def read(self, name):
+        with open(os.path.join(self.folder_path, name), "rb") as f:
+            return f.read()
+
+    def open(self, name):
+        return open(os.path.join(self.folder_path, name), "rb")
+
+_CT_NS = "{http://schemas.openxmlformats.org/package/2006/content-types}"
+_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+OFFICE_DOCUMENT_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+
+def read_content_types(package):
+    """Đọc [Content_Types].xml, trả về hàm tên part -> content type (Override trước, sau đó Default theo đuôi)"""
+    root = etree.fromstring(package.read("[Content_Types].xml"))
+    defaults = {
+        elem.get("Extension", "").lower(): elem.get("ContentType")
+        for elem in root.iter(f"{_CT_NS}Default")
+    }
+    overrides = {
+        elem.get("PartName", "").lstrip("/"): elem.get("ContentType")
+        for elem in root.iter(f"{_CT_NS}Override")
+    }
+
+    def content_type(name):
+        if name in overrides:
+            return overrides[name]
+        return defaults.get(posixpath.splitext(name)[1].lstrip(".").lower())
+
+    return content_type
+
+def read_relationships(package, part_name, names=None):
+    """
+    Quan hệ nội bộ của một part ("" = gói), trả về [(type, tên part đích)].
+    Part không có file .rels (hoặc đích không tồn tại trong gói) bị bỏ qua.
+    """
+    directory, base = posixpath.split(part_name)
+    rels_name = posixpath.join(directory, "_rels", f"{base}.rels")
+    names = names if names is not None else set(package.namelist())
+    if rels_name not in names:
+        return []
+    relationships = []
+    for rel in etree.fromstring(package.read(rels_name)).iter(f"{_REL_NS}Relationship"):
+        if rel.get("TargetMode") == "External":
+            continue
+        target = rel.get("Target", "")
+        if target.startswith("/"):
+            target_name = target.lstrip("/")
+        else:
+            target_name = posixpath.normpath(posixpath.join(directory, target))
+        if target_name in names:
+            relationships.append((rel.get("Type"), target_name))
+    return relationships
+
+def select_related_parts(package, content_types):
+    """
+    Chọn các part cần xử lý theo quan hệ, bắt đầu từ part chính (officeDocument) của gói.
+    Đi theo .rels của các part đã chọn, chỉ giữ part có content type thuộc `content_types`.
+    Trả về list tên part theo thứ tự tìm thấy; các part khác không được đọc hay ghi lại.
+    """
+    names = set(package.namelist())
+    content_type = read_content_types(package)
+    selected = []
+    seen = set()
+    queue = [name for rel_type, name in read_relationships(package, "", names) if rel_type == OFFICE_DOCUMENT_REL]
+    while queue:
+        name = queue.pop(0)
+        if name in seen or content_type(name) not in content_types:
+            continue
+        seen.add(name)
+        selected.append(name)
+        queue.extend(target for rel_type, target in read_relationships(package, name, names))
+    return selected
+
+# Định dạng đã nén sẵn: lưu nguyên (ZIP_STORED), nén lại chỉ tốn CPU
+STORED_EXTENSIONS = {
+    ".png", ".jpg", ".jpeg", ".jpe", ".jfif", ".gif", ".wdp", ".jxr",
+    ".mp3", ".mp4", ".m4a", ".m4v", ".mov", ".avi", ".wmv", ".wma",
+    ".zip", ".gz", ".7z", ".docx", ".xlsx", ".pptx",
+}
+
+_compression_pool = None
+_compression_pool_pid = None
+_compression_pool_lock = threading.Lock()
+
+_RAW_COPY_CHUNK_SIZE = 1024 * 1024
+_FLAG_DATA_DESCRIPTOR = 0x08
+_ZIP64_EXTRA_ID = 0x0001
+
+_LOCAL_FILE_HEADER = struct.Struct("<4s2B4HL2L2H")
+_LFH_FILENAME_LENGTH = 10
+_LFH_EXTRA_FIELD_LENGTH = 11
+_CENTRAL_DIRECTORY = struct.Struct(zipfile.structCentralDir)
+_END_ARCHIVE = struct.Struct(zipfile.structEndArchive)
+_END_ARCHIVE64 = struct.Struct(zipfile.structEndArchive64)
+_END_ARCHIVE64_LOCATOR = struct.Struct(zipfile.structEndArchive64Locator)
+_ZIP64_VERSION = 45
+_UTF8_FLAG = 0x800
+
+def _strip_zip64_extra(extra):
+    """Bỏ trường zip64 cũ trong extra (FileHeader sẽ tự thêm lại nếu cần)"""
+    result = b""
+    i = 0
+    while i + 4 <= len(extra):
+        header_id, size = struct.unpack("<HH", extra[i:i + 4])
+        if header_id != _ZIP64_EXTRA_ID:
+            result += extra[i:i + 4 + size]
+        i += 4 + size
+    return result
+
+def _encode_filename(zinfo):
+    """Tên entry dạng bytes và cờ UTF-8 (như zipfile: ASCII nếu được, ngược lại UTF-8 + bit 11)"""
+    try:
+        return zinfo.filename.encode("ascii"), zinfo.flag_bits & ~_UTF8_FLAG
+    except UnicodeEncodeError:
+        return zinfo.filename.encode("utf-8"), zinfo.flag_bits | _UTF8_FLAG
+
+class RawZipWriter:
+    """
+    Ghi file zip từ dữ liệu đã nén sẵn (chép raw từ zip nguồn hoặc nén song song trong thread pool).
+    Local header dựng bằng ZipInfo.FileHeader() công khai; offset và central directory (kể cả zip64)
+    do writer tự quản lý, không đụng tới thuộc tính nội bộ của zipfile.ZipFile.
+    """
+
+    def __init__(self, fileobj):
+        self.fp = fileobj
+        self.infolist = []
+        self._offset = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _write(self, data):
+        self.fp.write(data)
+        self._offset += len(data)
+
+    def write_compressed(self, zinfo, chunks):
+        """Ghi local header + dữ liệu đã nén của một entry (CRC, kích thước đã có trong zinfo)"""
+        with self._lock:
+            if self._closed:
+                raise ValueError("RawZipWriter đã đóng")
+            # CRC và kích thước đã biết nên ghi thẳng vào local header, không cần data descriptor
+            zinfo.flag_bits &= ~_FLAG_DATA_DESCRIPTOR
+            zinfo.header_offset = self._offset
+            self._write(zinfo.FileHeader())
+            written = 0
+            for chunk in chunks:
+                self._write(chunk)
+                written += len(chunk)
+            if written != zinfo.compress_size:
+                raise zipfile.BadZipFile(
+                    f"Entry {zinfo.filename}: ghi {written} byte, khác compress_size {zinfo.compress_size}"
+                )
+            self.infolist.append(zinfo)
+
+    def _central_directory_entry(self, zinfo):
+        zip64_fields = []
+        file_size, compress_size, header_offset = zinfo.file_size, zinfo.compress_size, zinfo.header_offset
+        if file_size > zipfile.ZIP64_LIMIT or compress_size > zipfile.ZIP64_LIMIT:
+            zip64_fields += [file_size, compress_size]
+            file_size = compress_size = 0xFFFFFFFF
+        if header_offset > zipfile.ZIP64_LIMIT:
+            zip64_fields.append(header_offset)
+            header_offset = 0xFFFFFFFF
+        extra = _strip_zip64_extra(zinfo.extra)
+        min_version = 0
+        if zip64_fields:
+            extra = struct.pack(f"<HH{len(zip64_fields)}Q", _ZIP64_EXTRA_ID, 8 * len(zip64_fields), *zip64_fields) + extra
+            min_version = _ZIP64_VERSION
+
+        year, month, day, hour, minute, second = zinfo.date_time
+        dos_date = (year - 1980) << 9 | month << 5 | day
+        dos_time = hour << 11 | minute << 5 | second // 2
+        filename, flag_bits = _encode_filename(zinfo)
+        header = _CENTRAL_DIRECTORY.pack(
+            zipfile.stringCentralDir, max(min_version, zinfo.create_version), zinfo.create_system,
+            max(min_version, zinfo.extract_version), zinfo.reserved, flag_bits, zinfo.compress_type,
+            dos_time, dos_date, zinfo.CRC, compress_size, file_size,
+            len(filename), len(extra), len(zinfo.comment), 0, zinfo.internal_attr, zinfo.external_attr, header_offset,
+        )
+        return header + filename + extra + zinfo.comment
+
+    def close(self):
+        """Ghi central directory và end record (zip64 khi vượt giới hạn số entry / kích thước)"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            directory_offset = self._offset
+            for zinfo in self.infolist:
+                self._write(self._central_directory_entry(zinfo))
+            directory_size = self._offset - directory_offset
+            count = len(self.infolist)
+            if (
+                count > zipfile.ZIP_FILECOUNT_LIMIT
+                or directory_offset > zipfile.ZIP64_LIMIT
+                or directory_size > zipfile.ZIP64_LIMIT
+            ):
+                zip64_end_offset = self._offset
+                self._write(_END_ARCHIVE64.pack(
+                    zipfile.stringEndArchive64, _END_ARCHIVE64.size - 12, _ZIP64_VERSION, _ZIP64_VERSION,
+                    0, 0, count, count, directory_size, directory_offset,
+                ))
+                self._write(_END_ARCHIVE64_LOCATOR.pack(zipfile.stringEndArchive64Locator, 0, zip64_end_offset, 1))
+                count = min(count, 0xFFFF)
+                directory_size = min(directory_size, 0xFFFFFFFF)
+                directory_offset = min(directory_offset, 0xFFFFFFFF)
+            self._write(_END_ARCHIVE.pack(
+                zipfile.stringEndArchive, 0, 0, count, count, directory_size, directory_offset, 0,
+            ))
+
+    def __enter__(self):
+        return self
+
+    def abort(self):
+        """Dừng ghi mà không ghi central directory (file dở dang không phải zip hợp lệ)"""
+        with self._lock:
+            self._closed = True
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+def copy_zip_entry_raw(source_fp, zinfo, writer):
+    """
+    Chép một entry sang zip đích dưới dạng dữ liệu đã nén (không giải nén/nén lại).
+    source_fp: file nguồn mở ở chế độ "rb"; writer: RawZipWriter.
+    """
+    source_fp.seek(zinfo.header_offset)
+    header = _LOCAL_FILE_HEADER.unpack(source_fp.read(_LOCAL_FILE_HEADER.size))
+    if header[0] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile(f"Entry {zinfo.filename}: local header không hợp lệ")
+    name_length = header[_LFH_FILENAME_LENGTH]
+    extra_length = header[_LFH_EXTRA_FIELD_LENGTH]
+    source_fp.seek(zinfo.header_offset + _LOCAL_FILE_HEADER.size + name_length + extra_length)
+
+    new_info = copy.copy(zinfo)
+    new_info.extra = _strip_zip64_extra(zinfo.extra)
+
+    def read_chunks():
+        remaining = zinfo.compress_size
+        while remaining > 0:
+            chunk = source_fp.read(min(_RAW_COPY_CHUNK_SIZE, remaining))
+            if not chunk:
+                raise zipfile.BadZipFile(f"Entry {zinfo.filename} bị cắt cụt")
+            yield chunk
+            remaining -= len(chunk)
+
+    writer.write_compressed(new_info, read_chunks())
+
+def compression_policy(name):
+    """(kiểu nén, mức nén) cho một entry: media đã nén thì lưu nguyên, XML nén nhanh"""
+    extension = os.path.splitext(name)[1].lower()
+    if extension in STORED_EXTENSIONS:
+        return zipfile.ZIP_STORED, None
+    if extension in (".xml", ".rels", ".vml"):
+        return zipfile.ZIP_DEFLATED, XML_COMPRESS_LEVEL
+    return zipfile.ZIP_DEFLATED, DEFAULT_COMPRESS_LEVEL
+
+def compress_entry(name, data, date_time=(1980, 1, 1, 0, 0, 0), external_attr=None):
+    """
+    Nén một entry trong bộ nhớ (zlib nhả GIL nên chạy song song được trong thread pool).
+    Trả về (ZipInfo đã điền CRC/kích thước, dữ liệu đã nén).
+    """
+    compress_type, level = compression_policy(name)
+    zinfo = zipfile.ZipInfo(name, date_time=date_time)
+    zinfo.compress_type = compress_type
+    if external_attr is not None:
+        zinfo.external_attr = external_attr
+    zinfo.file_size = len(data)
+    zinfo.CRC = zlib.crc32(data)
+    if compress_type == zipfile.ZIP_STORED:
+        compressed = data
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        compressed = compressor.compress(data) + compressor.flush()
+    zinfo.compress_size = len(compressed)
+    return zinfo, compressed
+
+def compress_file_entry(name, path, date_time=(1980, 1, 1, 0, 0, 0), external_attr=None, chunk_size=1024 * 1024):
+    """
+    Như compress_entry nhưng đọc dữ liệu từ file theo từng khối (part được ghi theo chế độ streaming).
+    Dữ liệu nén được ghi ra file tạm <path>.z; trả về (ZipInfo, iterator các khối dữ liệu nén).
+    """
+    compress_type, level = compression_policy(name)
+    zinfo = zipfile.ZipInfo(name, date_time=date_time)
+    zinfo.compress_type = compress_type
+    if external_attr is not None:
+        zinfo.external_attr = external_attr
+    compressed_path = f"{path}.z"
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15) if compress_type != zipfile.ZIP_STORED else None
+    crc = size = compress_size = 0
+    with open(path, "rb") as src, open(compressed_path, "wb") as dst:
+        while True:
+            chunk = src.read(chunk_size)
+            if not chunk:
+                break
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+            compressed = compressor.compress(chunk) if compressor is not None else chunk
+            dst.write(compressed)
+            compress_size += len(compressed)
+        if compressor is not None:
+            compressed = compressor.flush()
+            dst.write(compressed)
+            compress_size += len(compressed)
+    zinfo.file_size = size
+    zinfo.CRC = crc
+    zinfo.compress_size = compress_size
+
+    def chunks():
+        try:
+            with open(compressed_path, "rb") as f:
+                while True:
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+        finally:
+            os.remove(compressed_path)
+
+    return zinfo, chunks()
+
+def _get_compression_pool():
+    """Thread pool nén dùng chung cho process (tạo lại sau fork)"""
+    global _compression_pool, _compression_pool_pid
+    if _compression_pool is None or _compression_pool_pid != os.getpid():
+        with _compression_pool_lock:
+            if _compression_pool is None or _compression_pool_pid != os.getpid():
+                _compression_pool = ThreadPoolExecutor(max_workers=COMPRESSION_WORKERS)
+                _compression_pool_pid = os.getpid()
+    return _compression_pool
+
+def write_package(source_path, output_path, replaced_parts):
+    """
+    Tạo gói OOXML mới từ gói nguồn: các part trong replaced_parts (tên -> bytes, hoặc đường dẫn file
+    với part ghi theo chế độ streaming) được nén lại song song, mọi entry khác (ảnh, media,
+    part không có text) được chép nguyên dữ liệu nén.
+    """
+    tmp_output_path = f"{output_path}.tmp"
+    pool = _get_compression_pool()
+    futures = {}
+    try:
+        with zipfile.ZipFile(source_path) as zin, open(source_path, "rb") as source_fp, \
+                open(tmp_output_path, "wb") as output_fp, RawZipWriter(output_fp) as zout:
+            infos = zin.infolist()
+            futures = {
+                zinfo.filename: pool.submit(
+                    compress_file_entry if isinstance(replaced_parts[zinfo.filename], str) else compress_entry,
+                    zinfo.filename, replaced_parts[zinfo.filename], zinfo.date_time, zinfo.external_attr
+                )
+                for zinfo in infos
+                if zinfo.filename in replaced_parts
+            }
+            for zinfo in infos:
+                future = futures.get(zinfo.filename)
+                if future is not None:
+                    new_info, compressed = future.result()
+                    zout.write_compressed(new_info, [compressed] if isinstance(compressed, bytes) else compressed)
+                else:
+                    copy_zip_entry_raw(source_fp, zinfo, zout)
+    except BaseException:
+        # Không để lại file .tmp dở dang trong workspace khi nén / chép entry lỗi
+        for future in futures.values():
+            future.cancel()
+        if os.path.exists(tmp_output_path):
+            os.remove(tmp_output_path)
+        raise
+    os.replace(tmp_output_path, output_path)
+    return output_path
+
+def parse_part(package, name):
+    """Parse một part XML của gói (zip hoặc thư mục) giống cách đọc file trên đĩa"""
+    parser = etree.XMLParser(remove_blank_text=True)
+    return etree.parse(io.BytesIO(package.read(name)), parser)
+
+def part_contains(package, name, needle, chunk_size=1024 * 1024):
+    """Tìm chuỗi bytes trong part theo từng khối (không parse, không đọc cả part vào bộ nhớ)"""
+    tail = b""
+    with package.open(name) as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return False
+            if needle in tail + chunk[:len(needle)] or needle in chunk:
+                return True
+            tail = chunk[-(len(needle) - 1):] if len(needle) > 1 else b""
+
+def serialize_part(tree):
+    return etree.tostring(tree, pretty_print=True, xml_declaration=True, encoding="UTF-8")
 
-    # Kiểm tra file zip đã được tạo chưa    
-    if not os.path.isfile(temp_zip_path):
-        raise FileNotFoundError(f"Không tạo được file zip tạm tại {temp_zip_path}")
+if __name__ == "__main__":
+    # Benchmark: python -m Translate_v2.xml_process deck.pptx report.docx
+    import argparse
+    import tempfile
+    import time
 
-    # Nếu file docx đích đã tồn tại, xóa đi
-    if os.path.exists(output_path):
-        os.remove(output_path)
+    parser = argparse.ArgumentParser(description="Benchmark output package assembly")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
 
-    # Đổi tên file zip thành file docx
-    shutil.move(temp_zip_path, output_path)
+    def _rezip_folder(folder, output_path):
+        """Cách cũ: nén lại toàn bộ thư mục đã giải nén"""
+        with zipfile.ZipFile(output_path, "w", zipfile.ZIP_DEFLATED) as archive:
+            for root, _, files in os.walk(folder):
+                for name in files:
+                    file_path = os.path.join(root, name)
+                    archive.write(file_path, os.path.relpath(file_path, folder))
 
-    return output_path
\ No newline at end of file
+    for path in args.files:
+        with tempfile.TemporaryDirectory() as work_dir:
+            folder = os.path.join(work_dir, "extracted")
+            with zipfile.ZipFile(path) as archive:
+                archive.extractall(folder)
+                # Giả lập tài liệu đã dịch: mọi part XML được nén lại
+                xml_parts = {name: archive.read(name) for name in archive.namelist() if name.endswith(".xml")}
+            extension = os.path.splitext(path)[1]
+            print(f"\n{path}: {os.path.getsize(path) / 1e6:.1f} MB, {len(xml_parts)} part XML, {COMPRESSION_WORKERS} worker")
+            for label, assemble in (
+                ("extract + deflate lại", lambda out: _rezip_folder(folder, out)),
+                ("write_package (zip -> zip)", lambda out: write_package(path, out, xml_parts)),
+            ):
+                output = os.path.join(work_dir, f"out{extension}")
+                timings = []
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    assemble(output)
+                    timings.append(time.perf_counter() - started)
+                with zipfile.ZipFile(output) as archive:
+                    assert archive.testzip() is None
+                print(f"  {label:28s} {min(timings):.3f}s, {os.path.getsize(output) / 1e6:.1f} MB")
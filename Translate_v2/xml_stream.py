@@ -0,0 +1,188 @@
+import os
+import re
+from lxml import etree
+from .settings import STREAM_PART_MIN_BYTES, STREAM_BATCH_RECORDS, STREAM_BATCH_CHARS
+
+_START_TAG_RE = re.compile(rb"<[^>]*>")
+_NS_DECLARATION_RE = re.compile(rb'\s+xmlns(?::([^=\s]+))?="([^"]*)"')
+
+def serialize_record(record, cache=None):
+    """
+    Serialize một record còn gắn trong cây, bỏ các khai báo namespace đã có ở phần tử cha
+    (tostring lặp lại toàn bộ namespace đang có hiệu lực trên mỗi record).
+    cache: dict dùng chung trong một part, nhớ đoạn khai báo thừa theo phần tử cha để không phải dùng regex mỗi lần.
+    """
+    data = etree.tostring(record, encoding="UTF-8", xml_declaration=False, with_tail=False)
+    parent = record.getparent()
+    if parent is None:
+        return data
+    start_tag = _START_TAG_RE.match(data).group(0)
+    if cache is not None:
+        block = cache.get(parent)
+        if block and block in start_tag:
+            return data.replace(block, b"", 1)
+
+    inherited = parent.nsmap
+    matches = [
+        match for match in _NS_DECLARATION_RE.finditer(start_tag)
+        if inherited.get(match.group(1).decode() if match.group(1) is not None else None) == match.group(2).decode()
+    ]
+    if not matches:
+        return data
+    if cache is not None and all(a.end() == b.start() for a, b in zip(matches, matches[1:])):
+        # Các khai báo thừa liền nhau: lần sau chỉ cần bytes.replace
+        cache[parent] = start_tag[matches[0].start():matches[-1].end()]
+    for match in reversed(matches):
+        start_tag = start_tag[:match.start()] + start_tag[match.end():]
+    return start_tag + data[len(_START_TAG_RE.match(data).group(0)):]
+
+def _escape_text(text):
+    """Text node dạng bytes UTF-8 để ghi thẳng ra output (giữa các record)"""
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").encode("utf-8")
+
+def stream_records(source, output, record_tags, process_batch,
+                   batch_records=STREAM_BATCH_RECORDS, batch_chars=STREAM_BATCH_CHARS):
+    """
+    Đọc part XML bằng iterparse và ghi lại bằng etree.xmlfile, không giữ cả cây trong bộ nhớ.
+    - record: phần tử có tag thuộc record_tags (không nằm trong record khác), ví dụ <w:p>, <si>, <row>.
+      Record hoàn chỉnh được gom thành batch (tối đa batch_records record / batch_chars ký tự),
+      process_batch(records) sửa trực tiếp các record (dịch), sau đó record được ghi ra và tách khỏi cây.
+    - phần tử ngoài record (gốc, body, bảng...) được ghi lại với đúng thẻ, thuộc tính, namespace,
+      text và tail (nội dung hỗn hợp); khai báo XML (version, standalone) lấy theo part nguồn, output luôn là UTF-8.
+    source: file-like (ví dụ zipfile.ZipFile.open); output: file-like nhị phân. Trả về số record.
+    """
+    pending = []
+    pending_chars = 0
+    open_elements = []
+    current_record = None
+    records = 0
+    declaration_cache = {}
+    # Với iterparse, text của một phần tử chỉ chắc chắn có ở sự kiện kế tiếp sau thẻ mở,
+    # tail chỉ chắc chắn có ở sự kiện kế tiếp sau thẻ đóng: hai biến này giữ phần tử đang chờ ghi text / tail
+    opened = None
+    closed = None
+
+    with etree.xmlfile(output, encoding="UTF-8") as xf:
+        def flush():
+            nonlocal pending_chars
+            if not pending:
+                return
+            process_batch(pending)
+            xf.flush()
+            for record in pending:
+                output.write(serialize_record(record, declaration_cache))
+                if record.tail:
+                    output.write(_escape_text(record.tail))
+                record.getparent().remove(record)
+            pending.clear()
+            pending_chars = 0
+
+        for event, elem in etree.iterparse(source, events=("start", "end"), remove_blank_text=True):
+            if current_record is not None:
+                if event == "end" and elem is current_record:
+                    # Record được tách khỏi cây sau khi ghi: cây chỉ giữ phần tử bao ngoài và batch hiện tại
+                    pending.append(elem)
+                    pending_chars += sum(map(len, elem.itertext()))
+                    current_record = None
+                    records += 1
+                    closed = elem
+                continue
+
+            if opened is not None:
+                if opened.text:
+                    xf.write(opened.text)
+                opened = None
+            elif closed is not None:
+                if closed.tag in record_tags:
+                    # Tail của record được ghi cùng record khi flush
+                    if len(pending) >= batch_records or pending_chars >= batch_chars:
+                        flush()
+                else:
+                    if closed.tail:
+                        xf.write(closed.tail)
+                    parent = closed.getparent()
+                    closed.clear()
+                    if parent is not None:
+                        parent.remove(closed)
+                closed = None
+            elif not open_elements:
+                docinfo = elem.getroottree().docinfo
+                xf.write_declaration(version=docinfo.xml_version, standalone=docinfo.standalone)
+
+            if event == "start":
+                if elem.tag in record_tags:
+                    current_record = elem
+                    continue
+                # Record trước đó phải được ghi trước thẻ mở của phần tử kế tiếp
+                flush()
+                parent_nsmap = open_elements[-1][0].nsmap if open_elements else {}
+                nsmap = {prefix: uri for prefix, uri in elem.nsmap.items() if parent_nsmap.get(prefix) != uri}
+                context = xf.element(elem.tag, dict(elem.attrib), nsmap=nsmap)
+                context.__enter__()
+                open_elements.append((elem, context))
+                opened = elem
+            else:
+                flush()
+                open_elements.pop()[1].__exit__(None, None, None)
+                declaration_cache.pop(elem, None)
+                closed = elem
+        flush()
+    return records
+
+if __name__ == "__main__":
+    # Benchmark: python -m Translate_v2.xml_stream --sizes 20 50 100
+    # Peak RSS khi "dịch" một sharedStrings.xml giả lập: parse cả cây (DOM) so với streaming
+    import argparse
+    import resource
+    import subprocess
+    import sys
+    import tempfile
+    import time
+
+    parser = argparse.ArgumentParser(description="Benchmark peak memory of DOM vs streaming part processing")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 50, 100], help="kích thước part (MB)")
+    parser.add_argument("--run", nargs=2, metavar=("MODE", "FILE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    ns = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+
+    def fake_translate(elems):
+        for elem in elems:
+            elem.text = f"[vi] {elem.text}"
+
+    if args.run:
+        mode, path = args.run
+        started = time.perf_counter()
+        with open(path, "rb") as source, open(f"{path}.out", "wb") as output:
+            if mode == "dom":
+                tree = etree.parse(source, etree.XMLParser(remove_blank_text=True))
+                fake_translate([elem for elem in tree.getroot().iter(f"{{{ns}}}t") if elem.text])
+                output.write(etree.tostring(tree, xml_declaration=True, encoding="UTF-8", standalone=True))
+            else:
+                stream_records(source, output, {f"{{{ns}}}si"}, lambda records: fake_translate(
+                    [elem for record in records for elem in record.iter(f"{{{ns}}}t") if elem.text]
+                ))
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"{time.perf_counter() - started:.2f} {peak_mb:.0f}")
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        for size_mb in args.sizes:
+            path = os.path.join(work_dir, "sharedStrings.xml")
+            with open(path, "wb") as f:
+                f.write(f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<sst xmlns="{ns}">'.encode())
+                written = index = 0
+                while written < size_mb * 1024 * 1024:
+                    record = f"<si><t>製品番号 {index} の外径寸法は図面に従う</t></si>".encode()
+                    f.write(record)
+                    written += len(record)
+                    index += 1
+                f.write(b"</sst>")
+            print(f"\nsharedStrings.xml {size_mb} MB, {index} chuỗi")
+            for mode in ("dom", "stream"):
+                result = subprocess.run(
+                    [sys.executable, "-m", "Translate_v2.xml_stream", "--run", mode, path],
+                    capture_output=True, text=True, check=True,
+                )
+                elapsed, peak_mb = result.stdout.split()[-2:]
+                print(f"  {mode:6s} {float(elapsed):6.2f}s, peak RSS {peak_mb} MB")
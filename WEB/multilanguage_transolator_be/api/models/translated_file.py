@@ -7,6 +7,8 @@ class TranslatedFile(models.Model):
     original_file_name = models.CharField(max_length=255, default="")
     translated_file_url = models.URLField(max_length=1000, default="")
     original_language = models.CharField(max_length=10, default="")
+    # SHA-256 của file gốc: dùng lại ngôn ngữ đã phát hiện cho cùng nội dung
+    content_hash = models.CharField(max_length=64, default="", blank=True, db_index=True)
     target_language = models.CharField(max_length=10)
     file_type = models.CharField(max_length=10, default="unknown")
     created_at = models.DateTimeField(auto_now_add=True)
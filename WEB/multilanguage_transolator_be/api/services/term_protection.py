@@ -0,0 +1,39 @@
+import os
+import sys
+
+# Thêm Translate_v2 vào PYTHONPATH
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(current_dir, '../../../../'))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from django.db.models import Count, Max
+from Translate_v2.term_protection import LANGUAGE_FIELDS, get_term_protector, register_term_loader
+from ..models.keyword import KeywordSuggestion
+
+def load_approved_terms():
+    """Các thuật ngữ đã được admin duyệt trong thư viện keyword"""
+    fields = sorted(set(LANGUAGE_FIELDS.values()))
+    return KeywordSuggestion.objects.filter(status='approved').values(*fields)
+
+def approved_terms_version():
+    """
+    Phiên bản thư viện thuật ngữ: số thuật ngữ đã duyệt và thời điểm sửa gần nhất.
+    Duyệt/sửa làm đổi updated_at, xóa làm đổi số dòng -> mọi worker gunicorn đều nạp lại.
+    """
+    result = KeywordSuggestion.objects.filter(status='approved').aggregate(count=Count('id'), updated=Max('updated_at'))
+    return result['count'], result['updated']
+
+register_term_loader(load_approved_terms, approved_terms_version)
+
+def term_approved(suggestion):
+    """Thêm ngay thuật ngữ vừa duyệt cho worker hiện tại (không đọc lại DB); worker khác nạp lại qua approved_terms_version"""
+    protector = get_term_protector()
+    if protector is not None:
+        protector.add_terms({field: getattr(suggestion, field) for field in LANGUAGE_FIELDS.values()})
+
+def terms_changed():
+    """Thuật ngữ bị sửa/xóa: worker hiện tại nạp lại ngay ở lần dịch kế tiếp, worker khác qua approved_terms_version"""
+    protector = get_term_protector()
+    if protector is not None:
+        protector.reload()
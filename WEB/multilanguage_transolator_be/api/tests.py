@@ -1,3 +1,27 @@
 from django.test import TestCase
 
-# Create your tests here.
+from .models.keyword import KeywordSuggestion
+from .services.term_protection import approved_terms_version
+
+class ApprovedTermsVersionTest(TestCase):
+    def test_version_changes_on_approve_edit_and_delete(self):
+        suggestion = KeywordSuggestion.objects.create(japanese="炭素繊維", vietnamese="sợi carbon")
+        empty = approved_terms_version()
+
+        suggestion.status = 'approved'
+        suggestion.save()
+        approved = approved_terms_version()
+        self.assertNotEqual(approved, empty)
+
+        suggestion.vietnamese = "sợi các-bon"
+        suggestion.save()
+        edited = approved_terms_version()
+        self.assertNotEqual(edited, approved)
+
+        suggestion.delete()
+        self.assertEqual(approved_terms_version()[0], 0)
+
+    def test_pending_suggestions_do_not_change_version(self):
+        before = approved_terms_version()
+        KeywordSuggestion.objects.create(japanese="樹脂", vietnamese="nhựa")
+        self.assertEqual(approved_terms_version(), before)
@@ -5,6 +5,7 @@ from rest_framework.permissions import IsAuthenticated,IsAdminUser
 from ..models.keyword import KeywordSuggestion
 from ..models.notification import Notification
 from ..serializers.keyword import KeywordSuggestionSerializer
+from ..services.term_protection import term_approved, terms_changed
 from django.contrib.auth import get_user_model
 
 class KeywordSuggestionView(APIView):
@@ -55,6 +56,7 @@ class ApproveSuggestionView(APIView):
         suggestion.status = 'approved'
         suggestion.approved_by = request.user
         suggestion.save()
+        term_approved(suggestion)
 
         # Tạo notification cho tất cả người dùng
         User = get_user_model()
@@ -90,7 +92,10 @@ class DeleteSuggestionView(APIView):
         if request.user != suggestion.user and not request.user.is_staff:
             return Response({"detail": "Permission denied"}, status=status.HTTP_403_FORBIDDEN)
 
+        was_approved = suggestion.status == 'approved'
         suggestion.delete()
+        if was_approved:
+            terms_changed()
         return Response({"message": "Suggestion deleted successfully"}, status=status.HTTP_204_NO_CONTENT)
 
 class UpdateKeywordView(APIView):
@@ -104,6 +109,8 @@ class UpdateKeywordView(APIView):
 
         serializer = KeywordSuggestionSerializer(keyword, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
+            keyword = serializer.save()
+            if keyword.status == 'approved':
+                terms_changed()
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
@@ -7,7 +7,6 @@ from django.http import JsonResponse
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny,IsAuthenticated
 from dotenv import load_dotenv
-import tempfile
 import requests
 from ..models.translated_file import TranslatedFile
 import boto3
@@ -29,18 +28,24 @@ try:
     from Translate_v2.translate_pdf import pdf_to_docx, docx_to_pdf
     from Translate_v2.translate_xlsx import translate_xlsx
     from Translate_v2.translate_pptx import translate_pptx
-    from Translate_v2.detect_lang import detect_language, extract_content, LANGUAGES
+    from Translate_v2.workspace import job_workspace, derived_path
+    from Translate_v2.detect_lang import detect_file_language, file_sha256, remember_file_language, LANGUAGES
+    from Translate_v2.multi_target import UnsupportedLanguageError
     logger.info("✅ Đã import thành công các module từ Translate_v2")
 except ImportError as e:
     logger.error(f"❌ Lỗi khi import module từ Translate_v2: {str(e)}")
     raise
 
+# Đăng ký nguồn thuật ngữ đã duyệt cho term protection
+from ..services import term_protection  # noqa: F401
+
 load_dotenv()
 
 # Lấy giá trị từ biến môi trường
 PROJECT_ID = os.getenv("PROJECT_ID")
 GOOGLE_CREDENTIALS_PATH = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
-os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = GOOGLE_CREDENTIALS_PATH
+if GOOGLE_CREDENTIALS_PATH is not None:
+    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = GOOGLE_CREDENTIALS_PATH
 
 def upload_file_path_to_s3(file_path, bucket_name, object_name=None):
     """
@@ -97,114 +102,136 @@ def upload_file_path_to_s3(file_path, bucket_name, object_name=None):
         return None
 
 # ======= Hàm dịch tài liệu =======
-def translate_document(file_path: str, target_language: str, original_file_url: str):
+def detect_document_language(file_path: str, content_hash: str) -> str:
+    """Ngôn ngữ của file gốc: lấy từ lần dịch trước của cùng nội dung, nếu chưa có thì phát hiện"""
+    stored_language = (
+        TranslatedFile.objects.filter(content_hash=content_hash)
+        .exclude(original_language="")
+        .values_list("original_language", flat=True)
+        .first()
+    )
+    if stored_language:
+        remember_file_language(content_hash, stored_language)
+        return stored_language
+    return detect_file_language(file_path, content_hash)
+
+def translate_document_multi(file_path: str, target_languages: list, original_file_url: str, source_language: str = None):
+    """
+    Dịch một file sang nhiều ngôn ngữ đích: giải nén, chuẩn hóa và gom segment một lần,
+    sau đó tạo và upload một file cho mỗi ngôn ngữ.
+    Trả về dict ngôn ngữ -> kết quả (dict) hoặc Exception nếu ngôn ngữ đó lỗi.
+    """
     file_extension = file_path.split(".")[-1].lower()
-    logger.info(f"🔄 Bắt đầu dịch file: {file_path}")
+    logger.info(f"🔄 Bắt đầu dịch file: {file_path} -> {', '.join(target_languages)}")
     logger.info(f"📝 Định dạng file: {file_extension}")
     
     try:
-        detected_language = detect_language(extract_content(file_path))
+        detected_language = source_language or detect_file_language(file_path)
         logger.info(f"🌍 Ngôn ngữ phát hiện được: {detected_language}")
     except Exception as e:
         logger.error(f"❌ Lỗi khi phát hiện ngôn ngữ: {str(e)}")
         raise
 
-    # Tạo đường dẫn file tạm
-    base_name = file_path.rsplit(".", 1)[0]
-    translated_file_path = f"{base_name}_{target_language}.{file_extension}"
-    logger.info(f"📂 Đường dẫn file dịch: {translated_file_path}")
-
     temp_files = []  # Danh sách các file tạm cần xóa
+    translated_paths = {}
+    results = {}
 
     try:
         if file_extension == "pdf":
             logger.info("🔄 Xử lý file PDF")
-            docx_path = file_path.replace(".pdf", ".docx")
+            docx_path = derived_path(file_path, ".docx")
             pdf_to_docx(file_path, docx_path)
             temp_files.append(docx_path)
             logger.info("✅ Đã chuyển PDF sang DOCX")
-            # Dịch DOCX cho ngôn ngữ đích cụ thể
-            translate_docx(docx_path, target_language)
-            logger.info("✅ Đã dịch DOCX")
-            # Chuyển DOCX đã dịch thành PDF
-            translated_pdf_path = docx_to_pdf(docx_path)
-            logger.info("✅ Đã chuyển DOCX sang PDF")
-            translated_file_path = translated_pdf_path
+            # Dịch DOCX cho tất cả ngôn ngữ đích, sau đó chuyển từng bản dịch thành PDF
+            for lang, translated_docx in translate_docx(
+                file_path=docx_path, target_lang=target_languages, source_lang=detected_language
+            ).items():
+                if isinstance(translated_docx, Exception):
+                    translated_paths[lang] = translated_docx
+                    continue
+                temp_files.append(translated_docx)
+                translated_paths[lang] = docx_to_pdf(translated_docx)
+            logger.info("✅ Đã dịch DOCX và chuyển sang PDF")
         elif file_extension == "docx":
             logger.info("🔄 Xử lý file DOCX")
-            # Dịch DOCX cho ngôn ngữ đích cụ thể
-            translate_docx(file_path, target_language)
+            translated_paths = translate_docx(
+                file_path=file_path, target_lang=target_languages, source_lang=detected_language
+            )
             logger.info("✅ Đã dịch DOCX")
             
         elif file_extension == "xlsx":
             logger.info("🔄 Xử lý file XLSX")
-            translate_xlsx(file_path)
+            translated_paths = translate_xlsx(
+                file_path=file_path, target_lang=target_languages, source_lang=detected_language
+            )
             logger.info("✅ Đã dịch XLSX")
             
         elif file_extension == "pptx":
             logger.info("🔄 Xử lý file PPTX")
-            translated_file_path = translate_pptx(file_path, target_language)
+            translated_paths = translate_pptx(
+                file_path=file_path, target_lang=target_languages, source_lang=detected_language
+            )
             logger.info("✅ Đã dịch PPTX")
             
         else:
             logger.error(f"❌ Định dạng file không được hỗ trợ: {file_extension}")
             raise Exception("Unsupported file type")
 
-        # Kiểm tra file dịch có tồn tại không
-        if not os.path.exists(translated_file_path):
-            logger.error(f"❌ Không tìm thấy file dịch: {translated_file_path}")
-            # Kiểm tra xem file gốc có bị thay đổi không
-            if os.path.exists(file_path):
-                logger.info("✅ File gốc vẫn tồn tại")
-                # Thử tạo file dịch từ file gốc
-                if file_extension == "docx":
-                    translate_docx(file_path, target_language)
-                elif file_extension == "xlsx":
-                    translate_xlsx(file_path)
-                elif file_extension == "pptx":
-                    translate_pptx(file_path)
-                logger.info("🔄 Đã thử dịch lại file")
-            else:
-                logger.error("❌ File gốc không tồn tại")
-            raise Exception(f"Translated file not found: {translated_file_path}")
-
-        # Kiểm tra kích thước file dịch
-        file_size = os.path.getsize(translated_file_path)
-        if file_size == 0:
-            logger.error("❌ File dịch có kích thước 0 bytes")
-            raise Exception("Translated file is empty")
-
-        logger.info(f"✅ File dịch tồn tại và có kích thước {file_size} bytes")
-
-        # Tạo object name + upload lên S3
-        bucket_name = os.getenv('AWS_STORAGE_BUCKET_NAME')
-        hash_name = f"{uuid.uuid4().hex}.{file_extension}"
-        object_name = f"translated/{hash_name}"
-        logger.info(f"📤 Đang upload file lên S3: {object_name}")
-        
-        s3_url = upload_file_path_to_s3(translated_file_path, bucket_name, object_name)
-
-        # Nếu upload thất bại => raise Exception để dừng lại
-        if not s3_url:
-            logger.error("❌ Upload file lên S3 thất bại")
-            raise Exception("Failed to upload translated file to S3")
-
-        logger.info(f"✅ Đã upload file lên S3 thành công: {s3_url}")
-
-        return {
-            "translated_file_url": s3_url,
-            "original_file_url": original_file_url,
-            "original_file_name": os.path.basename(file_path),
-            "target_language": target_language,
-            "original_language": detected_language,
-            "file_type": file_extension,
-        }
+        for target_language in target_languages:
+            try:
+                translated_file_path = translated_paths.get(target_language)
+                # Lỗi riêng của ngôn ngữ này (vd. cặp ngôn ngữ không hỗ trợ), các ngôn ngữ khác vẫn tiếp tục
+                if isinstance(translated_file_path, Exception):
+                    raise translated_file_path
+                logger.info(f"📂 Đường dẫn file dịch: {translated_file_path}")
+
+                # Kiểm tra file dịch có tồn tại không
+                if not translated_file_path or not os.path.exists(translated_file_path):
+                    logger.error(f"❌ Không tìm thấy file dịch: {translated_file_path}")
+                    raise Exception(f"Translated file not found: {translated_file_path}")
+
+                # Kiểm tra kích thước file dịch
+                file_size = os.path.getsize(translated_file_path)
+                if file_size == 0:
+                    logger.error("❌ File dịch có kích thước 0 bytes")
+                    raise Exception("Translated file is empty")
+
+                logger.info(f"✅ File dịch tồn tại và có kích thước {file_size} bytes")
+
+                # Tạo object name + upload lên S3
+                bucket_name = os.getenv('AWS_STORAGE_BUCKET_NAME')
+                hash_name = f"{uuid.uuid4().hex}.{file_extension}"
+                object_name = f"translated/{hash_name}"
+                logger.info(f"📤 Đang upload file lên S3: {object_name}")
+                
+                s3_url = upload_file_path_to_s3(translated_file_path, bucket_name, object_name)
+
+                # Nếu upload thất bại => raise Exception để dừng lại
+                if not s3_url:
+                    logger.error("❌ Upload file lên S3 thất bại")
+                    raise Exception("Failed to upload translated file to S3")
+
+                logger.info(f"✅ Đã upload file lên S3 thành công: {s3_url}")
+
+                results[target_language] = {
+                    "translated_file_url": s3_url,
+                    "original_file_url": original_file_url,
+                    "original_file_name": os.path.basename(file_path),
+                    "target_language": target_language,
+                    "original_language": detected_language,
+                    "file_type": file_extension,
+                }
+            except Exception as e:
+                logger.error(f"❌ Lỗi khi dịch sang ngôn ngữ {target_language}: {str(e)}")
+                results[target_language] = e
+        return results
     except Exception as e:
         logger.error(f"❌ Lỗi trong quá trình dịch: {str(e)}")
         raise e
     finally:
-        # Dọn dẹp file tạm
-        for temp_file in temp_files:
+        # Dọn dẹp file tạm và các file dịch
+        for temp_file in temp_files + [path for path in translated_paths.values() if isinstance(path, str)]:
             try:
                 if os.path.exists(temp_file):
                     os.remove(temp_file)
@@ -212,13 +239,12 @@ def translate_document(file_path: str, target_language: str, original_file_url:
             except Exception as e:
                 logger.warning(f"⚠️ Không thể xóa file tạm {temp_file}: {str(e)}")
 
-        # Xóa file dịch nếu tồn tại
-        try:
-            if os.path.exists(translated_file_path):
-                os.remove(translated_file_path)
-                logger.info(f"🧹 Đã xóa file dịch tạm: {translated_file_path}")
-        except Exception as e:
-            logger.warning(f"⚠️ Không thể xóa file dịch tạm {translated_file_path}: {str(e)}")
+def translate_document(file_path: str, target_language: str, original_file_url: str, source_language: str = None):
+    """Dịch một file sang một ngôn ngữ đích"""
+    result = translate_document_multi(file_path, [target_language], original_file_url, source_language)[target_language]
+    if isinstance(result, Exception):
+        raise result
+    return result
 
 # ======= API View =======
 class TranslateFileView(APIView):
@@ -237,24 +263,37 @@ class TranslateFileView(APIView):
 
         file_ext = file_url.rsplit(".", 1)[-1].lower()
         file_name = original_file_name or os.path.basename(file_url)
-        temp_path = os.path.join(tempfile.gettempdir(), f"tempfile.{file_ext}")
 
         try:
             resp = requests.get(file_url)
             resp.raise_for_status()
-            with open(temp_path, "wb") as f:
-                f.write(resp.content)
 
-            results = []
-            for lang in target_languages:
-                try:
-                    result = translate_document(temp_path, lang, file_url)
+            # Mỗi request có thư mục riêng nên nhiều job chạy song song không ghi đè file của nhau
+            expected_bytes = len(resp.content) * (len(target_languages) + 2)
+            with job_workspace(expected_bytes) as workspace:
+                temp_path = workspace.file_path(f"upload.{file_ext}")
+                with open(temp_path, "wb") as f:
+                    f.write(resp.content)
+
+                # Phát hiện ngôn ngữ một lần cho cả job (theo SHA-256 nội dung file)
+                content_hash = file_sha256(temp_path)
+                source_language = detect_document_language(temp_path, content_hash)
+
+                # Giải nén, chuẩn hóa và gom segment một lần cho mọi ngôn ngữ đích
+                translations = translate_document_multi(temp_path, target_languages, file_url, source_language)
+
+                results = []
+                for lang in target_languages:
+                    result = translations.get(lang)
+                    if result is None or isinstance(result, Exception):
+                        continue
                     TranslatedFile.objects.create(
                         user=request.user,
                         original_file_url=file_url,
                         original_file_name=file_name,
                         translated_file_url=result["translated_file_url"],
                         original_language=result["original_language"],
+                        content_hash=content_hash,
                         target_language=lang,
                         file_type=result["file_type"],
                     )
@@ -262,17 +301,17 @@ class TranslateFileView(APIView):
                         "language": lang,
                         "url": result["translated_file_url"]
                     })
-                except Exception as e:
-                    logger.error(f"❌ Lỗi khi dịch sang ngôn ngữ {lang}: {str(e)}")
-                    continue
 
-            if not results:
-                return JsonResponse({"detail": "Failed to translate to any target language"}, status=500)
+                if not results:
+                    errors = [result for result in translations.values() if isinstance(result, Exception)]
+                    if errors and all(isinstance(error, UnsupportedLanguageError) for error in errors):
+                        return JsonResponse({"detail": "; ".join(str(error) for error in errors)}, status=400)
+                    return JsonResponse({"detail": "Failed to translate to any target language"}, status=500)
 
-            return JsonResponse({"translated_files": results}, status=200)
+                return JsonResponse({"translated_files": results}, status=200)
+        except UnsupportedLanguageError as e:
+            logger.error(f"❌ Ngôn ngữ không được hỗ trợ: {str(e)}")
+            return JsonResponse({"detail": str(e)}, status=400)
         except Exception as e:
             logger.error(f"❌ Lỗi trong quá trình xử lý: {str(e)}")
             return JsonResponse({"detail": str(e)}, status=500)
-        finally:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
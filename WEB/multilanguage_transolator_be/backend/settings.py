@@ -105,6 +105,13 @@ PROJECT_ID = os.getenv("PROJECT_ID")
 if GOOGLE_APPLICATION_CREDENTIALS is not None:
     os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = GOOGLE_APPLICATION_CREDENTIALS
 
+# Dịch vụ dịch dùng cho Translate_v2: "google" (mặc định), "local" (stand-in trong process)
+# hoặc "http" (stand-in chạy riêng tại TRANSLATION_BACKEND_URL)
+TRANSLATION_BACKEND = os.getenv("TRANSLATION_BACKEND", "google")
+TRANSLATION_BACKEND_URL = os.getenv("TRANSLATION_BACKEND_URL", "http://127.0.0.1:8765")
+os.environ["TRANSLATION_BACKEND"] = TRANSLATION_BACKEND
+os.environ["TRANSLATION_BACKEND_URL"] = TRANSLATION_BACKEND_URL
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 